@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+from metrics import Histogram
+
+
+class QueueFull(Exception):
+    pass
+
+
+class MicroBatcher:
+    """Collect concurrent requests into batches for one model call.
+
+    Callers `await submit(item)`. A background task takes the first waiting
+    item, keeps collecting until `max_batch_size` items are queued or
+    `max_wait_us` microseconds have passed, then runs `score_batch(items)` in
+    `executor` (default thread pool) so the event loop stays free. If
+    `score_batch` is a coroutine function it is awaited instead, which lets it
+    dispatch to its own pool. Up to `max_in_flight` batches are scored at once.
+    `score_batch` must return one result per item; an Exception instance in
+    the results is raised to that item's caller only.
+    """
+
+    def __init__(self, score_batch, max_batch_size=64, max_wait_us=2000, max_queue=4096, executor=None, max_in_flight=1):
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1e6
+        self.max_queue = max_queue
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.queue = None
+        self.task = None
+        self.in_flight = set()
+
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512])
+        self.queue_depth = Histogram([0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096])
+        self.wait_us = Histogram([50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000])
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for task in list(self.in_flight):
+            task.cancel()
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((item, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            raise QueueFull(f'prediction queue is full ({self.max_queue} waiting)')
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        self.queue_depth.observe(self.queue.qsize())
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        slots = asyncio.Semaphore(self.max_in_flight)
+        while True:
+            await slots.acquire()
+            batch = await self._collect()
+            started = time.perf_counter()
+            self.batch_size.observe(len(batch))
+            for _, _, enqueued in batch:
+                self.wait_us.observe((started - enqueued) * 1e6)
+
+            task = asyncio.create_task(self._score(batch))
+            self.in_flight.add(task)
+            task.add_done_callback(lambda task: (self.in_flight.discard(task), slots.release()))
+
+    async def _score(self, batch):
+        items = [item for item, _, _ in batch]
+        try:
+            if asyncio.iscoroutinefunction(self.score_batch):
+                results = await self.score_batch(items)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(self.executor, self.score_batch, items)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'max_batch_size' : self.max_batch_size,
+            'max_wait_us' : self.max_wait * 1e6,
+            'max_in_flight' : self.max_in_flight,
+            'queued' : self.queue.qsize() if self.queue is not None else 0,
+            'in_flight' : len(self.in_flight),
+            'batch_size' : self.batch_size.snapshot(),
+            'queue_depth' : self.queue_depth.snapshot(),
+            'wait_us' : self.wait_us.snapshot(),
+        }
@@ -0,0 +1,84 @@
+"""Compare the pickled RandomForestRegressor with FlatForest.
+
+Usage (from scripts/):  python bench_forest.py [--export ../models/forest.npz]
+
+Reports prediction parity on xtest, on-disk size, resident memory after load
+(measured in a fresh interpreter for each format) and p50/p99 latency at batch
+sizes 1, 64 and 4096.
+"""
+import argparse
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+from forest_engine import FlatForest
+from perf import format_bytes, latency_percentiles
+
+MODEL_PATH = r'../models/model.pkl'
+XTEST_PATH = r'../models/xtest.pkl'
+
+LOAD_SNIPPET = """
+import pickle, sys
+from perf import rss_bytes
+from forest_engine import FlatForest
+before = rss_bytes()
+if sys.argv[1].endswith('.npz'):
+    model = FlatForest.load(sys.argv[1])
+else:
+    with open(sys.argv[1], 'rb') as f:
+        model = pickle.load(f)
+print(rss_bytes() - before)
+"""
+
+
+def resident_after_load(path):
+    out = subprocess.run([sys.executable, '-c', LOAD_SNIPPET, path], capture_output=True, text=True, check=True)
+    return int(out.stdout.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export', help='write the flattened forest to this .npz path')
+    args = parser.parse_args()
+
+    with open(MODEL_PATH, 'rb') as f:
+        rf = pickle.load(f)
+    with open(XTEST_PATH, 'rb') as f:
+        xtest_df = pickle.load(f)
+    xtest = xtest_df.to_numpy(dtype=np.float64)
+
+    flat = FlatForest.from_sklearn(rf)
+    expected = rf.predict(xtest_df)
+    got = flat.predict(xtest)
+    print(f'parity on {len(xtest)} rows : max abs diff {np.abs(got - expected).max():.3e}, '
+          f'max rel diff {(np.abs(got - expected) / np.maximum(np.abs(expected), 1)).max():.3e}')
+    print(f'leaf ids identical : {np.array_equal(flat.apply(xtest), _sklearn_leaves(rf, xtest))}')
+
+    npz_path = args.export or os.path.join(tempfile.mkdtemp(), 'forest.npz')
+    flat.save(npz_path)
+    print(f'nodes : {flat.node_count:,}  in-memory arrays : {format_bytes(flat.nbytes)}')
+    print(f'on disk : pickle {format_bytes(os.path.getsize(MODEL_PATH))}  npz {format_bytes(os.path.getsize(npz_path))}')
+    print(f'resident after load : pickle {format_bytes(resident_after_load(MODEL_PATH))}  npz {format_bytes(resident_after_load(npz_path))}')
+
+    rows = np.resize(xtest, (4096, xtest.shape[1]))
+    for batch_size in [1, 64, 4096]:
+        X = rows[:batch_size]
+        X_df = pd.DataFrame(X, columns=xtest_df.columns)
+        repeat = 200 if batch_size < 4096 else 20
+        sk = latency_percentiles(lambda: rf.predict(X_df), repeat=repeat)
+        fl = latency_percentiles(lambda: flat.predict(X), repeat=repeat)
+        print(f'batch {batch_size:>5} : sklearn p50 {sk["p50"]:8.2f} ms p99 {sk["p99"]:8.2f} ms | '
+              f'flat p50 {fl["p50"]:8.2f} ms p99 {fl["p99"]:8.2f} ms')
+
+
+def _sklearn_leaves(rf, X):
+    offsets = np.cumsum([0] + [e.tree_.node_count for e in rf.estimators_])[:-1]
+    return rf.apply(pd.DataFrame(X, columns=rf.feature_names_in_)) + offsets
+
+
+if __name__ == '__main__':
+    main()
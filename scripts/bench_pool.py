@@ -0,0 +1,87 @@
+"""Requests/sec of the scoring pool against worker count.
+
+Usage (from scripts/):  python bench_pool.py [--modes thread process] [--workers 1 2 4 8]
+                                             [--concurrency 256] [--seconds 5]
+
+For each mode and worker count, `concurrency` client coroutines submit single
+cars through the same MicroBatcher + ScoringPool setup that fast_api.py uses,
+and the completed requests/sec are reported. A bulk pass then times
+4096-row batches (rows/sec). Run it on the pod's node type; results depend
+on physical cores, not on what os.cpu_count() reports inside a container.
+"""
+import argparse
+import asyncio
+import os
+import time
+from functools import partial
+
+from batcher import MicroBatcher
+from model_bundle import load_model, MODELS_DIR, BUNDLES_DIR
+from model_registry import warmup_cars
+from scoring_pool import ScoringPool
+
+
+async def run_requests(pool, bundle, cars, concurrency, seconds, max_batch_size):
+    async def score(items):
+        return await pool.score(items, bundle)
+
+    batcher = MicroBatcher(score, max_batch_size=max_batch_size, max_wait_us=1000, max_queue=concurrency * 2,
+                           max_in_flight=pool.workers if pool.mode != 'inline' else 1)
+    await batcher.start()
+    done = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client(i):
+        nonlocal done
+        while time.perf_counter() < deadline:
+            await batcher.submit(cars[(i + done) % len(cars)])
+            done += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(i) for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    await batcher.stop()
+    return done / elapsed, batcher.batch_size.snapshot()['mean']
+
+
+async def run_bulk(pool, bundle, cars, rounds=5):
+    batch = (cars * (4096 // len(cars) + 1))[:4096]
+    await pool.score(batch, bundle)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await pool.score(batch, bundle)
+    return rounds * len(batch) / (time.perf_counter() - start)
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['inline', 'thread', 'process'])
+    parser.add_argument('--workers', nargs='+', type=int, default=sorted({1, 2, 4, cores} | set(range(8, cores + 1, 8))))
+    parser.add_argument('--concurrency', type=int, default=256)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--bundle')
+    args = parser.parse_args()
+
+    loader = partial(load_model, root=BUNDLES_DIR, models_dir=MODELS_DIR)
+    bundle = loader(args.bundle)
+    cars = warmup_cars(bundle.encoder, 256)
+    print(f'model {bundle.version}, os.cpu_count() = {cores}, concurrency {args.concurrency}')
+    print(f'{"mode":>8} {"workers":>7} {"req/s":>10} {"mean batch":>10} {"bulk rows/s":>12}')
+
+    for mode in args.modes:
+        for workers in ([1] if mode == 'inline' else args.workers):
+            pool = ScoringPool(mode=mode, workers=workers, loader=loader)
+            try:
+                if mode == 'process':
+                    asyncio.run(pool.score(cars, bundle))  # let every worker map the bundle first
+                rps, mean_batch = asyncio.run(run_requests(pool, bundle, cars, args.concurrency, args.seconds, args.max_batch_size))
+                rows = asyncio.run(run_bulk(pool, bundle, cars))
+            finally:
+                pool.shutdown()
+            print(f'{mode:>8} {workers:>7} {rps:>10.0f} {mean_batch:>10.1f} {rows:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Parse and score raw listing exports (datas/raw_data/car_price_prediction.csv
+format) chunk by chunk, for /predict/stream and score_listings.py."""
+import asyncio
+import io
+import json
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from feature_encoder import input_field
+from preprocessing import replace_categorical_by_numerical
+
+
+# columns parsed with string methods in replace_categorical_by_numerical; read
+# them as text so a chunk without "Turbo" or "-" is not inferred as numeric
+RAW_TEXT_COLUMNS = {'Levy' : str, 'Engine volume' : str, 'Mileage' : str}
+
+CAR_FIELDS = ['Levy', 'Manufacturer', 'Model', 'Prod_year', 'Category', 'Leather_interior', 'Fuel_type', 'Engine_volume',
+              'Mileage', 'Cylinders', 'Gear_box_type', 'Drive_wheels', 'Wheel', 'Color', 'Airbags']
+# the raw columns CAR_FIELDS come from
+RAW_FIELDS = [{'Prod_year' : 'Prod. year', **{v : k for k, v in input_field.items()}}.get(field, field) for field in CAR_FIELDS]
+
+
+def _to_cars(df):
+    df = replace_categorical_by_numerical(df.copy())
+    df = df.rename(columns={'Prod. year' : 'Prod_year', **input_field})
+    df['Leather_interior'] = df['Leather_interior'].map({1 : 'Yes' , 0 : 'No'})
+    return df[CAR_FIELDS].to_dict('records')
+
+
+def invalid_rows(df):
+    """{position : message} for the rows `replace_categorical_by_numerical` cannot parse, found column-wise.
+
+    Only the integer casts can fail: Levy must be an integer or '-', and
+    Mileage must contain a number. A missing column fails every row.
+    """
+    missing = [col for col in RAW_FIELDS if col not in df.columns]
+    if missing:
+        return dict.fromkeys(range(len(df)), f'KeyError: missing columns {missing}')
+
+    checks = {
+        'Levy' : df['Levy'].str.fullmatch(r'\s*([+-]?\d+|-)\s*'),
+        'Mileage' : df['Mileage'].str.contains(r'\d', regex=True),
+    }
+    errors = {}
+    for col, ok in checks.items():
+        for i in np.flatnonzero(~ok.fillna(False).to_numpy(dtype=bool)):
+            errors.setdefault(int(i), f'ValueError: cannot parse {col} {df[col].iloc[i]!r}')
+    return errors
+
+
+def parse_listings(df):
+    """Turn raw listing rows into `Inputs_Car` dicts.
+
+    Returns (cars, positions, errors): the parsed cars, their row positions in
+    `df`, and {position : message} for rows that could not be parsed. Bad rows
+    are found with column-wise checks and the rest is parsed in one pass, so a
+    dirty row costs no more than a clean one; only if that pass still fails
+    is the chunk retried row by row.
+    """
+    df = df.astype({col : str for col in RAW_TEXT_COLUMNS if col in df.columns})
+    errors = invalid_rows(df)
+    positions = [i for i in range(len(df)) if i not in errors]
+    try:
+        good = df if not errors else df.iloc[positions]
+        return (_to_cars(good) if positions else []), positions, errors
+    except Exception:
+        pass
+
+    cars, positions, errors = [], [], {}
+    for i in range(len(df)):
+        try:
+            cars.extend(_to_cars(df.iloc[i:i + 1]))
+            positions.append(i)
+        except Exception as e:
+            errors[i] = f'{type(e).__name__}: {e}'
+    return cars, positions, errors
+
+
+def merge_results(n, positions, scored, errors):
+    """One result per input row: the prediction or the exception / parse error message."""
+    results = [None] * n
+    for i, result in zip(positions, scored):
+        results[i] = result
+    for i, message in errors.items():
+        results[i] = ValueError(message)
+    return results
+
+
+def read_csv_chunks(path, chunk_rows):
+    return pd.read_csv(path, chunksize=chunk_rows, dtype=RAW_TEXT_COLUMNS)
+
+
+async def iter_lines(byte_chunks):
+    """Split an async stream of bytes into text lines, holding one partial line at most."""
+    pending = b''
+    async for data in byte_chunks:
+        pending += data
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            yield line.decode('utf-8').rstrip('\r')
+    if pending.strip():
+        yield pending.decode('utf-8').rstrip('\r')
+
+
+async def iter_frames(byte_chunks, fmt, chunk_rows):
+    """DataFrames of at most `chunk_rows` raw listings from a CSV (header first) or NDJSON stream."""
+    if fmt not in ('csv', 'ndjson'):
+        raise ValueError(f"format must be 'csv' or 'ndjson', got {fmt!r}")
+
+    header, lines = None, []
+
+    def frame():
+        if fmt == 'csv':
+            return pd.read_csv(io.StringIO('\n'.join([header] + lines)), dtype=RAW_TEXT_COLUMNS)
+        return pd.DataFrame([json.loads(line) for line in lines])
+
+    async for line in iter_lines(byte_chunks):
+        if not line.strip():
+            continue
+        if fmt == 'csv' and header is None:
+            header = line
+            continue
+        lines.append(line)
+        if len(lines) >= chunk_rows:
+            yield frame()
+            lines = []
+    if lines:
+        yield frame()
+
+
+class ResultSpool:
+    """Append-only result buffer on disk between a scoring task and a response.
+
+    The scoring task keeps reading the upload and `write`s results whether or
+    not the client is reading the response yet (most HTTP/1.1 clients send the
+    whole body first), so memory stays bounded by the chunk size while
+    full-duplex clients still get results as they are produced.
+    """
+
+    def __init__(self, block_size=1 << 16):
+        self.file = tempfile.TemporaryFile()
+        self.block_size = block_size
+        self.done = False
+        self.ready = asyncio.Event()
+
+    def write(self, text):
+        self.file.seek(0, 2)
+        self.file.write(text.encode('utf-8'))
+        self.ready.set()
+
+    def close(self):
+        self.done = True
+        self.ready.set()
+
+    async def drain(self):
+        position = 0
+        try:
+            while True:
+                self.file.seek(position)
+                data = self.file.read(self.block_size)
+                if data:
+                    position += len(data)
+                    yield data
+                elif self.done:
+                    return
+                else:
+                    self.ready.clear()
+                    await self.ready.wait()
+        finally:
+            self.file.close()
@@ -0,0 +1,227 @@
+"""Lazy, cached chart rendering for the Streamlit pages.
+
+`st.tabs` runs every tab's body on every rerun, even though only one tab is
+visible. The pages use a tab selector instead and call `render_tab` for the
+selected tab only.
+
+Each chart is rendered once to PNG (or SVG) bytes, or to Plotly JSON. It is
+stored in a process-wide `ChartCache` under a key of:
+
+  - the dataset version: the sha256 of the files the page reads
+  - the builder's name
+  - the chart parameters
+
+All sessions share one cache. A repeated view of a tab is only cache reads,
+plus the browser decoding the image. The cache is an LRU bounded by the
+total size of its entries (CHART_CACHE_BYTES, default 64 MB). A new dataset
+version gives new keys, and the old entries age out.
+
+Usage (from scripts/):  python chart_cache.py   # time to first chart: eager st.tabs vs lazy cold / warm
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from dataset_cache import DATAS_DIR, file_digest
+
+
+CHART_CACHE_BYTES = int(os.environ.get('CHART_CACHE_BYTES', 64 << 20))
+# what st.pyplot renders with, so cached images look the same as before
+DPI = 200
+
+
+@dataclass(frozen=True)
+class Chart:
+    format: str  # 'png', 'svg' or 'plotly'
+    data: bytes
+
+    @property
+    def nbytes(self):
+        return len(self.data)
+
+
+class ChartCache:
+    """Thread-safe LRU of `Chart`s, bounded by the total size of the rendered bytes."""
+
+    def __init__(self, max_bytes=CHART_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            chart = self._data.get(key)
+            if chart is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return chart
+
+    def set(self, key, chart):
+        if chart.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._data[key] = chart
+            self.nbytes += chart.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size' : len(self._data),
+            'bytes' : self.nbytes,
+            'max_bytes' : self.max_bytes,
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'hit_rate' : self.hits / lookups if lookups else 0.0,
+            'evictions' : self.evictions,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """The process-wide cache the pages share (Streamlit imports this module once per server)."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ChartCache()
+        return _default_cache
+
+
+def dataset_version(*paths):
+    """One digest over the content of `paths`; missing files are skipped (e.g. the pickles once the split store exists)."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if Path(path).exists():
+            digest.update(f'{Path(path).name}:{file_digest(path)};'.encode())
+    return digest.hexdigest()[:16]
+
+
+def chart_key(version, name, params=None):
+    payload = json.dumps([version, name, params or {}], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def to_chart(fig, fmt='png', dpi=DPI):
+    """Rendered bytes of a matplotlib figure, seaborn grid or Plotly figure; matplotlib figures are closed."""
+    if hasattr(fig, 'to_json'):
+        return Chart('plotly', fig.to_json().encode())
+
+    import matplotlib.pyplot as plt
+    figure = getattr(fig, 'figure', fig)  # seaborn grids wrap their figure
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    plt.close(figure)
+    return Chart(fmt, buffer.getvalue())
+
+
+def render(builder, args, version, cache=None, fmt='png', **params):
+    """`builder(*args, **params)` as a Chart, from `cache` when this version / builder / params was rendered before."""
+    cache = cache or default_cache()
+    key = chart_key(version, f'{builder.__module__}.{builder.__qualname__}', {'format' : fmt, **params})
+    chart = cache.get(key)
+    if chart is None:
+        chart = to_chart(builder(*args, **params), fmt)
+        cache.set(key, chart)
+    return chart
+
+
+def render_tab(builders, args, version, cache=None, fmt='png', **params):
+    """Charts of one tab, yielded one at a time so the page shows the first before building the rest."""
+    for builder in builders:
+        yield render(builder, args, version, cache, fmt, **params)
+
+
+def show(chart):
+    """Display a Chart on the current Streamlit page."""
+    import streamlit as st
+    if chart.format == 'plotly':
+        import plotly.io as pio
+        st.plotly_chart(pio.from_json(chart.data.decode()), use_container_width=True)
+    elif chart.format == 'svg':
+        st.image(chart.data.decode(), use_container_width=True)
+    else:
+        st.image(chart.data, use_container_width=True)
+
+
+if __name__ == '__main__':
+    import matplotlib
+    matplotlib.use('Agg')
+    import warnings
+    warnings.simplefilter('ignore')  # seaborn palette-without-hue notices
+
+    import dashboard_charts
+    from aggregate_cube import load_cube
+    from dataset_cache import load_clean
+    from dataset_store import load_split
+    from perf import format_bytes
+
+    clean, filtering = DATAS_DIR / 'clean_car.csv', DATAS_DIR / 'clean_car_filtering.csv'
+    ytest, ypred = load_split(['ytest', 'ypred'])
+    views = {
+        'analytics / Static Visualization' : (dashboard_charts.ANALYTICS_TABS, (load_cube(clean), load_cube(filtering))),
+        'preprocessing / Model Visualization' : (dashboard_charts.MODEL_TABS, (load_clean(clean), ytest, ypred)),
+        'preprocessing / Detection Outliers' : (dashboard_charts.OUTLIER_TABS, (load_clean(clean), ytest, ypred)),
+    }
+
+    def eager(tabs, args):
+        """What st.tabs did: every tab built and rendered, in order; seconds until each tab's first chart."""
+        start, first = time.perf_counter(), {}
+        for label, builders in tabs.items():
+            for i, builder in enumerate(builders):
+                to_chart(builder(*args))
+                if i == 0:
+                    first[label] = time.perf_counter() - start
+        return first, time.perf_counter() - start
+
+    def lazy(tabs, args, cache, version):
+        """Each tab on its own through render_tab: seconds to its first chart and to the whole tab."""
+        times = {}
+        for label, builders in tabs.items():
+            start = time.perf_counter()
+            charts = render_tab(builders, args, version, cache)
+            next(charts)
+            first = time.perf_counter() - start
+            list(charts)
+            times[label] = (first, time.perf_counter() - start)
+        return times
+
+    cache = ChartCache()
+    for view, (tabs, args) in views.items():
+        version = dataset_version(clean, filtering) + view
+        first_eager, rerun = eager(tabs, args)
+        cold = lazy(tabs, args, cache, version)
+        warm = lazy(tabs, args, cache, version)
+        print(f'\n{view}: eager rerun builds all {len(tabs)} tabs in {rerun:.2f} s')
+        print(f'  {"tab":<26} {"first chart: eager":>19} {"lazy cold":>10} {"lazy warm":>10}')
+        for label in tabs:
+            print(f'  {label:<26} {first_eager[label]:18.3f}s {cold[label][0]:9.3f}s {warm[label][0] * 1e3:8.3f}ms')
+    stats = cache.stats()
+    print(f'\ncache: {stats["size"]} charts, {format_bytes(stats["bytes"])} of {format_bytes(stats["max_bytes"])}, '
+          f'hit rate {stats["hit_rate"]:.0%}')
@@ -0,0 +1,207 @@
+"""Cross-validate every model x encoding combination in a process pool, with cached folds.
+
+Usage (from scripts/):
+    python cv_runner.py [--models linear random_forest] [--encodings onehot_label target]
+                        [--folds 10] [--test-size 0.3] [--workers N]
+                        [--param random_forest.n_estimators=200 ...] [--out ../models/cv_results.csv]
+
+This is the experiment of notebooks 5_training_cross_validation_LE and
+6_training_cross_validation_TE, scripted.
+
+  onehot_label : one-hot for Gear box type, Drive wheels, Wheel and Fuel type,
+                 label codes for Manufacturer, Model, Category and Color, and a
+                 scaler fitted per fold (the FeaturePipeline features the API serves)
+  target       : one-hot for Gear box type, Drive wheels and Wheel, and per-fold
+                 train-mean target encoding (unseen -> global mean) for
+                 Manufacturer, Model, Category, Cylinders, Fuel type, Color and
+                 Airbags, scaled with the numeric columns (notebook 6)
+
+The folds are KFold splits of the training part (after the --test-size
+holdout the notebooks also leave out). Each fold's encoded train / validation
+matrices are written once per encoding under datas/.cache/cv/ as .npy files.
+The key is the cleaned data, the split settings and the source of the
+encoding. Re-running with other models or hyperparameters (--param) reuses
+them, and the workers memory-map them instead of receiving pickled copies.
+
+The table gives mean (std) R2 / RMSE over the folds and the mean fit and
+predict seconds per fold.
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import KFold, train_test_split
+
+import feature_pipeline
+import preprocessing
+from dataset_cache import CACHE_DIR, RAW_DATA_PATH, file_digest, load_preprocessed
+from feature_pipeline import FeaturePipeline
+
+
+CV_CACHE_DIR = CACHE_DIR / 'cv'
+
+MODELS = {
+    'linear' : LinearRegression,
+    'random_forest' : RandomForestRegressor,
+}
+
+TARGET_ONE_HOT = ['Gear box type', 'Drive wheels', 'Wheel']
+TARGET_ENCODED = ['Manufacturer', 'Model', 'Category', 'Cylinders', 'Fuel type', 'Color', 'Airbags']
+TARGET_SCALED = ['Levy', 'Engine volume', 'Mileage', 'Age'] + TARGET_ENCODED
+
+
+# --- encodings: (df, train index, validation index) -> (xtrain, xval) float64 matrices ---
+
+def encode_onehot_label(df, train_index, val_index):
+    pipeline = FeaturePipeline().fit(df, scale_rows=train_index)
+    return pipeline.transform_frame(df.loc[train_index]).to_numpy(), pipeline.transform_frame(df.loc[val_index]).to_numpy()
+
+
+def encode_target(df, train_index, val_index):
+    x = df.drop(columns=['Price'])
+    x = pd.concat([x.drop(columns=TARGET_ONE_HOT), pd.get_dummies(x[TARGET_ONE_HOT], dtype=float)], axis=1)
+    xtrain, xval = x.loc[train_index].copy(), x.loc[val_index].copy()
+
+    price = df.loc[train_index, 'Price']
+    global_mean = price.mean()
+    for col in TARGET_ENCODED:
+        means = price.groupby(xtrain[col]).mean()
+        xtrain[col] = xtrain[col].map(means).astype(float).fillna(global_mean)
+        xval[col] = xval[col].map(means).astype(float).fillna(global_mean)
+
+    mean, std = xtrain[TARGET_SCALED].mean(), xtrain[TARGET_SCALED].std(ddof=0).replace(0, 1)
+    xtrain[TARGET_SCALED] = (xtrain[TARGET_SCALED] - mean) / std
+    xval[TARGET_SCALED] = (xval[TARGET_SCALED] - mean) / std
+    return xtrain.to_numpy(dtype=np.float64), xval.to_numpy(dtype=np.float64)
+
+
+ENCODINGS = {
+    'onehot_label' : encode_onehot_label,
+    'target' : encode_target,
+}
+
+
+def fold_key(encoding, settings, data_digest):
+    digest = hashlib.sha256()
+    sources = [Path(preprocessing.__file__).read_bytes(), Path(feature_pipeline.__file__).read_bytes(),
+               inspect.getsource(ENCODINGS[encoding]).encode()]
+    for part in sources + [data_digest.encode(), encoding.encode(), json.dumps(settings, sort_keys=True).encode()]:
+        digest.update(hashlib.sha256(part).digest())
+    return f'{encoding}-{digest.hexdigest()[:16]}'
+
+
+def build_folds(df, encoding, settings, data_digest, cache_dir=CV_CACHE_DIR):
+    """Directory holding fold<i>/{xtrain,ytrain,xval,yval}.npy for `encoding`; built only when missing."""
+    directory = Path(cache_dir) / fold_key(encoding, settings, data_digest)
+    if (directory / 'done').exists():
+        return directory, False
+
+    shutil.rmtree(directory, ignore_errors=True)
+    train_part, _ = train_test_split(df.index, test_size=settings['test_size'], random_state=settings['seed']) \
+        if settings['test_size'] else (df.index, None)
+    kfold = KFold(n_splits=settings['folds'], shuffle=True, random_state=settings['seed'])
+    for i, (train_pos, val_pos) in enumerate(kfold.split(train_part)):
+        train_index, val_index = train_part[train_pos], train_part[val_pos]
+        xtrain, xval = ENCODINGS[encoding](df, train_index, val_index)
+        fold = directory / f'fold{i}'
+        fold.mkdir(parents=True)
+        for name, array in [('xtrain', xtrain), ('xval', xval),
+                            ('ytrain', df.loc[train_index, 'Price'].to_numpy(dtype=np.float64)),
+                            ('yval', df.loc[val_index, 'Price'].to_numpy(dtype=np.float64))]:
+            np.save(fold / f'{name}.npy', np.ascontiguousarray(array), allow_pickle=False)
+    (directory / 'done').write_text(json.dumps({'encoding' : encoding, **settings}))
+    return directory, True
+
+
+def fit_fold(model, params, fold):
+    """Worker: fit `model` on one cached fold; returns scores and timings."""
+    arrays = {name : np.load(Path(fold) / f'{name}.npy', mmap_mode='r') for name in ['xtrain', 'ytrain', 'xval', 'yval']}
+    estimator = MODELS[model](**params)
+    start = time.perf_counter()
+    estimator.fit(arrays['xtrain'], arrays['ytrain'])
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    predictions = estimator.predict(arrays['xval'])
+    predict_seconds = time.perf_counter() - start
+    mse = mean_squared_error(arrays['yval'], predictions)
+    return {'r2' : r2_score(arrays['yval'], predictions), 'rmse' : float(np.sqrt(mse)), 'mse' : mse,
+            'fit_s' : fit_seconds, 'predict_s' : predict_seconds, 'n_train' : len(arrays['ytrain']),
+            'n_features' : arrays['xtrain'].shape[1]}
+
+
+def parse_params(values):
+    """['random_forest.n_estimators=200', ...] -> {'random_forest' : {'n_estimators' : 200}}"""
+    params = {model : {} for model in MODELS}
+    for value in values:
+        name, raw = value.split('=', 1)
+        model, param = name.split('.', 1)
+        if model not in MODELS:
+            raise ValueError(f'unknown model {model!r} in --param {value}')
+        try:
+            params[model][param] = json.loads(raw)
+        except ValueError:
+            params[model][param] = raw
+    return params
+
+
+def summarize(results):
+    table = results.groupby(['model', 'encoding'], sort=False).agg(
+        r2_mean=('r2', 'mean'), r2_std=('r2', 'std'), rmse_mean=('rmse', 'mean'), rmse_std=('rmse', 'std'),
+        fit_s=('fit_s', 'mean'), predict_s=('predict_s', 'mean'), n_features=('n_features', 'first'))
+    return table.sort_values('r2_mean', ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default=RAW_DATA_PATH)
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument('--encodings', nargs='+', choices=list(ENCODINGS), default=list(ENCODINGS))
+    parser.add_argument('--folds', type=int, default=10)
+    parser.add_argument('--test-size', type=float, default=0.3, help='holdout left out of the CV, 0 for none')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--param', nargs='*', default=[], help='model.param=value, e.g. random_forest.max_depth=20')
+    parser.add_argument('--out', help='write the per-fold results as CSV')
+    args = parser.parse_args()
+
+    params = parse_params(args.param)
+    settings = {'folds' : args.folds, 'test_size' : args.test_size, 'seed' : args.seed}
+
+    df = load_preprocessed(args.input)
+    data_digest = f'{file_digest(args.input)}-{pd.Timestamp.now().year}'
+    folds = {}
+    for encoding in args.encodings:
+        start = time.perf_counter()
+        folds[encoding], built = build_folds(df, encoding, settings, data_digest)
+        state = f'built in {time.perf_counter() - start:.2f} s' if built else 'cached'
+        print(f'{encoding:<14} {args.folds} folds {state} ({folds[encoding].name})')
+
+    jobs = [(model, encoding, i) for model in args.models for encoding in args.encodings for i in range(args.folds)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.workers) as pool:
+        futures = [pool.submit(fit_fold, model, params[model], folds[encoding] / f'fold{i}') for model, encoding, i in jobs]
+        rows = [{'model' : model, 'encoding' : encoding, 'fold' : i, **future.result()}
+                for (model, encoding, i), future in zip(jobs, futures)]
+    print(f'{len(jobs)} fits on {args.workers} workers in {time.perf_counter() - start:.1f} s\n')
+
+    results = pd.DataFrame(rows)
+    with pd.option_context('display.float_format', '{:,.4f}'.format, 'display.width', 200):
+        print(summarize(results).to_string())
+    if args.out:
+        results.assign(params=[json.dumps(params[model]) for model in results['model']]).to_csv(args.out, index=False)
+        print(f'\nper-fold results written to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""Figure builders for the dashboard pages, one function per chart.
+
+The pages render these through `chart_cache.render_tab`, so only the selected
+tab's figures are built, and each is built once per dataset version.
+
+  analytics page (1_analyzis_visualization)      builder(cube, cube_filter)
+  preprocessing page (2_preprocessing_vizualization)  builder(df, ytest, ypred)
+
+ANALYTICS_TABS, MODEL_TABS and OUTLIER_TABS map each tab label to its
+builders, in display order. The model and distribution builders reduce their
+data to `budget` points per series (plot_reducer.py); budget=None plots
+everything.
+"""
+import matplotlib.pyplot as plt
+import numpy as np
+import plotly.graph_objects as go
+import seaborn as sns
+from matplotlib.colors import LogNorm
+from plotly.subplots import make_subplots
+
+from plot_reducer import POINT_BUDGET, bin2d, kde_grid, lttb_indices, minmax_indices
+
+
+RECENT_YEARS = range(2010, 2020)
+
+
+def top_manufacturers(cube_filter):
+    """Manufacturers in both the top 10 by revenue and the top 10 by count, at most 9."""
+    top_10_price = cube_filter.top('Manufacturer', 10, measure='sum').index
+    top_10_count = cube_filter.top('Manufacturer', 10, measure='count').index
+    return [i for i in top_10_price if i in top_10_count][:9]
+
+
+# --- analytics page: static visualization ---
+
+def manufacturer_mean_price(cube, cube_filter):
+    mean_price = cube.top('Manufacturer', measure='mean')['mean']
+    fig, ax = plt.subplots(figsize=(15,7))
+    mean_price.plot(kind='bar', ax=ax, color='#00d2ff')
+    ax.set_title("Manufacturers vs Mean Price", color='white', fontsize=18)
+    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha='right')
+    return fig
+
+
+def manufacturer_total_price(cube, cube_filter):
+    Manufacturer_vs_price = cube.top('Manufacturer', measure='sum')['sum']
+    fig2, ax2 = plt.subplots(figsize=(15,7))
+    Manufacturer_vs_price.plot(kind='bar', ax=ax2, color='#ff0055')
+    ax2.set_title("Manufacturers vs Total Price", color='white', fontsize=18)
+    ax2.tick_params(axis='x', rotation=75)
+    return fig2
+
+
+def manufacturer_count(cube, cube_filter):
+    counts = cube.top('Manufacturer', measure='count')['count']
+    fig3, ax3 = plt.subplots(figsize=(15,7))
+    sns.barplot(x=counts.index, y=counts.values, ax=ax3, palette="viridis")
+    ax3.set_title("Manufacturers Count", color='white', fontsize=18)
+    ax3.tick_params(axis='x', rotation=75)
+    return fig3
+
+
+def filtered_manufacturer_count(cube, cube_filter):
+    counts = cube_filter.top('Manufacturer', measure='count')['count']
+    fig, ax = plt.subplots(figsize=(15,6))
+    sns.barplot(x=counts.values, y=counts.index, ax=ax, palette="magma")
+    ax.set_title("Manufacturers Count (Filtered)", color='white')
+    return fig
+
+
+def filtered_manufacturer_total_price(cube, cube_filter):
+    fig2, ax2 = plt.subplots(figsize=(13,6))
+    Manufacturer_vs_price = cube_filter.top('Manufacturer', measure='sum', ascending=True)['sum']
+    Manufacturer_vs_price.plot(kind='barh', ax=ax2, color='skyblue')
+    ax2.set_title("Manufacturers vs Total Price (Filtered)", color='white')
+    return fig2
+
+
+def model_pricing_grid(cube, cube_filter):
+    union_top_9 = top_manufacturers(cube_filter)
+    fig, axes = plt.subplots(3, 3, figsize=(14, 12))
+    axes = axes.flatten()
+    for ax, manufacturer in zip(axes, union_top_9):
+        model_top_10 = cube_filter.top('Model', 10, where={'Manufacturer' : manufacturer}).index
+        df_temp = cube_filter.top('Model', measure='sum', where={'Model' : model_top_10})['sum']
+        df_temp.plot(kind='bar', ax=ax, color='#00d2ff')
+        ax.set_title(f"{manufacturer}'s model", color='white')
+        ax.tick_params(axis='x', rotation=45)
+
+    for i in range(len(union_top_9), len(axes)): fig.delaxes(axes[i])
+    fig.tight_layout()
+    return fig
+
+
+def model_volume_grid(cube, cube_filter):
+    union_top_9 = top_manufacturers(cube_filter)
+    fig, axes = plt.subplots(3, 3, figsize=(15, 12))
+    axes = axes.flatten()
+    for ax, manufacturer in zip(axes, union_top_9):
+        model_top_10 = cube.top('Model', 10, where={'Manufacturer' : manufacturer})['count']
+        sns.barplot(x=model_top_10.values, y=model_top_10.index, ax=ax, palette="coolwarm")
+        ax.set_title(f"{manufacturer}'s Top Models", color='white', fontweight='bold')
+
+    for i in range(len(union_top_9), len(axes)): fig.delaxes(axes[i])
+    fig.tight_layout()
+    return fig
+
+
+def yearly_revenue_grid(cube, cube_filter):
+    union_top_9 = top_manufacturers(cube_filter)
+    fig, axes = plt.subplots(3, 3, figsize=(15, 12))
+    axes = axes.flatten()
+    years = list(RECENT_YEARS)
+    for ax, manufacturer in zip(axes, union_top_9):
+        df_yr = cube.rollup('Prod. year', {'Manufacturer' : manufacturer, 'Prod. year' : RECENT_YEARS})['sum']
+        ax.bar(range(len(df_yr)), df_yr.values, color='skyblue', alpha=0.6, label='Revenue')
+        ax.plot(range(len(df_yr)), df_yr.values, color='royalblue', marker='o', linewidth=2, label='Trend')
+        ax.set_title(f"{manufacturer}", color='white')
+        ax.set_xticks(range(len(years)))
+        ax.set_xticklabels(years, rotation=45)
+
+    for i in range(len(union_top_9), len(axes)): fig.delaxes(axes[i])
+    fig.tight_layout()
+    return fig
+
+
+def categorical_distribution(cube, cube_filter):
+    bie_char_list = ['Fuel type','Gear box type','Drive wheels','Wheel']
+    fig, axes = plt.subplots(2, 2, figsize=(12, 10))
+    axes = axes.flatten()
+    for ax, col in zip(axes, bie_char_list):
+        counts = cube.marginal(col)['count'].sort_values(ascending=False).head(4)
+        ax.pie(counts, labels=counts.index, autopct='%1.1f%%', startangle=90, explode=[0.05]*len(counts), shadow=True)
+        ax.set_title(f"{col} Distribution", color='white', fontsize=14)
+    fig.tight_layout()
+    return fig
+
+
+ANALYTICS_TABS = {
+    '📊 Mfr vs Price' : [manufacturer_mean_price, manufacturer_total_price, manufacturer_count],
+    '📈 Filtered View' : [filtered_manufacturer_count, filtered_manufacturer_total_price],
+    '🏢 Model Pricing' : [model_pricing_grid],
+    '🔥 Top Models' : [model_volume_grid],
+    '⏳ Yearly Trends' : [yearly_revenue_grid],
+    '🍕 Distribution' : [categorical_distribution],
+}
+
+
+# --- preprocessing page: model visualization ---
+
+def actual_prices(df, ytest, ypred, budget=POINT_BUDGET):
+    y_test_array = np.array(ytest)
+    y_test_sorted = np.sort(y_test_array)
+    # min/max buckets keep the noisy series' envelope, LTTB the sorted curve's shape
+    raw = minmax_indices(y_test_array, budget)
+    ordered = lttb_indices(y_test_sorted, budget)
+    fig, ax = plt.subplots(1, 2, figsize=(15,5), facecolor='#161b22')
+    sns.scatterplot(x=raw, y=y_test_array[raw], alpha=0.6, ax=ax[0], color='#00d2ff')
+    ax[0].set_facecolor('#0d1117')
+    ax[0].set_title("Actual Prices", color='white')
+
+    sns.scatterplot(x=ordered, y=y_test_sorted[ordered], alpha=0.4, ax=ax[1], color='#00d2ff')
+    ax[1].set_facecolor('#0d1117')
+    ax[1].set_title("Actual Prices (Sorted)", color='white')
+    fig.tight_layout()
+    return fig
+
+
+def residuals(df, ytest, ypred, budget=POINT_BUDGET):
+    y_test_array = np.array(ytest)
+    y_pred_array = np.array(ypred)
+    sorted_index = np.argsort(y_test_array)
+    residuals = y_test_array[sorted_index] - y_pred_array[sorted_index]
+    kept = minmax_indices(residuals, budget)
+    fig2, ax2 = plt.subplots(1, 2, figsize=(15,5), facecolor='#161b22')
+    sns.scatterplot(x=kept, y=residuals[kept], ax=ax2[0], color='#ff0055')
+    ax2[0].axhline(y=0, color='green', linewidth=3)
+    ax2[0].set_facecolor('#0d1117')
+    ax2[0].set_title("Residuals (Error)", color='white')
+
+    # Distance plotting logic: every point up to the budget, a 2-D histogram beyond it
+    if budget is None or len(y_test_array) <= budget:
+        ax2[1].scatter(y_test_array, y_pred_array, alpha=0.6, c='#00d2ff')
+    else:
+        counts, xedges, yedges = bin2d(y_test_array, y_pred_array)
+        ax2[1].pcolormesh(xedges, yedges, np.ma.masked_equal(counts.T, 0), cmap='mako', norm=LogNorm())
+    ax2[1].plot([y_test_array.min(), y_test_array.max()], [y_test_array.min(), y_test_array.max()], 'r--')
+    ax2[1].set_facecolor('#0d1117')
+    ax2[1].set_title("Actual vs Predicted", color='white')
+    return fig2
+
+
+def prices_interactive(df, ytest, ypred, budget=POINT_BUDGET):
+    y_test_array = np.array(ytest)
+    y_test_sorted = np.sort(y_test_array)
+    raw = minmax_indices(y_test_array, budget)
+    ordered = lttb_indices(y_test_sorted, budget)
+    fig1 = make_subplots(rows=1, cols=2, subplot_titles=("Car Prices", "Sorted Car Prices"))
+    fig1.add_trace(go.Scatter(x=raw, y=y_test_array[raw], mode='markers', marker=dict(color='#00d2ff')), row=1, col=1)
+    fig1.add_trace(go.Scatter(x=ordered, y=y_test_sorted[ordered], mode='markers', marker=dict(color='#00d2ff')), row=1, col=2)
+    fig1.update_layout(template="plotly_dark", height=500, showlegend=False)
+    return fig1
+
+
+MODEL_TABS = {
+    '🎨 Matplotlib Analytics' : [actual_prices, residuals],
+    '⚡ Plotly Interactive' : [prices_interactive],
+}
+
+
+# --- preprocessing page: detection outliers ---
+
+def correlation_heatmap(df, ytest, ypred):
+    fig, ax = plt.subplots(figsize=(10,5), facecolor='#161b22')
+    sns.heatmap(df.corr(numeric_only=True), annot=True, cmap="mako", ax=ax)
+    return fig
+
+
+def _kde(values, ax, color, budget):
+    """sns.kdeplot(values), from a precomputed grid unless budget is None."""
+    if budget is None:
+        sns.kdeplot(values, ax=ax, color=color)
+        return
+    grid, density = kde_grid(values)
+    ax.plot(grid, density, color=color)
+    ax.set_xlabel(values.name)
+    ax.set_ylabel('Density')
+
+
+def log_distributions(df, ytest, ypred, budget=POINT_BUDGET):
+    num_cols = df.select_dtypes(include='number').columns
+    fig = plt.figure(figsize=(15, 12), facecolor='#161b22')
+    outer = fig.add_gridspec(3, 3)
+    for i, col in enumerate(num_cols[:9]):
+        inner = outer[i].subgridspec(1, 2, wspace=0.3)
+        ax1 = fig.add_subplot(inner[0], facecolor='#0d1117'); _kde(df[col], ax1, '#00d2ff', budget)
+        ax2 = fig.add_subplot(inner[1], facecolor='#0d1117'); _kde(np.log1p(df[col]), ax2, '#ff0055', budget)
+    return fig
+
+
+def pairplot_sample(df, ytest, ypred):
+    return sns.pairplot(df[:100], palette="mako")
+
+
+def deep_boxplots(df, ytest, ypred):
+    # Your complex 4-column boxplot row
+    num_col = ['Price', 'Levy', 'Engine volume', 'Mileage']
+    fig, axes = plt.subplots(len(num_col), 4, figsize=(20, 15), facecolor='#161b22')
+    for i, col in enumerate(num_col):
+        sns.boxplot(x=df[col], ax=axes[i,0], color='#00d2ff')
+        sns.boxplot(x=df[col], ax=axes[i,1], showfliers=False, color='#00d2ff')
+        sns.boxenplot(x=df[col], ax=axes[i,2], color='#ff0055')
+        sns.boxenplot(x=df[col], ax=axes[i,3], showfliers=False, color='#ff0055')
+        for j in range(4): axes[i,j].set_facecolor('#0d1117')
+    return fig
+
+
+def categorical_vs_price(df, ytest, ypred):
+    fig, axes = plt.subplots(2, 2, figsize=(15, 10), facecolor='#161b22')
+    axes = axes.flatten()
+    for ax, col in zip(axes, ['Cylinders', 'Engine volume', 'Airbags']):
+        top_categorical = df[col].value_counts().index[:10]
+        sns.boxplot(x=df[df[col].isin(top_categorical)][col], y=df['Price'], ax=ax, palette="flare")
+        ax.set_facecolor('#0d1117')
+    return fig
+
+
+OUTLIER_TABS = {
+    'Heatmap' : [correlation_heatmap],
+    'Distribution (Log)' : [log_distributions],
+    'Pairplot' : [pairplot_sample],
+    'Deep Boxplots' : [deep_boxplots],
+    'Categorical vs Price' : [categorical_vs_price],
+}
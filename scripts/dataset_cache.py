@@ -0,0 +1,199 @@
+"""Columnar on-disk cache for the cleaned and preprocessed datasets.
+
+Each cached frame is a directory of one .npy file per column plus
+schema.json. Strings are stored as category codes with the categories in
+the schema, so every array is memory-mappable. The directory name is a hash
+of:
+
+  - the input file content (the digest is memoised on size + mtime, so an
+    unchanged file is not re-read)
+  - the source of preprocessing.py and of this module
+  - the loader parameters
+
+Editing the CSV, the pipeline code or the parameters therefore gives a new
+key, and the stale entry is rebuilt on the next load.
+
+Usage (from scripts/):  python dataset_cache.py [--clear]   # cold / warm load times vs read_csv
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import preprocessing
+
+
+DATAS_DIR = Path(__file__).resolve().parent.parent / 'datas'
+CACHE_DIR = DATAS_DIR / '.cache'
+RAW_DATA_PATH = DATAS_DIR / 'raw_data' / 'car_price_prediction.csv'
+FORMAT_VERSION = 1
+
+_CODE_HASH = hashlib.sha256(Path(preprocessing.__file__).read_bytes() + Path(__file__).read_bytes()).hexdigest()
+
+
+def _writer_id():
+    """Unique per writer, not per process: Streamlit sessions are threads of one process."""
+    return f'{os.getpid()}-{uuid.uuid4().hex[:12]}'
+
+
+def file_digest(path, cache_dir=CACHE_DIR):
+    """sha256 of `path`, memoised in cache_dir/digests.json by (size, mtime_ns)."""
+    path = Path(path).resolve()
+    stat = path.stat()
+    memo_path = Path(cache_dir) / 'digests.json'
+    try:
+        memo = json.loads(memo_path.read_text())
+    except (OSError, ValueError):
+        memo = {}
+    entry = memo.get(str(path))
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    memo[str(path)] = {'size' : stat.st_size, 'mtime_ns' : stat.st_mtime_ns, 'sha256' : digest.hexdigest()}
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    tmp = memo_path.with_suffix(f'.{_writer_id()}.tmp')
+    tmp.write_text(json.dumps(memo, indent=1))
+    tmp.replace(memo_path)
+    return digest.hexdigest()
+
+
+def cache_key(path, name, params, cache_dir=CACHE_DIR):
+    digest = hashlib.sha256()
+    for part in [str(FORMAT_VERSION), name, file_digest(path, cache_dir), _CODE_HASH, json.dumps(params, sort_keys=True)]:
+        digest.update(part.encode())
+    return f'{name}-{digest.hexdigest()[:16]}'
+
+
+def save_frame(df, directory):
+    """Write `df` as per-column .npy files plus schema.json, atomically."""
+    directory = Path(directory)
+    staging = directory.with_name(f'.staging-{directory.name}-{_writer_id()}')
+    staging.mkdir(parents=True, exist_ok=True)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        entry = {'name' : col, 'file' : f'{i}.npy', 'dtype' : str(s.dtype)}
+        if isinstance(s.dtype, pd.CategoricalDtype) or s.dtype == 'object' or pd.api.types.is_string_dtype(s.dtype):
+            categorical = s.astype('category') if not isinstance(s.dtype, pd.CategoricalDtype) else s
+            entry['categories'] = categorical.cat.categories.tolist()
+            entry['ordered'] = bool(categorical.cat.ordered)
+            array = categorical.cat.codes.to_numpy()
+        else:
+            array = s.to_numpy()
+        np.save(staging / entry['file'], array, allow_pickle=False)
+        columns.append(entry)
+
+    index = None
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        np.save(staging / 'index.npy', df.index.to_numpy(), allow_pickle=False)
+        index = 'index.npy'
+
+    with open(staging / 'schema.json', 'w') as f:
+        json.dump({'format_version' : FORMAT_VERSION, 'rows' : len(df), 'columns' : columns, 'index' : index}, f, indent=1)
+
+    try:
+        staging.rename(directory)
+    except OSError:
+        # another writer published the same entry first; same key, same content
+        shutil.rmtree(staging, ignore_errors=True)
+        if not (directory / 'schema.json').exists():
+            raise
+    return directory
+
+
+def load_frame(directory, mmap=False):
+    """Inverse of `save_frame`.
+
+    With `mmap` the numeric columns are read-only views of the mapped files:
+    near-free to load and shared between processes, but in-place writes
+    raise, so only read-only consumers should ask for it.
+    """
+    directory = Path(directory)
+    schema = json.loads((directory / 'schema.json').read_text())
+    mmap_mode = 'r' if mmap else None
+    data = {}
+    for entry in schema['columns']:
+        array = np.asarray(np.load(directory / entry['file'], mmap_mode=mmap_mode))
+        if 'categories' in entry:
+            categorical = pd.Categorical.from_codes(array, entry['categories'], ordered=entry['ordered'])
+            data[entry['name']] = categorical if entry['dtype'] == 'category' else pd.Series(categorical).astype(entry['dtype']).array
+        else:
+            data[entry['name']] = array
+    index = pd.Index(np.load(directory / schema['index'])) if schema['index'] else None
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def cached(path, name, build, params=None, cache_dir=CACHE_DIR, mmap=False):
+    """Return `build()` for `path`, from the cache when the key is still valid."""
+    params = params or {}
+    directory = Path(cache_dir) / cache_key(path, name, params, cache_dir)
+    if (directory / 'schema.json').exists():
+        try:
+            return load_frame(directory, mmap)
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(directory, ignore_errors=True)
+
+    df = build()
+    for stale in Path(cache_dir).glob(f'{name}-*'):
+        if stale.name.rsplit('-', 1)[0] == name and stale != directory:
+            shutil.rmtree(stale, ignore_errors=True)
+    save_frame(df, directory)
+    return df
+
+
+def load_clean(path, compact=False, cache_dir=CACHE_DIR, mmap=False):
+    """A cleaned dataset CSV (clean_car.csv, clean_car_filtering.csv), as `pd.read_csv` or `read_clean_csv` returns it."""
+    path = Path(path)
+    name = f'{path.stem}{"-compact" if compact else ""}'
+    return cached(path, name, lambda: preprocessing.read_clean_csv(path, compact=compact), {'compact' : compact}, cache_dir, mmap)
+
+
+def load_preprocessed(path=RAW_DATA_PATH, compact=False, cache_dir=CACHE_DIR, mmap=False):
+    """`preprocessing_pipline` output for the raw CSV at `path`."""
+    def build():
+        return preprocessing.preprocessing_pipline(pd.read_csv(path), compact=compact)
+    name = f'preprocessed{"-compact" if compact else ""}'
+    return cached(path, name, build, {'compact' : compact, 'year' : pd.Timestamp.now().year}, cache_dir, mmap)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clear', action='store_true', help='delete the cache first')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(name)s: %(message)s')  # the pipeline's INFO progress stays quiet
+    if args.clear:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def timed(fn):
+        start = time.perf_counter()
+        result = fn()
+        return result, (time.perf_counter() - start) * 1e3
+
+    for path in [DATAS_DIR / 'clean_car.csv', DATAS_DIR / 'clean_car_filtering.csv']:
+        expected, csv_ms = timed(lambda: pd.read_csv(path))
+        shutil.rmtree(CACHE_DIR / cache_key(path, path.stem, {'compact' : False}), ignore_errors=True)
+        _, cold_ms = timed(lambda: load_clean(path))
+        got, warm_ms = timed(lambda: load_clean(path))
+        pd.testing.assert_frame_equal(got, expected)
+        _, mmap_ms = timed(lambda: load_clean(path, mmap=True))
+        print(f'{path.name:<28} read_csv {csv_ms:7.1f} ms  cold {cold_ms:7.1f} ms  warm {warm_ms:7.1f} ms  '
+              f'warm mmap {mmap_ms:7.1f} ms  identical')
+
+    expected, pipeline_ms = timed(lambda: preprocessing.preprocessing_pipline(pd.read_csv(RAW_DATA_PATH)))
+    load_preprocessed()
+    got, warm_ms = timed(load_preprocessed)
+    pd.testing.assert_frame_equal(got, expected)
+    print(f'{"preprocessing_pipline":<28} read_csv + pipeline {pipeline_ms:7.1f} ms  warm {warm_ms:7.1f} ms  identical')
@@ -0,0 +1,207 @@
+"""Process-wide, read-only access to the cleaned datasets for the dashboard pages.
+
+Streamlit runs every browser session's script in a thread of one server
+process. `default_provider()` gives all sessions and pages the same
+`DatasetProvider`:
+
+  - each dataset is loaded once per form, through `dataset_cache.load_clean`,
+    so a warm start does not parse the CSV. By default that is the compact
+    dtype plan (categories and downcast numerics: 0.9 MB instead of 9.9 MB
+    for clean_car.csv); `frame(name, compact=False)` gives read_csv's dtypes,
+    for charts whose values must match the CSV's
+  - the frames' buffers are marked read-only, so an in-place write by one
+    session raises instead of leaking into the others (take a `.copy()` to
+    modify)
+  - a dataset is reloaded when its file changes (size or mtime), checked at
+    most every `check_interval` seconds; sessions keep the frame they hold
+    until their next rerun
+  - `cube(name)` gives the dataset's aggregate cube, rebuilt with it
+
+Usage (from scripts/):
+    python dataset_provider.py [--sessions 1 4 16 64]   # RSS and first-render latency, per-session copies vs shared
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import DATAS_DIR, file_digest, load_clean
+
+
+DATASETS = {
+    'clean' : DATAS_DIR / 'clean_car.csv',
+    'filtering' : DATAS_DIR / 'clean_car_filtering.csv',
+}
+
+
+def freeze(df):
+    """Mark the numpy buffers behind `df` (category codes included) read-only; returns `df`."""
+    for array in df._mgr.arrays:
+        array = getattr(array, '_ndarray', array)
+        if isinstance(array, np.ndarray):
+            array.flags.writeable = False
+    return df
+
+
+class DatasetProvider:
+
+    def __init__(self, paths=DATASETS, compact=True, check_interval=1.0):
+        self.paths = {name : Path(path) for name, path in paths.items()}
+        self.compact = compact
+        self.check_interval = check_interval
+
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _fingerprint(path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _entry(self, name):
+        entry = self._entries.get(name)
+        now = time.monotonic()
+        if entry is not None and now < entry['next_check']:
+            return entry
+        with self._lock:
+            entry = self._entries.get(name)
+            path = self.paths[name]
+            fingerprint = self._fingerprint(path)
+            if entry is not None and entry['fingerprint'] == fingerprint:
+                entry['next_check'] = now + self.check_interval
+                return entry
+            # one loader per change; concurrent sessions wait for it instead of each reading the file
+            self.reloads += entry is not None
+            entry = {
+                'frames' : {},
+                'version' : file_digest(path),
+                'fingerprint' : fingerprint,
+                'next_check' : now + self.check_interval,
+                'cube' : None,
+            }
+            self._entries[name] = entry
+            return entry
+
+    def frame(self, name, compact=None):
+        """The current read-only frame of dataset `name`, compact unless `compact` is False (default: the provider's)."""
+        compact = self.compact if compact is None else compact
+        entry = self._entry(name)
+        if compact not in entry['frames']:
+            with self._lock:
+                if compact not in entry['frames']:
+                    entry['frames'][compact] = freeze(load_clean(self.paths[name], compact=compact))
+                    self.loads += 1
+        return entry['frames'][compact]
+
+    def version(self, name):
+        """sha256 of the file the current frame of `name` was loaded from."""
+        return self._entry(name)['version']
+
+    def cube(self, name):
+        """The `AggregateCube` of the current version of `name`."""
+        from aggregate_cube import load_cube
+
+        entry = self._entry(name)
+        if entry['cube'] is None:
+            with self._lock:
+                if entry['cube'] is None:
+                    entry['cube'] = load_cube(self.paths[name])
+        return entry['cube']
+
+    def stats(self):
+        return {
+            'datasets' : {name : {'version' : entry['version'][:12],
+                                  'frames' : {('compact' if compact else 'full') : {'rows' : len(df), 'bytes' : int(df.memory_usage(deep=True).sum())}
+                                              for compact, df in entry['frames'].items()}} for name, entry in self._entries.items()},
+            'loads' : self.loads,
+            'reloads' : self.reloads,
+        }
+
+
+_default_provider = None
+_default_lock = threading.Lock()
+
+
+def default_provider():
+    """The provider every session and page of this process shares."""
+    global _default_provider
+    with _default_lock:
+        if _default_provider is None:
+            _default_provider = DatasetProvider()
+        return _default_provider
+
+
+# --- harness: N concurrent sessions in one process, as Streamlit runs them ---
+
+def session(mode, barrier, latencies, held):
+    """One session's first render: get both datasets and the first chart's data (mean price per manufacturer)."""
+    barrier.wait()
+    start = time.perf_counter()
+    if mode == 'session':
+        # what page 1 did: its own read_csv copies in st.session_state
+        frames = [pd.read_csv(path) for path in DATASETS.values()]
+        first_chart = frames[0].groupby('Manufacturer')['Price'].mean().sort_values(ascending=False)
+    else:
+        provider = default_provider()
+        frames = [provider.frame(name) for name in DATASETS]
+        first_chart = provider.cube('clean').top('Manufacturer', measure='mean')['mean']
+    latencies.append(time.perf_counter() - start)
+    held.append((frames, first_chart))  # the session keeps its data for as long as it is open
+
+
+def simulate(mode, sessions):
+    from perf import rss_bytes
+
+    before = rss_bytes()
+    barrier = threading.Barrier(sessions)
+    latencies, held = [], []
+    threads = [threading.Thread(target=session, args=(mode, barrier, latencies, held)) for _ in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'rss' : rss_bytes() - before, 'p50_s' : float(np.median(latencies)), 'max_s' : float(np.max(latencies))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--run', nargs=2, metavar=('MODE', 'N'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # child process: pandas / numpy and the modules are imported before the RSS baseline
+        import aggregate_cube  # noqa: F401
+        print(json.dumps(simulate(args.run[0], int(args.run[1]))))
+        return
+
+    from perf import format_bytes
+
+    # warm the dataset and cube caches so every run measures a warm server
+    provider = DatasetProvider()
+    for name in DATASETS:
+        provider.frame(name)
+        provider.cube(name)
+
+    print(f'{"":>8}  {"per-session copies":^28}   {"shared provider":^28}')
+    print(f'{"sessions":>8}  {"rss":>10} {"p50":>8} {"max":>8}   {"rss":>10} {"p50":>8} {"max":>8}')
+    for n in args.sessions:
+        cells = []
+        for mode in ['session', 'shared']:
+            out = subprocess.run([sys.executable, __file__, '--run', mode, str(n)], capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout)
+            cells.append(f'{format_bytes(result["rss"]):>10} {result["p50_s"] * 1e3:6.1f}ms {result["max_s"] * 1e3:6.1f}ms')
+        print(f'{n:>8}  {cells[0]}   {cells[1]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""Memory-mapped .npy storage for the train/test split and predictions.
+
+    models/split/manifest.json
+    models/split/xtrain.npy, xtrain.index.npy, ytrain.npy, ytrain.index.npy, ...
+
+xtrain / xtest are single C-ordered float64 matrices, the array the model is
+fitted on, so memory-mapped frames need no conversion and no copy. The
+manifest keeps:
+
+  - the column names and the original pickled dtypes
+  - the Series name of ytrain / ytest
+  - the sha256 of each file
+  - the sha256 of the source data and the split seed / test size
+
+Readers open the arrays with mmap_mode='r'. Loading only parses the
+manifest, and every process that maps the files shares the same page-cache
+pages.
+
+Usage (from scripts/):
+    python dataset_store.py export [--models ../models]   # pickles -> models/split/
+    python dataset_store.py bench                         # load time and RSS, pickles vs mmap
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import RAW_DATA_PATH, file_digest
+from perf import format_bytes
+
+
+MODELS_DIR = Path(__file__).resolve().parent.parent / 'models'
+SPLIT_DIR = MODELS_DIR / 'split'
+SPLIT_NAMES = ['xtrain', 'xtest', 'ytrain', 'ytest', 'ypred']
+FORMAT_VERSION = 1
+
+
+def save_split(arrays, directory=SPLIT_DIR, source=RAW_DATA_PATH, seed=42, test_size=.15):
+    """Write `arrays` ({name : DataFrame / Series / ndarray}) and the manifest, replacing `directory`."""
+    directory = Path(directory)
+    staging = directory.with_name(f'.staging-{directory.name}-{os.getpid()}')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    entries = {}
+    for name, value in arrays.items():
+        entry = {'file' : f'{name}.npy'}
+        if isinstance(value, pd.DataFrame):
+            array = value.to_numpy(dtype=np.float64)
+            entry['columns'] = [str(col) for col in value.columns]
+            entry['column_dtypes'] = [str(dtype) for dtype in value.dtypes]
+        else:
+            array = np.asarray(value)
+        if isinstance(value, pd.Series):
+            entry['name'] = value.name
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            entry['index_file'] = f'{name}.index.npy'
+            np.save(staging / entry['index_file'], value.index.to_numpy(), allow_pickle=False)
+
+        np.save(staging / entry['file'], np.ascontiguousarray(array), allow_pickle=False)
+        entry.update({'dtype' : str(array.dtype), 'shape' : list(array.shape),
+                      'sha256' : hashlib.sha256((staging / entry['file']).read_bytes()).hexdigest()})
+        entries[name] = entry
+
+    manifest = {
+        'format_version' : FORMAT_VERSION,
+        'created' : datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'source' : {'path' : Path(source).name, 'sha256' : file_digest(source)} if source else None,
+        'split' : {'seed' : seed, 'test_size' : test_size},
+        'arrays' : entries,
+    }
+    with open(staging / 'manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    staging.rename(directory)
+    return directory
+
+
+def read_manifest(directory=SPLIT_DIR):
+    with open(Path(directory) / 'manifest.json') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f'unsupported split format {manifest.get("format_version")} in {directory}')
+    return manifest
+
+
+def load_array(name, directory=SPLIT_DIR, mmap=True, frame=True, manifest=None):
+    """One stored array: a DataFrame / Series over the mapped array when `frame`, else the bare ndarray.
+
+    Frames are float64, the model's input type; `restore_dtypes` gives back
+    the pickled dtypes at the cost of a copy.
+    """
+    directory = Path(directory)
+    entry = (manifest or read_manifest(directory))['arrays'][name]
+    array = np.load(directory / entry['file'], mmap_mode='r' if mmap else None, allow_pickle=False)
+    if not frame or 'index_file' not in entry:
+        return array
+    index = pd.Index(np.load(directory / entry['index_file'], allow_pickle=False))
+    if 'columns' in entry:
+        return pd.DataFrame(array, columns=entry['columns'], index=index, copy=False)
+    return pd.Series(array, index=index, name=entry.get('name'), copy=False)
+
+
+def load_split(names=SPLIT_NAMES, directory=SPLIT_DIR, mmap=True, frame=True, models_dir=MODELS_DIR):
+    """The stored arrays `names`, in order; falls back to the pickles in `models_dir` when there is no store."""
+    try:
+        manifest = read_manifest(directory)
+    except FileNotFoundError:
+        def read(name):
+            with open(Path(models_dir) / f'{name}.pkl', 'rb') as f:
+                return pickle.load(f)
+        return [read(name) for name in names]
+    return [load_array(name, directory, mmap, frame, manifest) for name in names]
+
+
+def restore_dtypes(df, directory=SPLIT_DIR, name='xtrain'):
+    entry = read_manifest(directory)['arrays'][name]
+    return df.astype(dict(zip(entry['columns'], entry['column_dtypes'])))
+
+
+def verify(directory=SPLIT_DIR):
+    """Raise ValueError if a file no longer matches its manifest checksum."""
+    directory = Path(directory)
+    for name, entry in read_manifest(directory)['arrays'].items():
+        if hashlib.sha256((directory / entry['file']).read_bytes()).hexdigest() != entry['sha256']:
+            raise ValueError(f'checksum mismatch for {directory / entry["file"]}')
+
+
+# --- benchmark: each loader in a fresh interpreter (numpy / pandas already imported), so RSS is
+# not shared with earlier runs ---
+
+_PROBE = '''
+import json, pickle, sys, time
+from pathlib import Path
+sys.path.insert(0, {scripts!r})
+from perf import rss_bytes
+from dataset_store import load_split
+before = rss_bytes()
+start = time.perf_counter()
+if {mode!r} == 'pickle':
+    data = [pickle.load(open(Path({models!r}) / f'{{name}}.pkl', 'rb')) for name in {names!r}]
+else:
+    data = load_split({names!r}, mmap={mode!r} == 'mmap')
+load = time.perf_counter() - start
+loaded = rss_bytes() - before
+start = time.perf_counter()
+total = sum(float(d.to_numpy().sum()) if hasattr(d, 'to_numpy') else float(d.sum()) for d in data)
+touch = time.perf_counter() - start
+print(json.dumps({{'load_ms' : load * 1e3, 'rss_loaded' : loaded, 'touch_ms' : touch * 1e3, 'rss_touched' : rss_bytes() - before}}))
+'''
+
+
+def bench(models_dir=MODELS_DIR, runs=5):
+    results = {}
+    for mode in ['pickle', 'npy', 'mmap']:
+        code = _PROBE.format(scripts=str(Path(__file__).resolve().parent), models=str(models_dir), names=SPLIT_NAMES, mode=mode)
+        samples = [json.loads(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout)
+                   for _ in range(runs)]
+        results[mode] = {key : float(np.median([s[key] for s in samples])) for key in samples[0]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help='write the pickled split in --models as a memory-mapped store')
+    export.add_argument('--models', default=MODELS_DIR)
+    export.add_argument('--source', default=RAW_DATA_PATH, help='data the split was made from')
+    export.add_argument('--seed', type=int, default=42)
+    export.add_argument('--test-size', type=float, default=.15)
+    sub.add_parser('bench', help='load time and RSS of the pickles vs the store')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        arrays = {}
+        for name in SPLIT_NAMES:
+            with open(Path(args.models) / f'{name}.pkl', 'rb') as f:
+                arrays[name] = pickle.load(f)
+        target = save_split(arrays, Path(args.models) / 'split', args.source, args.seed, args.test_size)
+        for name, (value, stored) in zip(SPLIT_NAMES, zip(arrays.values(), load_split(directory=target))):
+            if isinstance(value, pd.DataFrame):
+                pd.testing.assert_frame_equal(restore_dtypes(stored, target, name), value)
+            elif isinstance(value, pd.Series):
+                assert stored.name == value.name and stored.index.equals(value.index)
+                assert np.array_equal(stored.to_numpy(), value.to_numpy())
+            else:
+                assert np.array_equal(stored, value)
+        print(f'split written to {target}, identical to the pickles')
+        return
+
+    results = bench()
+    print(f'{"loader":<8} {"load ms":>9} {"rss after load":>15} {"touch all ms":>13} {"rss after touch":>16}')
+    for mode, r in results.items():
+        print(f'{mode:<8} {r["load_ms"]:9.2f} {format_bytes(r["rss_loaded"]):>15} {r["touch_ms"]:13.2f} '
+              f'{format_bytes(r["rss_touched"]):>16}')
+
+
+if __name__ == '__main__':
+    main()
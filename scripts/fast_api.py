@@ -1,17 +1,63 @@
 
-from fastapi import FastAPI,Query ,Path ,Body , HTTPException
+from fastapi import FastAPI,Query ,Path ,Body , HTTPException , Request
 from pydantic import BaseModel , Field
 import pickle
 import numpy as np
 import pandas as pd
 from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse , PlainTextResponse , StreamingResponse
 from pathlib import Path
 from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager, nullcontext
+import asyncio
+from functools import partial
+import os
+import time
+import json
+from batcher import MicroBatcher, QueueFull
+from prediction_cache import PredictionCache, MISSING
+from scoring_pool import ScoringPool
+from model_bundle import load_model
+from model_registry import ModelRegistry
+from perf import rss_bytes, format_bytes
+from metrics import Metrics, MetricsMiddleware, histogram_lines
+from bulk_scoring import iter_frames, parse_listings, merge_results, ResultSpool
 
 
-app = FastAPI()
+# micro-batching knobs for /predict, see batcher.MicroBatcher
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 64))
+BATCH_MAX_WAIT_US = int(os.environ.get('BATCH_MAX_WAIT_US', 2000))
+BATCH_MAX_QUEUE = int(os.environ.get('BATCH_MAX_QUEUE', 4096))
+
+# per-car cache; size 0 disables it, mode is 'prediction' or 'features'
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 10000))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 300))
+PREDICTION_CACHE_MODE = os.environ.get('PREDICTION_CACHE_MODE', 'prediction')
+
+# where encoding + model evaluation run: 'inline', 'thread' or 'process' (see scoring_pool.py)
+SCORING_MODE = os.environ.get('SCORING_MODE', 'thread')
+SCORING_WORKERS = int(os.environ.get('SCORING_WORKERS', os.cpu_count() or 1))
+
+# rows parsed and scored per step of /predict/stream; bounds its memory
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 2048))
+
+# per-stage latency histograms and counters served at /metrics; 0 turns the timers into no-ops
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    await batcher.start()
+    yield
+    await batcher.stop()
+    pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+metrics = Metrics(enabled=METRICS_ENABLED)
+app.add_middleware(MetricsMiddleware, metrics=metrics)
 
 
 
@@ -39,20 +85,18 @@ def prediction_page():
     return FileResponse(BASE_DIR / "scripts" / "prediction.html")
 
 
-with open(r'../models/one_hot_encoder.pkl' , 'rb') as f:
-    onehot_encoding = pickle.load(f)
+MODELS_DIR = BASE_DIR / 'models'
 
-with open(r'../models/label_encoders.pkl' ,'rb') as f:
-    label_encoded = pickle.load(f)
+# MODEL_BUNDLE may name a bundle directory or version; default is models/bundles/current,
+# falling back to the pickles in models/ (see model_bundle.py)
+MODEL_KEEP_VERSIONS = int(os.environ.get('MODEL_KEEP_VERSIONS', 3))
 
-with open(r'../models/scaler.pkl','rb') as f:
-    scaler = pickle.load(f)
+# picklable, so process-pool workers can load bundles themselves
+load_serving_model = partial(load_model, root=MODELS_DIR / 'bundles', models_dir=MODELS_DIR)
 
-with open(r'../models/model.pkl', 'rb') as f:
-    Random_Forest = pickle.load(f)
-
-with open("../models/manufacturer_model_map.pkl", "rb") as f:
-    manufacturer_model_map = pickle.load(f)
+registry = ModelRegistry(loader=load_serving_model, keep=MODEL_KEEP_VERSIONS)
+model = registry.activate(registry.load(os.environ.get('MODEL_BUNDLE')))
+print(f'model {model.version} loaded in {model.load_seconds * 1e3:.1f} ms, rss +{format_bytes(model.rss_bytes)} (pid {os.getpid()})')
 
 class Inputs_Car(BaseModel):
     Levy: int = Field(...,ge=0 , title='Levy')
@@ -71,59 +115,247 @@ class Inputs_Car(BaseModel):
     Color: str = Field(..., min_length=2 , max_length = 25 , title="color")
     Airbags: int = Field(...,ge=0 , title='milage')
 
+async def score_queued(cars):
+    # one registry read per micro-batch: the whole batch is served by one version
+    bundle = registry.current
+    with metrics.stage('score') if pool.mode == 'process' else nullcontext():
+        scored = await pool.score(cars, bundle, cache, metrics)
+    return [result if isinstance(result, Exception) else (result, bundle.version) for result in scored]
+
+
+model_artifacts = [MODELS_DIR / 'bundles' / 'current'] + [MODELS_DIR / name for name in
+                   ['feature_pipeline.pkl', 'one_hot_encoder.pkl', 'label_encoders.pkl', 'scaler.pkl', 'model.pkl', 'forest.npz']]
+
+cache = PredictionCache(maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL, mode=PREDICTION_CACHE_MODE,
+                        watch_paths=model_artifacts) if PREDICTION_CACHE_SIZE > 0 else None
+
+pool = ScoringPool(mode=SCORING_MODE, workers=SCORING_WORKERS, loader=load_serving_model)
+
+batcher = MicroBatcher(score_queued, max_batch_size=BATCH_MAX_SIZE, max_wait_us=BATCH_MAX_WAIT_US, max_queue=BATCH_MAX_QUEUE,
+                       max_in_flight=pool.workers if pool.mode != 'inline' else 1)
+
+
+def observe_validation(request):
+    # the middleware stamps the request start; everything until the handler runs is parsing + validation
+    started = getattr(request.state, 'started', None)
+    if started is not None:
+        metrics.observe('validate', time.perf_counter() - started)
+
+
 @app.post('/predict')
-async def add_feature(car:Inputs_Car):
+async def add_feature(car:Inputs_Car , request:Request):
+
+    observe_validation(request)
 
     try:
 
-        data = pd.DataFrame([car.dict()])
-        data['Age'] = datetime.now().year - data['Prod_year']
-        data = data.drop(columns=['Doors', 'Prod_year'], errors='ignore')
+        car = car.model_dump()
+
+        if cache is not None and cache.mode == 'prediction':
+            with metrics.stage('cache'):
+                version = registry.current.version
+                hit = cache.get(cache.key(car, namespace=version))
+            if hit is not MISSING:
+                return {'Prediction' : hit , 'Model_version' : version}
 
-        column_rename_map = {
-            "Leather_interior": "Leather interior",
-            "Gear_box_type": "Gear box type",
-            "Drive_wheels": "Drive wheels",
-            "Engine_volume": "Engine volume",
-            "Fuel_type": "Fuel type"
-        }
-        data.rename(columns=column_rename_map, inplace=True)
+        with metrics.stage('queued'):
+            prediction, version = await batcher.submit(car)
 
-        columns_one_hot_encoding =['Gear box type' , 'Drive wheels' , 'Wheel' ,'Fuel type']
+        if cache is not None and cache.mode == 'prediction':
+            cache.set(cache.key(car, namespace=version), prediction)
 
-        encoded_data = onehot_encoding.transform(data[columns_one_hot_encoding])
-        encoded_data_df = pd.DataFrame(encoded_data , columns=onehot_encoding.get_feature_names_out(columns_one_hot_encoding) , index = data.index)
-        data = pd.concat([data,encoded_data_df] , axis = 1)
-        data = data.drop(columns = columns_one_hot_encoding)
+        return {'Prediction' : prediction , 'Model_version' : version}
 
-        columns_label_encoding = ['Manufacturer' , 'Model' , 'Category' ,'Color']
+    except QueueFull as e:
+        metrics.count_error(type(e).__name__)
+        raise HTTPException(status_code=503 , detail=str(e))
+    except Exception as e:
+        metrics.count_error(type(e).__name__)
+        raise HTTPException(status_code=400 , detail=str(e))
 
-        for col in columns_label_encoding:
-            le = label_encoded[col]
-            data[col] = le.transform(data[col])
 
-        numerical_columns = ['Levy','Engine volume', 'Mileage' , 'Age']
+class Inputs_Batch(BaseModel):
+    cars: list[Inputs_Car] = Field(..., min_length=1 , max_length=10000 , title='cars')
 
-        data[numerical_columns]  = scaler.transform(data[numerical_columns])
-        data['Leather interior'] = data['Leather interior'].map({'Yes' : 1 , 'No':0})
 
-        prediction = Random_Forest.predict(data)
+@app.post('/predict/batch')
+async def add_feature_batch(batch:Inputs_Batch , request:Request):
+
+    observe_validation(request)
+
+    try:
+
+        bundle = registry.current
+        with metrics.stage('score') if pool.mode == 'process' else nullcontext():
+            scored = await pool.score([car.model_dump() for car in batch.cars], bundle, cache, metrics)
+
+        for result in scored:
+            if isinstance(result, Exception):
+                metrics.count_error(type(result).__name__)
+
+        results = [
+            {'index' : i , 'Prediction' : None , 'Error' : str(result)} if isinstance(result, Exception)
+            else {'index' : i , 'Prediction' : result , 'Error' : None}
+            for i, result in enumerate(scored)
+        ]
+
+        return {'Predictions' : results , 'Failed' : sum(isinstance(result, Exception) for result in scored) ,
+                'Model_version' : bundle.version}
 
-        return {'Prediction' : prediction[0]}
-    
     except Exception as e:
+        metrics.count_error(type(e).__name__)
         raise HTTPException(status_code=400 , detail=str(e))
-    
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """StreamingResponse that does not consume `receive` while streaming.
+
+    Under ASGI < 2.4 Starlette listens for the disconnect on `receive` while
+    the body is sent, which would swallow the rest of a request body the
+    generator is still reading. Here a client disconnect surfaces as
+    ClientDisconnect from `request.stream()` instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post('/predict/stream')
+async def add_feature_stream(request:Request ,
+                             format: str | None = Query(None , pattern='^(csv|ndjson)$' , title='csv or ndjson, default from Content-Type') ,
+                             chunk_rows: int = Query(STREAM_CHUNK_ROWS , ge=1 , le=100000 , title='rows per scoring step')):
+
+    # raw listing export rows (datas/raw_data/car_price_prediction.csv columns) in,
+    # one NDJSON result per row out, then a summary line with the throughput;
+    # scoring runs as its own task so the upload keeps being read while the response waits
+    fmt = format or ('ndjson' if 'json' in request.headers.get('content-type', '') else 'csv')
+    bundle = registry.current
+
+    spool = ResultSpool()
+
+    async def score_upload():
+        start, rows, failed = time.perf_counter(), 0, 0
+        try:
+            async for frame in iter_frames(request.stream(), fmt, chunk_rows):
+                cars, positions, errors = parse_listings(frame)
+                scored = await pool.score(cars, bundle, None, metrics) if cars else []
+                ids = frame['ID'].tolist() if 'ID' in frame.columns else [None] * len(frame)
+
+                lines = []
+                for i, result in enumerate(merge_results(len(frame), positions, scored, errors)):
+                    if isinstance(result, Exception):
+                        failed += 1
+                        metrics.count_error(type(result).__name__)
+                        record = {'index' : rows + i , 'ID' : ids[i] , 'Prediction' : None , 'Error' : str(result)}
+                    else:
+                        record = {'index' : rows + i , 'ID' : ids[i] , 'Prediction' : result , 'Error' : None}
+                    lines.append(json.dumps(record, default=str))
+                rows += len(frame)
+                spool.write('\n'.join(lines) + '\n')
+        except Exception as e:
+            metrics.count_error(type(e).__name__)
+            spool.write(json.dumps({'Error' : f'{type(e).__name__}: {e}' , 'index' : rows}) + '\n')
+
+        seconds = time.perf_counter() - start
+        spool.write(json.dumps({'Summary' : {'rows' : rows , 'failed' : failed , 'seconds' : seconds ,
+                                             'rows_per_sec' : rows / seconds if seconds else 0.0 ,
+                                             'Model_version' : bundle.version}}) + '\n')
+
+    async def run():
+        try:
+            await score_upload()
+        finally:
+            spool.close()
+
+    task = asyncio.create_task(run())
+
+    async def results():
+        try:
+            async for data in spool.drain():
+                yield data
+        finally:
+            task.cancel()
+
+    return UploadStreamingResponse(results() , media_type='application/x-ndjson')
+
+
+@app.get('/model/info')
+def get_model_info():
+    return {**registry.current.info(), 'rss_now_bytes' : rss_bytes()}
+
+
+class Model_Reference(BaseModel):
+    bundle: str | None = Field(None , title='bundle version or directory, default models/bundles/current')
+
+
+@app.get('/admin/models')
+def get_model_versions():
+    return registry.versions()
+
+
+@app.post('/admin/models/reload')
+async def reload_model(ref:Model_Reference = Body(default=Model_Reference())):
+    try:
+        bundle = await registry.reload(ref.bundle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409 , detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400 , detail=f'{type(e).__name__}: {e}')
+    return {'Model_version' : bundle.version , 'load_seconds' : bundle.load_seconds ,
+            'warmup_seconds' : bundle.warmup_seconds}
+
+
+@app.post('/admin/models/rollback')
+def rollback_model(ref:Model_Reference = Body(default=Model_Reference())):
+    try:
+        bundle = registry.rollback(ref.bundle)
+    except KeyError as e:
+        raise HTTPException(status_code=404 , detail=str(e.args[0]))
+    return {'Model_version' : bundle.version}
+
+
+@app.get('/batcher/stats')
+def get_batcher_stats():
+    return {**batcher.stats(), 'pool' : pool.stats()}
+
+
+@app.get('/cache/stats')
+def get_cache_stats():
+    return cache.stats() if cache is not None else {'enabled' : False}
+
+
+def collect_serving_metrics():
+    ns = metrics.namespace
+    lines = [f'# TYPE {ns}_batch_size histogram'] + histogram_lines(f'{ns}_batch_size', batcher.batch_size)
+    lines += [f'# TYPE {ns}_batch_wait_microseconds histogram'] + histogram_lines(f'{ns}_batch_wait_microseconds', batcher.wait_us)
+    lines += [f'# TYPE {ns}_queue_depth gauge', f'{ns}_queue_depth {batcher.queue.qsize() if batcher.queue is not None else 0}']
+    if cache is not None:
+        stats = cache.stats()
+        lines += [f'# TYPE {ns}_cache_events_total counter'] + [
+            f'{ns}_cache_events_total{{event="{event}"}} {stats[event]}'
+            for event in ['hits', 'misses', 'evictions', 'expirations', 'invalidations']]
+        lines += [f'# TYPE {ns}_cache_entries gauge', f'{ns}_cache_entries {stats["size"]}']
+    return lines
+
+
+metrics.add_collector(collect_serving_metrics)
+
+
+@app.get('/metrics' , response_class=PlainTextResponse)
+def get_metrics():
+    metrics.info = {'version' : registry.current.version}
+    return PlainTextResponse(metrics.render() , media_type='text/plain; version=0.0.4')
+
 
 @app.get("/manufacturers")
 def get_manufacturers():
-    return {"manufacturers": label_encoded["Manufacturer"].classes_.tolist()}
+    return {"manufacturers": registry.current.encoder.label_classes["Manufacturer"]}
 
 
 @app.get("/models/{manufacturer}")
 def get_models(manufacturer: str):
     try:
-        models = manufacturer_model_map.get(manufacturer, [])
+        models = registry.current.manufacturer_model_map.get(manufacturer, [])
         return {"models": models}
     except:
         return {"models": []}
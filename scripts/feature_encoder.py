@@ -0,0 +1,186 @@
+import numpy as np
+from datetime import datetime
+
+
+column_rename_map = {
+    "Leather_interior": "Leather interior",
+    "Gear_box_type": "Gear box type",
+    "Drive_wheels": "Drive wheels",
+    "Engine_volume": "Engine volume",
+    "Fuel_type": "Fuel type"
+}
+
+columns_one_hot_encoding = ['Gear box type' , 'Drive wheels' , 'Wheel' ,'Fuel type']
+
+columns_label_encoding = ['Manufacturer' , 'Model' , 'Category' ,'Color']
+
+numerical_columns = ['Levy','Engine volume', 'Mileage' , 'Age']
+
+# column order of the training matrix before the one-hot block (see xtrain.pkl)
+base_columns = ['Levy', 'Manufacturer', 'Model', 'Category', 'Leather interior', 'Engine volume',
+                'Mileage', 'Cylinders', 'Color', 'Airbags', 'Age']
+
+leather_map = {'Yes' : 1.0 , 'No' : 0.0}
+
+input_field = {v : k for k, v in column_rename_map.items()}
+
+
+class UnseenLabelError(ValueError):
+    """A label-encoded column got a category the fitted encoder never saw."""
+
+
+class CompiledEncoder:
+    """Encode `Inputs_Car` dicts into the model matrix without pandas.
+
+    Built once from the fitted one-hot / label / scaler objects, it keeps plain
+    dict lookup tables and the scaler mean/scale vectors, and writes each car
+    straight into a preallocated float64 row of the training column order.
+    """
+
+    def __init__(self, label_classes, onehot_categories, scaler_mean, scaler_scale):
+        self.label_classes = {col : list(label_classes[col]) for col in columns_label_encoding}
+        self.onehot_categories = {col : list(onehot_categories[col]) for col in columns_one_hot_encoding}
+
+        self.feature_names = list(base_columns)
+        for col in columns_one_hot_encoding:
+            self.feature_names += [f'{col}_{category}' for category in self.onehot_categories[col]]
+        self.n_features = len(self.feature_names)
+        position = {name : i for i, name in enumerate(self.feature_names)}
+
+        self.label_codes = {col : {category : float(code) for code, category in enumerate(classes)}
+                            for col, classes in self.label_classes.items()}
+        self.onehot_slots = {col : {category : position[f'{col}_{category}'] for category in categories}
+                             for col, categories in self.onehot_categories.items()}
+
+        self.numerical_index = np.array([position[col] for col in numerical_columns])
+        self.scaler_mean = np.asarray(scaler_mean, dtype=np.float64)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=np.float64)
+
+        self.onehot_start = len(base_columns)
+        self.plain = [(position[col], input_field.get(col, col)) for col in ['Levy', 'Engine volume', 'Mileage', 'Cylinders', 'Airbags']]
+        self.labels = [(position[col], col, self.label_codes[col]) for col in columns_label_encoding]
+        self.onehots = [(input_field.get(col, col), self.onehot_slots[col]) for col in columns_one_hot_encoding]
+        self.age_index = position['Age']
+        self.leather_index = position['Leather interior']
+
+    @classmethod
+    def from_sklearn(cls, onehot_encoding, label_encoded, scaler):
+        label_classes = {col : label_encoded[col].classes_ for col in columns_label_encoding}
+        onehot_categories = dict(zip(onehot_encoding.feature_names_in_, onehot_encoding.categories_))
+        scaler_index = [list(scaler.feature_names_in_).index(col) for col in numerical_columns]
+        return cls(label_classes, onehot_categories, scaler.mean_[scaler_index], scaler.scale_[scaler_index])
+
+    def new_buffer(self, n_rows=1):
+        return np.empty((n_rows, self.n_features), dtype=np.float64)
+
+    def _fill(self, car, row, year):
+        """Write one car into `row`; raise UnseenLabelError on an unseen label."""
+        row[self.onehot_start:] = 0.0
+        for index, field in self.plain:
+            row[index] = car[field]
+        for index, col, codes in self.labels:
+            code = codes.get(car[col])
+            if code is None:
+                raise UnseenLabelError(f"y contains previously unseen labels: '{car[col]}'")
+            row[index] = code
+        for field, slots in self.onehots:
+            slot = slots.get(car[field])
+            if slot is not None:
+                row[slot] = 1.0
+        row[self.age_index] = year - car['Prod_year']
+        row[self.leather_index] = leather_map.get(car['Leather_interior'], np.nan)
+
+    def encode_row(self, car, out=None):
+        """Encode a single car dict into a 1-D feature row."""
+        row = self.new_buffer(1)[0] if out is None else out
+        self._fill(car, row, datetime.now().year)
+        row[self.numerical_index] = (row[self.numerical_index] - self.scaler_mean) / self.scaler_scale
+        return row
+
+    def encode_batch(self, cars, out=None):
+        """Encode a list of car dicts into a 2-D matrix.
+
+        Returns the matrix and a dict of {row index : error message} for rows
+        with unseen labels; those rows are left as NaN and must not be scored.
+        """
+        X = self.new_buffer(len(cars)) if out is None else out[:len(cars)]
+        year = datetime.now().year
+        errors = {}
+        for i, car in enumerate(cars):
+            try:
+                self._fill(car, X[i], year)
+            except UnseenLabelError as e:
+                X[i] = np.nan
+                errors[i] = str(e)
+        X[:, self.numerical_index] -= self.scaler_mean
+        X[:, self.numerical_index] /= self.scaler_scale
+        return X, errors
+
+
+def prepare_features(data, onehot_encoding, label_encoded, scaler):
+    """Reference pandas/sklearn encoding, as `/predict` originally did it."""
+    import pandas as pd
+
+    data['Age'] = datetime.now().year - data['Prod_year']
+    data = data.drop(columns=['Doors', 'Prod_year'], errors='ignore')
+    data.rename(columns=column_rename_map, inplace=True)
+
+    encoded_data = onehot_encoding.transform(data[columns_one_hot_encoding])
+    encoded_data_df = pd.DataFrame(encoded_data , columns=onehot_encoding.get_feature_names_out(columns_one_hot_encoding) , index = data.index)
+    data = pd.concat([data,encoded_data_df] , axis = 1)
+    data = data.drop(columns = columns_one_hot_encoding)
+
+    for col in columns_label_encoding:
+        le = label_encoded[col]
+        data[col] = le.transform(data[col])
+
+    data[numerical_columns]  = scaler.transform(data[numerical_columns])
+    data['Leather interior'] = data['Leather interior'].map({'Yes' : 1 , 'No':0})
+
+    return data
+
+
+def check_parity(encoder, reference, cars):
+    """Compare encoder output with the pandas `prepare_features` path.
+
+    `reference` takes a DataFrame of cars and returns the encoded frame. Returns
+    the number of rows compared; raises AssertionError on any difference.
+    """
+    import pandas as pd
+
+    expected = reference(pd.DataFrame(cars))
+    assert list(expected.columns) == encoder.feature_names, 'column order differs'
+    expected = expected.to_numpy(dtype=np.float64)
+
+    batch, errors = encoder.encode_batch(cars)
+    assert not errors, errors
+    rows = np.stack([encoder.encode_row(car) for car in cars])
+
+    for name, got in [('encode_batch', batch), ('encode_row', rows)]:
+        assert np.array_equal(got, expected, equal_nan=True), f'{name} differs from prepare_features'
+
+    return len(cars)
+
+
+if __name__ == '__main__':
+    import pickle
+    import pandas as pd
+
+    artifacts = {}
+    for name in ['one_hot_encoder', 'label_encoders', 'scaler']:
+        with open(f'../models/{name}.pkl', 'rb') as file:
+            artifacts[name] = pickle.load(file)
+    encoder = CompiledEncoder.from_sklearn(artifacts['one_hot_encoder'], artifacts['label_encoders'], artifacts['scaler'])
+
+    def reference(data):
+        return prepare_features(data, artifacts['one_hot_encoder'], artifacts['label_encoders'], artifacts['scaler'])
+
+    df = pd.read_csv(r'../datas/clean_car_filtering.csv')
+    df = df.rename(columns={'Prod. year' : 'Prod_year', **input_field})
+    df['Leather_interior'] = df['Leather_interior'].map({1 : 'Yes' , 0 : 'No'})
+    for col in columns_label_encoding:
+        df = df[df[col].isin(encoder.label_classes[col])]
+    cars = df[['Levy', 'Manufacturer', 'Model', 'Prod_year', 'Category', 'Leather_interior', 'Fuel_type', 'Engine_volume',
+               'Mileage', 'Cylinders', 'Gear_box_type', 'Drive_wheels', 'Wheel', 'Color', 'Airbags']].to_dict('records')
+
+    print(f'parity ok on {check_parity(encoder, reference, cars)} rows')
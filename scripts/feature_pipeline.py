@@ -0,0 +1,268 @@
+"""One fitted feature pipeline for training and serving.
+
+`FeaturePipeline` turns listings into the model matrix (the xtrain.pkl
+column order). It accepts three input shapes:
+
+  - raw export rows (car_price_prediction.csv: Levy "-", Mileage "186005 km",
+    Engine volume "2.0 Turbo", Leather interior "Yes") go through the row-level
+    cleaning of preprocessing.replace_categorical_by_numerical
+  - cleaned rows (preprocessing_pipline output, with Age)
+  - `Inputs_Car` dicts / frames with the API field names (Prod_year, Fuel_type, ...)
+
+`transform` works column by column on the whole batch:
+
+  - label and one-hot codes come from `np.searchsorted` on the sorted
+    category tables (unseen labels give -1)
+  - one-hot slots are set with a single fancy-indexed assignment
+  - scaling is one vectorised subtract / divide
+
+The cost of one row and of a large batch therefore differs only by the fixed
+per-call overhead. The fitted state is the category tables plus the scaler
+vectors, the same arrays a model bundle stores. The object pickles as plain
+lists and arrays.
+
+Usage (from scripts/):  python feature_pipeline.py   # parity vs CompiledEncoder and xtrain.pkl, throughput
+"""
+import pickle
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from feature_encoder import (UnseenLabelError, base_columns, column_rename_map, columns_label_encoding,
+                             columns_one_hot_encoding, leather_map, numerical_columns)
+from preprocessing import replace_categorical_by_numerical
+
+
+# API field name -> pipeline column name
+field_columns = {'Prod_year' : 'Prod. year', **column_rename_map}
+
+raw_text_columns = ['Levy', 'Engine volume', 'Mileage']
+
+# model columns copied as they are (before scaling)
+plain_columns = ['Levy', 'Leather interior', 'Engine volume', 'Mileage', 'Cylinders', 'Airbags', 'Age']
+
+
+# below this many rows a binary search beats building pandas' hash lookup
+SEARCH_MAX_ROWS = 256
+
+
+def _category_table(categories):
+    categories = np.asarray(categories, dtype=str)
+    order = np.argsort(categories, kind='stable')
+    return categories[order], order, pd.Index(categories, dtype=object)
+
+
+def _lookup(table, values):
+    """Position of each of `values` in the category table, -1 when absent."""
+    categories, order, index = table
+    if len(values) >= SEARCH_MAX_ROWS:
+        return index.get_indexer(np.asarray(values, dtype=object))
+    values = np.asarray(values, dtype=str)
+    position = np.minimum(np.searchsorted(categories, values), len(categories) - 1)
+    return np.where(categories[position] == values, order[position], -1)
+
+
+class FeaturePipeline:
+
+    def __init__(self, label_classes=None, onehot_categories=None, scaler_mean=None, scaler_scale=None):
+        self.label_classes = {col : list(label_classes[col]) for col in columns_label_encoding} if label_classes else {}
+        self.onehot_categories = {col : list(onehot_categories[col]) for col in columns_one_hot_encoding} if onehot_categories else {}
+        self.scaler_mean = np.asarray(scaler_mean, dtype=np.float64) if scaler_mean is not None else None
+        self.scaler_scale = np.asarray(scaler_scale, dtype=np.float64) if scaler_scale is not None else None
+        self._compile()
+
+    def _compile(self):
+        self.feature_names = list(base_columns)
+        for col in columns_one_hot_encoding:
+            self.feature_names += [f'{col}_{category}' for category in self.onehot_categories.get(col, [])]
+        self.n_features = len(self.feature_names)
+        position = {name : i for i, name in enumerate(self.feature_names)}
+
+        self._label_index = {col : _category_table(classes) for col, classes in self.label_classes.items()}
+        self._onehot_index = {col : _category_table(categories) for col, categories in self.onehot_categories.items()}
+        self._onehot_offsets = np.array([position[f'{col}_{self.onehot_categories[col][0]}']
+                                         for col in columns_one_hot_encoding if self.onehot_categories.get(col)])
+        self._plain_index = np.array([position[col] for col in plain_columns])
+        self._label_position = np.array([position[col] for col in columns_label_encoding])
+        self._numerical_index = np.array([position[col] for col in numerical_columns])
+
+    # --- pickling: only the fitted tables, the lookup indexes are rebuilt ---
+
+    def __getstate__(self):
+        return {'label_classes' : self.label_classes, 'onehot_categories' : self.onehot_categories,
+                'scaler_mean' : self.scaler_mean, 'scaler_scale' : self.scaler_scale}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    # --- fitting ---
+
+    def fit(self, df, scale_rows=None, year=None):
+        """Fit on cleaned listings (preprocessing_pipline output).
+
+        The label and one-hot tables are fitted on every row. The scaler is
+        fitted on `scale_rows` (index labels) only, e.g. the training split,
+        as 3_training / 7_training final do it.
+        """
+        df = self.clean(df, year)
+        self.label_classes = {col : sorted(df[col].dropna().unique().tolist()) for col in columns_label_encoding}
+        self.onehot_categories = {col : sorted(df[col].dropna().unique().tolist()) for col in columns_one_hot_encoding}
+
+        scaled = (df if scale_rows is None else df.loc[scale_rows])[numerical_columns].to_numpy(dtype=np.float64)
+        self.scaler_mean = scaled.mean(axis=0)
+        # StandardScaler: population std, a zero variance column is left unscaled
+        scale = scaled.std(axis=0)
+        self.scaler_scale = np.where(scale == 0, 1.0, scale)
+        self._compile()
+        return self
+
+    @classmethod
+    def from_sklearn(cls, onehot_encoding, label_encoded, scaler):
+        """The pipeline equivalent of the fitted encoders pickled in models/."""
+        label_classes = {col : label_encoded[col].classes_ for col in columns_label_encoding}
+        onehot_categories = dict(zip(onehot_encoding.feature_names_in_, onehot_encoding.categories_))
+        scaler_index = [list(scaler.feature_names_in_).index(col) for col in numerical_columns]
+        return cls(label_classes, onehot_categories, scaler.mean_[scaler_index], scaler.scale_[scaler_index])
+
+    # --- transform ---
+
+    @staticmethod
+    def clean(df, year=None):
+        """Row-level cleaning of any of the accepted input shapes; returns a frame with pipeline column names and Age."""
+        df = df.rename(columns=field_columns)
+        if any(col in df.columns and not pd.api.types.is_numeric_dtype(df[col]) for col in raw_text_columns):
+            df = replace_categorical_by_numerical(df.astype({col : str for col in raw_text_columns}))
+        elif 'Leather interior' in df.columns and not pd.api.types.is_numeric_dtype(df['Leather interior']):
+            df = df.assign(**{'Leather interior' : df['Leather interior'].map(leather_map)})
+        if 'Age' not in df.columns:
+            df = df.assign(Age=(year or datetime.now().year) - df['Prod. year'])
+        return df
+
+    def transform(self, df, year=None):
+        """Encode a DataFrame of listings into (X, errors).
+
+        `errors` is {row position : message} for rows with an unseen label;
+        those rows are NaN in X and must not be scored.
+        """
+        return self._encode(self.clean(df, year), len(df))
+
+    def transform_records(self, cars, year=None):
+        """`transform` for a list of `Inputs_Car` dicts, without building a DataFrame."""
+        year = year or datetime.now().year
+        columns = {field_columns.get(field, field) : [car[field] for car in cars] for field in cars[0]} if cars else {}
+        if columns:
+            columns['Leather interior'] = [leather_map.get(value, np.nan) for value in columns['Leather interior']]
+            columns['Age'] = year - np.asarray(columns['Prod. year'])
+        return self._encode(columns, len(cars))
+
+    def _encode(self, columns, n):
+        X = np.zeros((n, self.n_features), dtype=np.float64)
+        if n == 0:
+            return X, {}
+
+        X[:, self._plain_index] = np.array([columns[col] for col in plain_columns], dtype=np.float64).T
+
+        codes = np.stack([_lookup(self._label_index[col], columns[col]) for col in columns_label_encoding])
+        X[:, self._label_position] = codes.T
+
+        slots = np.stack([_lookup(self._onehot_index[col], columns[col]) for col in columns_one_hot_encoding])
+        row, which = np.nonzero(slots.T >= 0)
+        X[row, self._onehot_offsets[which] + slots[which, row]] = 1.0
+
+        X[:, self._numerical_index] -= self.scaler_mean
+        X[:, self._numerical_index] /= self.scaler_scale
+
+        errors = {}
+        unseen = (codes < 0).any(axis=0)
+        if unseen.any():
+            X[unseen] = np.nan
+            first = np.argmax(codes[:, unseen] < 0, axis=0)
+            labels = [np.asarray(columns[col], dtype=object) for col in columns_label_encoding]
+            errors = {int(i) : f"y contains previously unseen labels: '{labels[col][i]}'"
+                      for i, col in zip(np.flatnonzero(unseen), first)}
+        return X, errors
+
+    def transform_frame(self, df, year=None):
+        """`transform` as a DataFrame with the training column names, raising on unseen labels (for training)."""
+        X, errors = self.transform(df, year)
+        if errors:
+            raise UnseenLabelError(next(iter(errors.values())))
+        return pd.DataFrame(X, columns=self.feature_names, index=df.index)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def throughput(encode, cars, batch_sizes, min_seconds=.3):
+    """rows/sec of `encode(batch)` for each batch size, cycling through `cars`."""
+    rates = {}
+    for size in batch_sizes:
+        batches = [(cars * (-(-size // len(cars)) + 1))[i:i + size] for i in range(0, size * 4, size)][:4]
+        calls, start = 0, time.perf_counter()
+        while time.perf_counter() - start < min_seconds:
+            encode(batches[calls % len(batches)])
+            calls += 1
+        rates[size] = calls * size / (time.perf_counter() - start)
+    return rates
+
+
+if __name__ == '__main__':
+    import logging
+
+    from bulk_scoring import CAR_FIELDS, _to_cars
+    from feature_encoder import CompiledEncoder
+    from preprocessing import preprocessing_pipline
+
+    logging.basicConfig(level=logging.WARNING, format='%(name)s: %(message)s')  # the pipeline's INFO progress stays quiet
+    artifacts = {}
+    for name in ['one_hot_encoder', 'label_encoders', 'scaler']:
+        with open(f'../models/{name}.pkl', 'rb') as file:
+            artifacts[name] = pickle.load(file)
+    encoder = CompiledEncoder.from_sklearn(artifacts['one_hot_encoder'], artifacts['label_encoders'], artifacts['scaler'])
+    pipeline = FeaturePipeline.from_sklearn(artifacts['one_hot_encoder'], artifacts['label_encoders'], artifacts['scaler'])
+    pipeline = pickle.loads(pickle.dumps(pipeline))
+    assert pipeline.feature_names == encoder.feature_names
+
+    # serving parity: every raw listing (unseen labels included) through the current /predict encoder
+    raw = pd.read_csv(r'../datas/raw_data/car_price_prediction.csv')
+    cars = _to_cars(raw)
+    expected, expected_errors = encoder.encode_batch(cars)
+    for name, (got, errors) in [('transform_records', pipeline.transform_records(cars)),
+                                ('transform(raw)', pipeline.transform(raw)),
+                                ('transform(api frame)', pipeline.transform(pd.DataFrame(cars)))]:
+        assert errors == expected_errors, f'{name}: errors differ'
+        assert np.array_equal(got, expected, equal_nan=True), f'{name} differs from CompiledEncoder'
+    print(f'serving parity ok on {len(cars)} rows ({len(expected_errors)} with unseen labels)')
+
+    # training parity: refit on preprocessing_pipline output and rebuild xtrain.pkl
+    with open('../models/xtrain.pkl', 'rb') as file:
+        xtrain = pickle.load(file)
+    df = preprocessing_pipline(raw.copy())
+    # Age depends on the year xtrain.pkl was built in, recovered from its scaler's Age mean
+    shift = round(artifacts['scaler'].mean_[-1] - df.loc[xtrain.index, 'Age'].mean())
+    df = df.assign(Age=df['Age'] + shift)
+    train_year = datetime.now().year + shift
+    fitted = FeaturePipeline().fit(df, scale_rows=xtrain.index)
+    rebuilt = fitted.transform_frame(df.loc[xtrain.index])
+    assert list(rebuilt.columns) == list(xtrain.columns), 'column order differs'
+    assert np.allclose(rebuilt.to_numpy(), xtrain.to_numpy(dtype=np.float64), rtol=1e-12, atol=1e-12), 'xtrain differs'
+    print(f'training parity ok: refit on preprocessing_pipline output reproduces xtrain.pkl ({len(xtrain)} rows, year {train_year})')
+
+    valid = [car for car, row in zip(cars, expected) if not np.isnan(row[0])]
+    sizes = [1, 16, 256, 4096, 65536]
+    rates = {'CompiledEncoder.encode_batch' : throughput(encoder.encode_batch, valid, sizes),
+             'FeaturePipeline.transform_records' : throughput(pipeline.transform_records, valid, sizes)}
+    frames = {size : pd.DataFrame((valid * (-(-size // len(valid)) + 1))[:size]) for size in sizes}
+    rates['FeaturePipeline.transform(frame)'] = {size : throughput(lambda _: pipeline.transform(frames[size]), [None], [1])[1]
+                                                 * size for size in sizes}
+    print(f'\n{"rows/sec":<36}' + ''.join(f'{size:>12}' for size in sizes))
+    for name, by_size in rates.items():
+        print(f'{name:<36}' + ''.join(f'{by_size[size]:>12,.0f}' for size in sizes))
@@ -0,0 +1,133 @@
+import numpy as np
+
+
+class FlatForest:
+    """Random Forest regressor flattened into contiguous node arrays.
+
+    All trees share one set of arrays indexed by global int32 node ids:
+    `feature`, float32 `threshold`, `children` (column 0 left, column 1
+    right), `missing_left` and the leaf `value`. Leaves point to themselves,
+    so a batch is evaluated by stepping (row, tree) pairs down one level at a
+    time with NumPy gathers. Same `predict` interface as `RandomForestRegressor`.
+    """
+
+    arrays = ['feature', 'threshold', 'children', 'missing_left', 'value', 'roots']
+
+    # (rows x trees) paths walked together; bounds the temporaries on big batches
+    paths_per_step = 40960
+
+    def __init__(self, feature, threshold, children, missing_left, value, roots, n_features_in_):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.n_features_in_ = int(n_features_in_)
+        self.n_estimators = len(roots)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+
+        feature, threshold, left, right, missing_left, value = [], [], [], [], [], []
+        for offset, tree in zip(offsets, trees):
+            ids = np.arange(tree.node_count) + offset
+            is_leaf = tree.children_left == -1
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(_float32_floor(tree.threshold))
+            left.append(np.where(is_leaf, ids, tree.children_left + offset))
+            right.append(np.where(is_leaf, ids, tree.children_right + offset))
+            missing_left.append(tree.missing_go_to_left.astype(bool))
+            value.append(tree.value[:, 0, 0])
+
+        return cls(
+            feature=np.concatenate(feature).astype(np.int16),
+            threshold=np.concatenate(threshold),
+            children=np.stack([np.concatenate(left), np.concatenate(right)], axis=1).astype(np.int32),
+            missing_left=np.concatenate(missing_left),
+            value=np.concatenate(value).astype(np.float32),
+            roots=offsets[:-1].astype(np.int32),
+            n_features_in_=forest.n_features_in_,
+        )
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    @property
+    def left(self):
+        return self.children[:, 0]
+
+    @property
+    def right(self):
+        return self.children[:, 1]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.arrays)
+
+    def save(self, path):
+        np.savez(path, n_features_in_=self.n_features_in_, **{name : getattr(self, name) for name in self.arrays})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name : data[name] for name in cls.arrays}, n_features_in_=data['n_features_in_'])
+
+    def apply(self, X):
+        """Return the leaf node id reached by each row in each tree, shape (n_rows, n_trees)."""
+        # sklearn evaluates trees on float32 inputs; thresholds are rounded down
+        # to float32 so `x <= threshold` gives the same branch.
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        if n_features != self.n_features_in_:
+            raise ValueError(f'X has {n_features} features, but FlatForest is expecting {self.n_features_in_} features as input.')
+
+        flat_X = X.ravel()
+        has_nan = bool(np.isnan(flat_X).any())
+        children = self.children.ravel()
+        leaves = np.empty((n_rows, self.n_estimators), dtype=np.int32)
+
+        group = max(1, min(self.n_estimators, self.paths_per_step // max(n_rows, 1)))
+        for start in range(0, self.n_estimators, group):
+            roots = self.roots[start:start + group]
+            current = np.tile(roots, n_rows)
+            base = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, len(roots))
+            path = np.arange(len(current))
+            reached = np.empty(len(current), dtype=np.int32)
+
+            depth = 0
+            while len(current):
+                x = flat_X[base + self.feature[current]]
+                go_right = x > self.threshold[current]
+                if has_nan:
+                    go_right |= np.isnan(x) & ~self.missing_left[current]
+                step = children[2 * current + go_right]
+
+                # dropping finished paths costs a pass, so only do it every few levels
+                depth += 1
+                if depth % 8 == 0:
+                    done = step == current
+                    reached[path[done]] = current[done]
+                    keep = ~done
+                    current, base, path = step[keep], base[keep], path[keep]
+                else:
+                    current = step
+
+            leaves[:, start:start + len(roots)] = reached.reshape(n_rows, len(roots))
+
+        return leaves
+
+    def predict(self, X):
+        leaves = self.apply(np.asarray(X))
+        return self.value[leaves].sum(axis=1, dtype=np.float64) / self.n_estimators
+
+
+def _float32_floor(threshold):
+    """Largest float32 <= each float64 threshold, so float32 comparisons match."""
+    rounded = threshold.astype(np.float32)
+    too_high = rounded.astype(np.float64) > threshold
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
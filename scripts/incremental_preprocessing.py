@@ -0,0 +1,261 @@
+"""Incremental version of `preprocessing_pipline` for daily listing batches.
+
+Usage (from scripts/):
+    python incremental_preprocessing.py init [--raw ../datas/raw_data/car_price_prediction.csv]
+    python incremental_preprocessing.py ingest new_listings.csv [--rebuild-threshold 0] [--rebuild]
+    python incremental_preprocessing.py status
+
+`init` runs the full pipeline once and saves its state under
+datas/incremental/:
+
+  raw_history.csv   every distinct raw row ingested so far (for rebuilds)
+  clean.csv         the cleaned store, what preprocessing_pipline would return
+  hashes-N.npy      sorted 64-bit row hashes for drop_duplicates (N of them)
+  state.json        per outlier column, a QuantileSketch of the values it was
+                    filtered on and the IQR bounds in force; per manufacturer,
+                    the price sum and row count behind the ranking filter,
+                    and the manufacturers being dropped; also the committed
+                    sizes of raw_history.csv and clean.csv
+
+`ingest` dedups a new batch against the hash index and judges it with the
+bounds and manufacturer list in force, so old and new rows follow the same
+rules. Once the whole batch is processed it appends it to raw_history.csv
+and clean.csv, writes a new hashes file and then replaces state.json, which
+names that hashes file and records the files' sizes. On load, bytes appended
+after those sizes (an ingest that failed before replacing state.json) are
+truncated, so history, store, index and state always agree. Finally `ingest`
+recomputes the bounds and the ranking from the updated state and reports how
+many stored rows would now be decided differently. When that is more than
+--rebuild-threshold rows, a full rebuild from raw_history.csv is needed:
+--rebuild does it.
+"""
+import argparse
+import io
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import (replace_categorical_by_numerical, fix_datatype, columns_transformation,
+                           engineer_features, preprocessing_pipline)
+from streaming_preprocessing import (OUTLIER_COLUMNS, RAW_TEXT_COLUMNS, QuantileSketch, RowHashIndex, iqr_bounds,
+                                     manufacturers_to_drop)
+
+
+DATAS_DIR = Path(__file__).resolve().parent.parent / 'datas'
+STATE_DIR = DATAS_DIR / 'incremental'
+RAW_DATA_PATH = DATAS_DIR / 'raw_data' / 'car_price_prediction.csv'
+APPENDED_FILES = ['raw_history.csv', 'clean.csv']
+
+
+def row_hashes(raw_text):
+    """Hashes of raw rows read with dtype=str, so they do not depend on per-file type inference."""
+    return pd.util.hash_pandas_object(raw_text, index=False).to_numpy()
+
+
+def read_raw(path, columns=None):
+    """(typed frame, text frame) of a raw listings CSV, with columns in the history's order."""
+    df, text = pd.read_csv(path, dtype=RAW_TEXT_COLUMNS), pd.read_csv(path, dtype=str)
+    if columns is not None:
+        missing = set(columns) - set(df.columns)
+        if missing:
+            raise ValueError(f'{path} is missing columns {sorted(missing)}')
+        df, text = df[columns], text[columns]
+    return df, text
+
+
+class IncrementalState:
+
+    def __init__(self, directory=STATE_DIR):
+        self.directory = Path(directory)
+        self.columns = []
+        self.sketches = {}
+        self.bounds = {}
+        self.sketch_bounds = {}
+        self.price_sum = {}
+        self.counts = {}
+        self.dropped = []
+        self.index = RowHashIndex()
+
+    # --- persistence ---
+
+    def save(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        hashes = np.sort(np.concatenate(self.index.runs or [np.empty(0, np.uint64)]))
+        hashes_file = f'hashes-{len(hashes)}.npy'
+        np.save(self.directory / hashes_file, hashes)
+        state = {
+            'columns' : self.columns,
+            'sketches' : {col : sketch.to_dict() for col, sketch in self.sketches.items()},
+            'bounds' : self.bounds,
+            'sketch_bounds' : self.sketch_bounds,
+            'price_sum' : self.price_sum,
+            'counts' : self.counts,
+            'dropped' : self.dropped,
+            'hashes' : hashes_file,
+            'sizes' : {name : (self.directory / name).stat().st_size for name in APPENDED_FILES},
+        }
+        tmp = self.directory / 'state.json.tmp'
+        tmp.write_text(json.dumps(state, indent=1))
+        tmp.replace(self.directory / 'state.json')
+        for stale in self.directory.glob('hashes*.npy'):
+            if stale.name != hashes_file:
+                stale.unlink()
+
+    @classmethod
+    def load(cls, directory=STATE_DIR):
+        self = cls(directory)
+        state = json.loads((self.directory / 'state.json').read_text())
+        self.columns = state['columns']
+        self.sketches = {col : QuantileSketch.from_dict(s) for col, s in state['sketches'].items()}
+        self.bounds = {col : tuple(b) for col, b in state['bounds'].items()}
+        self.sketch_bounds = {col : tuple(b) for col, b in state['sketch_bounds'].items()}
+        self.price_sum, self.counts, self.dropped = state['price_sum'], state['counts'], state['dropped']
+        self.index.runs = [np.load(self.directory / state.get('hashes', 'hashes.npy'))]
+        for name, size in state.get('sizes', {}).items():
+            # roll back rows appended by an ingest that did not reach save()
+            with open(self.directory / name, 'r+b') as f:
+                if f.seek(0, io.SEEK_END) > size:
+                    f.truncate(size)
+        return self
+
+    # --- full build ---
+
+    def build(self, raw_path, relative_accuracy=0.0001):
+        """Run the full pipeline on `raw_path` and reset the state and store from it."""
+        df, text = read_raw(raw_path)
+        self.columns = list(df.columns)
+        self.index = RowHashIndex()
+        first = self.index.add(row_hashes(text))
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        df[first].to_csv(self.directory / 'raw_history.csv', index=False)
+
+        # the same sequential populations clean_outliers sees
+        parsed = replace_categorical_by_numerical(df[first].copy())
+        self.sketches, self.bounds = {}, {}
+        for col in OUTLIER_COLUMNS:
+            sketch = QuantileSketch(relative_accuracy)
+            sketch.add(parsed[col])
+            self.sketches[col] = sketch
+            self.bounds[col] = iqr_bounds(parsed[col].quantile(.25), parsed[col].quantile(.75))
+            parsed = parsed[(parsed[col] >= self.bounds[col][0]) & (parsed[col] <= self.bounds[col][1])]
+        self.sketch_bounds = self.estimated_bounds()
+
+        parsed = parsed[(parsed['Prod. year'] > 1991) & (parsed['Prod. year'] < 2020)]
+        self.price_sum = {k : int(v) for k, v in parsed.groupby('Manufacturer')['Price'].sum().items()}
+        self.counts = {k : int(v) for k, v in parsed['Manufacturer'].value_counts().items()}
+
+        clean = preprocessing_pipline(df[first].copy())
+        self.dropped = sorted(set(parsed['Manufacturer']) - set(clean['Manufacturer']))
+        clean.to_csv(self.directory / 'clean.csv', index=False)
+        self.save()
+        return len(clean)
+
+    # --- incremental path ---
+
+    def estimated_bounds(self):
+        return {col : iqr_bounds(sketch.quantile(.25), sketch.quantile(.75)) for col, sketch in self.sketches.items()}
+
+    def ingest(self, path):
+        """Add a batch of raw listings; return (new raw rows, rows appended to the store)."""
+        df, text = read_raw(path, self.columns)
+        first = self.index.add(row_hashes(text))
+        batch = df[first]
+
+        parsed = fix_datatype(replace_categorical_by_numerical(batch.copy()))
+        for col in OUTLIER_COLUMNS:
+            self.sketches[col].add(parsed[col])
+            lower, upper = self.bounds[col]
+            parsed = parsed[(parsed[col] >= lower) & (parsed[col] <= upper)]
+
+        parsed = parsed[(parsed['Prod. year'] > 1991) & (parsed['Prod. year'] < 2020)]
+        for manufacturer, total in parsed.groupby('Manufacturer')['Price'].sum().items():
+            self.price_sum[manufacturer] = self.price_sum.get(manufacturer, 0) + int(total)
+        for manufacturer, count in parsed['Manufacturer'].value_counts().items():
+            self.counts[manufacturer] = self.counts.get(manufacturer, 0) + int(count)
+
+        parsed = parsed[~parsed['Manufacturer'].isin(self.dropped)]
+        clean = engineer_features(columns_transformation(parsed)).drop(columns=['ID', 'Prod. year', 'Doors'])
+
+        # nothing is written until the batch is fully processed; save() then commits the appends
+        batch.to_csv(self.directory / 'raw_history.csv', mode='a', header=False, index=False)
+        clean.to_csv(self.directory / 'clean.csv', mode='a', header=False, index=False)
+        self.save()
+        return len(batch), len(clean)
+
+    def drift(self):
+        """Rows whose filter decision would change if the pipeline were re-run on the whole history.
+
+        Bound shifts are measured between sketch estimates (now vs at the
+        last build), so the sketch's own error does not count as drift.
+        """
+        report = {}
+        for col, (lower, upper) in self.estimated_bounds().items():
+            old_lower, old_upper = self.sketch_bounds[col]
+            sketch = self.sketches[col]
+            moved = abs(sketch.count_below(lower) - sketch.count_below(old_lower))
+            moved += abs(sketch.count_below(upper) - sketch.count_below(old_upper))
+            report[col] = {'bounds' : self.bounds[col], 'estimated' : (lower, upper), 'rows' : int(moved)}
+
+        dropped = set(manufacturers_to_drop(pd.Series(self.price_sum, name='Price').rename_axis('Manufacturer'),
+                                            pd.Series(self.counts, name='count').rename_axis('Manufacturer')))
+        changed = sorted(dropped ^ set(self.dropped))
+        report['Manufacturer'] = {'changed' : changed, 'rows' : int(sum(self.counts.get(m, 0) for m in changed))}
+        return report
+
+
+def print_drift(report, threshold):
+    total = 0
+    for col, entry in report.items():
+        total += entry['rows']
+        if col == 'Manufacturer':
+            print(f'  {col:<14} {len(entry["changed"])} manufacturers change side {entry["changed"]} : {entry["rows"]} rows')
+        else:
+            print(f'  {col:<14} bounds {tuple(round(b, 3) for b in entry["bounds"])} -> '
+                  f'{tuple(round(b, 3) for b in entry["estimated"])} : {entry["rows"]} rows')
+    needed = total > threshold
+    print(f'{total} rows would be decided differently -> {"REBUILD NEEDED" if needed else "no rebuild needed"}')
+    return needed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--state', default=STATE_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    init = sub.add_parser('init', help='full build from a raw CSV')
+    init.add_argument('--raw', default=RAW_DATA_PATH)
+    init.add_argument('--relative-accuracy', type=float, default=0.0001)
+    ingest = sub.add_parser('ingest', help='append a batch of new raw listings')
+    ingest.add_argument('batch')
+    ingest.add_argument('--rebuild-threshold', type=int, default=0, help='rows allowed to change before a rebuild is needed')
+    ingest.add_argument('--rebuild', action='store_true', help='rebuild from raw_history.csv when needed')
+    sub.add_parser('status', help='report drift without ingesting')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(name)s: %(message)s')  # the pipeline's INFO progress stays quiet
+
+    state_dir = Path(args.state)
+    if args.command == 'init':
+        state = IncrementalState(state_dir)
+        rows = state.build(args.raw, args.relative_accuracy)
+        print(f'built {state_dir / "clean.csv"} with {rows} rows, {len(state.dropped)} manufacturers dropped')
+        return
+
+    state = IncrementalState.load(state_dir)
+    if args.command == 'ingest':
+        new, kept = state.ingest(args.batch)
+        print(f'{new} new raw rows, {kept} appended to {state_dir / "clean.csv"}')
+
+    needed = print_drift(state.drift(), getattr(args, 'rebuild_threshold', 0))
+    if needed and getattr(args, 'rebuild', False):
+        accuracy = next(iter(state.sketches.values())).relative_accuracy
+        history = state_dir / 'raw_history.csv'
+        rebuilt = IncrementalState(state_dir)
+        rows = rebuilt.build(history, accuracy)
+        print(f'rebuilt {state_dir / "clean.csv"} from {history} : {rows} rows')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+
+class Histogram:
+    """Fixed-bucket histogram; `buckets` are inclusive upper bounds.
+
+    Thread-safe: in 'thread' scoring mode the stage timers observe from the
+    pool's threads.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            counts, count, total_sum = list(self.counts), self.count, self.sum
+        cumulative, total = {}, 0
+        for bound, bucket_count in zip(self.buckets + ['+Inf'], counts):
+            total += bucket_count
+            cumulative[str(bound)] = total
+        return {'buckets' : cumulative, 'count' : count, 'sum' : total_sum,
+                'mean' : total_sum / count if count else 0.0}
+
+
+LATENCY_BUCKETS = [5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0]
+
+
+class _StageTimer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe((time.perf_counter_ns() - self.start) * 1e-9)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+class Metrics:
+    """Stage latency histograms and counters rendered as Prometheus text.
+
+    `with metrics.stage('encode'): ...` costs two monotonic clock reads and a
+    bucket bisect when enabled, and returns a shared no-op context when
+    disabled.
+    """
+
+    def __init__(self, namespace='car_price', enabled=True):
+        self.namespace = namespace
+        self.enabled = enabled
+        self.stages = {}
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.info = {}
+        self.collectors = []
+
+    def _histogram(self, name):
+        histogram = self.stages.get(name)
+        if histogram is None:
+            histogram = self.stages.setdefault(name, Histogram(LATENCY_BUCKETS))
+        return histogram
+
+    def stage(self, name):
+        if not self.enabled:
+            return _null_timer
+        return _StageTimer(self._histogram(name))
+
+    def observe(self, name, seconds):
+        if self.enabled:
+            self._histogram(name).observe(seconds)
+
+    def count_request(self, path, method, status):
+        if self.enabled:
+            self.requests[(path, method, str(status))] += 1
+
+    def count_error(self, error_type, n=1):
+        if self.enabled:
+            self.errors[error_type] += n
+
+    def add_collector(self, collect):
+        """`collect()` returns extra exposition lines, evaluated at scrape time."""
+        self.collectors.append(collect)
+
+    def render(self):
+        ns = self.namespace
+        lines = [f'# HELP {ns}_stage_seconds Time spent in each serving stage.',
+                 f'# TYPE {ns}_stage_seconds histogram']
+        for stage, histogram in sorted(self.stages.items()):
+            lines += histogram_lines(f'{ns}_stage_seconds', histogram, {'stage' : stage})
+
+        lines += [f'# HELP {ns}_requests_total HTTP requests by route and status.',
+                  f'# TYPE {ns}_requests_total counter']
+        for (path, method, status), count in sorted(self.requests.items()):
+            lines.append(f'{ns}_requests_total{format_labels({"path" : path, "method" : method, "status" : status})} {count}')
+
+        lines += [f'# HELP {ns}_errors_total Scoring errors by exception type.',
+                  f'# TYPE {ns}_errors_total counter']
+        for error_type, count in sorted(self.errors.items()):
+            lines.append(f'{ns}_errors_total{format_labels({"type" : error_type})} {count}')
+
+        if self.info:
+            lines += [f'# HELP {ns}_model_info Model version currently serving.',
+                      f'# TYPE {ns}_model_info gauge',
+                      f'{ns}_model_info{format_labels(self.info)} 1']
+
+        for collect in self.collectors:
+            lines += collect()
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+def histogram_lines(name, histogram, labels=None):
+    labels = labels or {}
+    snapshot = histogram.snapshot()
+    lines = [f'{name}_bucket{format_labels({**labels, "le" : bound})} {count}'
+             for bound, count in snapshot['buckets'].items()]
+    lines.append(f'{name}_sum{format_labels(labels)} {snapshot["sum"]}')
+    lines.append(f'{name}_count{format_labels(labels)} {snapshot["count"]}')
+    return lines
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: counts requests by route template and status and
+    records the request start in `request.state.started` (perf_counter)."""
+
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.metrics.enabled:
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        scope.setdefault('state', {})['started'] = started
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            self.metrics.count_request(path, scope['method'], status)
+            self.metrics.observe('request', time.perf_counter() - started)
@@ -0,0 +1,303 @@
+"""Versioned single-directory model bundles.
+
+A bundle is one directory holding `manifest.json` plus one `.npy` file per
+numeric array (flattened forest nodes, encoder category tables, scaler
+vectors). Arrays are opened with `mmap_mode='r'`, so every uvicorn worker
+that loads the same bundle shares the same physical pages.
+
+    models/bundles/<version>/manifest.json
+    models/bundles/<version>/forest.*.npy, encoder.*.npy, scaler.*.npy
+    models/bundles/current            <- text file with the active version
+
+Without a current bundle the pickles in models/ are served, as version
+'pickles-<digest of those files>'.
+
+Usage (from scripts/):
+    python model_bundle.py export            # pickles in ../models -> new bundle
+    python model_bundle.py info [version]
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import pickle
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from dataset_store import load_split
+from feature_encoder import CompiledEncoder, columns_label_encoding, columns_one_hot_encoding
+from feature_pipeline import FeaturePipeline
+from forest_engine import FlatForest
+from perf import rss_bytes, format_bytes
+
+MODELS_DIR = Path(__file__).resolve().parent.parent / 'models'
+BUNDLES_DIR = MODELS_DIR / 'bundles'
+FORMAT_VERSION = 1
+# `load_model` reference to the bundle built from the pickles, and the prefix of its
+# version: 'pickles-' plus a content digest of the files it was built from
+PICKLES = 'pickles'
+
+# batches this large are encoded with FeaturePipeline's column-wise transform,
+# smaller ones with CompiledEncoder, whose per-call overhead is lower
+PIPELINE_MIN_ROWS = int(os.environ.get('PIPELINE_MIN_ROWS', 128))
+
+
+@dataclass
+class ModelBundle:
+    version: str
+    encoder: CompiledEncoder
+    forest: FlatForest
+    manufacturer_model_map: dict
+    pipeline: FeaturePipeline = None
+    manifest: dict = field(default_factory=dict)
+    path: Path = None
+    load_seconds: float = 0.0
+    rss_bytes: int = 0
+
+    def predict(self, X):
+        return self.forest.predict(X)
+
+    def encode(self, cars):
+        """(X, errors) for a list of car dicts, see CompiledEncoder.encode_batch."""
+        if self.pipeline is None or len(cars) < PIPELINE_MIN_ROWS:
+            return self.encoder.encode_batch(cars)
+        return self.pipeline.transform_records(cars)
+
+    def info(self):
+        return {
+            'version' : self.version,
+            'path' : str(self.path) if self.path else None,
+            'sklearn_version' : self.manifest.get('sklearn_version'),
+            'created' : self.manifest.get('created'),
+            'metrics' : self.manifest.get('metrics', {}),
+            'n_estimators' : self.forest.n_estimators,
+            'node_count' : self.forest.node_count,
+            'load_seconds' : self.load_seconds,
+            'rss_bytes' : self.rss_bytes,
+            'pid' : os.getpid(),
+        }
+
+
+def _bundle_arrays(encoder, forest):
+    arrays = {f'forest.{name}' : getattr(forest, name) for name in FlatForest.arrays}
+    for col in columns_label_encoding:
+        arrays[f'encoder.label.{col}'] = np.array(encoder.label_classes[col], dtype=str)
+    for col in columns_one_hot_encoding:
+        arrays[f'encoder.onehot.{col}'] = np.array(encoder.onehot_categories[col], dtype=str)
+    arrays['scaler.mean'] = encoder.scaler_mean
+    arrays['scaler.scale'] = encoder.scaler_scale
+    return arrays
+
+
+def export_bundle(encoder, forest, manufacturer_model_map, metrics=None, root=BUNDLES_DIR, activate=True):
+    """Write a new bundle under `root` and return its directory.
+
+    `encoder` is a FeaturePipeline or a CompiledEncoder; either carries the
+    category tables and scaler vectors that are stored.
+
+    The version is the first 12 hex digits of a sha256 over every array file,
+    so re-exporting identical artifacts gives the same version.
+    """
+    import sklearn
+
+    root = Path(root)
+    staging = root / f'.staging-{os.getpid()}'
+    staging.mkdir(parents=True, exist_ok=True)
+
+    files, digest = {}, hashlib.sha256()
+    for name, array in sorted(_bundle_arrays(encoder, forest).items()):
+        filename = f'{name}.npy'
+        np.save(staging / filename, np.ascontiguousarray(array), allow_pickle=False)
+        file_hash = hashlib.sha256((staging / filename).read_bytes()).hexdigest()
+        digest.update(file_hash.encode())
+        files[name] = {'file' : filename, 'sha256' : file_hash, 'dtype' : str(array.dtype), 'shape' : list(array.shape)}
+
+    with open(staging / 'manufacturer_model_map.json', 'w') as f:
+        json.dump({k : list(v) for k, v in manufacturer_model_map.items()}, f)
+    digest.update(hashlib.sha256((staging / 'manufacturer_model_map.json').read_bytes()).digest())
+
+    version = digest.hexdigest()[:12]
+    manifest = {
+        'format_version' : FORMAT_VERSION,
+        'version' : version,
+        'hash' : digest.hexdigest(),
+        'created' : datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'sklearn_version' : sklearn.__version__,
+        'numpy_version' : np.__version__,
+        'feature_names' : encoder.feature_names,
+        'n_features' : encoder.n_features,
+        'n_estimators' : forest.n_estimators,
+        'node_count' : forest.node_count,
+        'metrics' : metrics or {},
+        'arrays' : files,
+    }
+    with open(staging / 'manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    target = root / version
+    if target.exists():
+        for path in staging.iterdir():
+            path.unlink()
+        staging.rmdir()
+    else:
+        staging.rename(target)
+
+    if activate:
+        set_current(version, root)
+    return target
+
+
+def set_current(version, root=BUNDLES_DIR):
+    root = Path(root)
+    tmp = root / f'.current-{os.getpid()}'
+    tmp.write_text(version + '\n')
+    os.replace(tmp, root / 'current')
+
+
+def current_version(root=BUNDLES_DIR):
+    try:
+        return (Path(root) / 'current').read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_bundle(path, mmap=True, verify=False):
+    """Load a bundle directory; arrays are memory-mapped read-only by default."""
+    start, rss_before = time.perf_counter(), rss_bytes()
+    path = Path(path).resolve()
+    with open(path / 'manifest.json') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f'unsupported bundle format {manifest.get("format_version")} in {path}')
+
+    arrays = {}
+    for name, meta in manifest['arrays'].items():
+        file = path / meta['file']
+        if verify and hashlib.sha256(file.read_bytes()).hexdigest() != meta['sha256']:
+            raise ValueError(f'checksum mismatch for {file}')
+        arrays[name] = np.load(file, mmap_mode='r' if mmap else None, allow_pickle=False)
+
+    with open(path / 'manufacturer_model_map.json') as f:
+        manufacturer_model_map = json.load(f)
+
+    forest = FlatForest(**{name : arrays[f'forest.{name}'] for name in FlatForest.arrays},
+                        n_features_in_=manifest['n_features'])
+    pipeline = FeaturePipeline(
+        label_classes={col : arrays[f'encoder.label.{col}'].tolist() for col in columns_label_encoding},
+        onehot_categories={col : arrays[f'encoder.onehot.{col}'].tolist() for col in columns_one_hot_encoding},
+        scaler_mean=arrays['scaler.mean'],
+        scaler_scale=arrays['scaler.scale'],
+    )
+    encoder = compile_encoder(pipeline)
+    if encoder.feature_names != manifest['feature_names']:
+        raise ValueError(f'feature order in {path} does not match the encoder')
+
+    return ModelBundle(version=manifest['version'], encoder=encoder, forest=forest, pipeline=pipeline,
+                       manufacturer_model_map=manufacturer_model_map, manifest=manifest, path=path,
+                       load_seconds=time.perf_counter() - start, rss_bytes=rss_bytes() - rss_before)
+
+
+def compile_encoder(pipeline):
+    """The per-row CompiledEncoder for the fitted tables of `pipeline`."""
+    return CompiledEncoder(pipeline.label_classes, pipeline.onehot_categories, pipeline.scaler_mean, pipeline.scaler_scale)
+
+
+def load_pickles(models_dir=MODELS_DIR):
+    """Build an in-memory bundle from the pickles in `models_dir`: feature_pipeline.pkl
+    (train.py) or else the notebooks' one_hot_encoder / label_encoders / scaler.
+
+    The version is 'pickles-' plus the first 12 hex digits of a sha256 over the
+    files read, so retrained pickles get a new version (reload, rollback and
+    the prediction cache tell them apart) and unchanged ones keep theirs.
+    """
+    start, rss_before = time.perf_counter(), rss_bytes()
+    models_dir = Path(models_dir)
+    digest = hashlib.sha256()
+
+    def read_bytes(name):
+        data = (models_dir / name).read_bytes()
+        digest.update(f'{name}:{hashlib.sha256(data).hexdigest()};'.encode())
+        return data
+
+    def read(name):
+        return pickle.loads(read_bytes(name))
+
+    if (models_dir / 'feature_pipeline.pkl').exists():
+        pipeline = read('feature_pipeline.pkl')
+    else:
+        pipeline = FeaturePipeline.from_sklearn(read('one_hot_encoder.pkl'), read('label_encoders.pkl'), read('scaler.pkl'))
+    encoder = compile_encoder(pipeline)
+    if (models_dir / 'forest.npz').exists():
+        forest = FlatForest.load(io.BytesIO(read_bytes('forest.npz')))
+    else:
+        forest = FlatForest.from_sklearn(read('model.pkl'))
+    manufacturer_model_map = read('manufacturer_model_map.pkl')
+
+    return ModelBundle(version=f'{PICKLES}-{digest.hexdigest()[:12]}', encoder=encoder, forest=forest, pipeline=pipeline,
+                       manufacturer_model_map=manufacturer_model_map, path=models_dir,
+                       load_seconds=time.perf_counter() - start, rss_bytes=rss_bytes() - rss_before)
+
+
+def is_pickles(version):
+    return version == PICKLES or version.startswith(f'{PICKLES}-')
+
+
+def load_model(bundle=None, root=BUNDLES_DIR, models_dir=MODELS_DIR):
+    """Load `bundle` (a directory, a version under `root`, PICKLES or a pickles
+    version), else the current bundle, else fall back to the pickles in
+    `models_dir`. A pickles version only loads while the pickles still hash to it."""
+    if bundle is None:
+        bundle = current_version(root)
+    if bundle is None or is_pickles(str(bundle)):
+        legacy = load_pickles(models_dir)
+        if bundle not in (None, PICKLES) and legacy.version != bundle:
+            raise FileNotFoundError(f'the pickles in {models_dir} are now {legacy.version}, not {bundle}')
+        return legacy
+    path = Path(bundle)
+    if not path.is_absolute() and not path.exists():
+        path = Path(root) / bundle
+    return load_bundle(path)
+
+
+def evaluate(forest, models_dir=MODELS_DIR):
+    """R2 / RMSE of `forest` on the saved xtest/ytest split."""
+    xtest, ytest = load_split(['xtest', 'ytest'], Path(models_dir) / 'split', frame=False, models_dir=models_dir)
+    ytest = np.asarray(ytest, dtype=np.float64)
+    pred = forest.predict(np.asarray(xtest, dtype=np.float64))
+    residual = ytest - pred
+    return {
+        'r2' : float(1 - (residual ** 2).sum() / ((ytest - ytest.mean()) ** 2).sum()),
+        'rmse' : float(np.sqrt((residual ** 2).mean())),
+        'n_test' : int(len(ytest)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help='bundle the pickles in ../models')
+    export.add_argument('--root', default=BUNDLES_DIR)
+    export.add_argument('--no-activate', action='store_true')
+    info = sub.add_parser('info', help='load a bundle and report load time and memory')
+    info.add_argument('version', nargs='?')
+    info.add_argument('--root', default=BUNDLES_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        legacy = load_pickles()
+        target = export_bundle(legacy.encoder, legacy.forest, legacy.manufacturer_model_map,
+                               metrics=evaluate(legacy.forest), root=args.root, activate=not args.no_activate)
+        print(f'bundle written to {target}')
+    else:
+        bundle = load_model(args.version, root=args.root)
+        print(json.dumps(bundle.info(), indent=2))
+        print(f'loaded in {bundle.load_seconds * 1e3:.1f} ms, rss +{format_bytes(bundle.rss_bytes)}')
+
+
+if __name__ == '__main__':
+    main()
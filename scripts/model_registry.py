@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from model_bundle import load_model
+
+
+def warmup_cars(encoder, n=8):
+    """Synthetic but valid cars built from the encoder's own category tables."""
+    cars = []
+    for i in range(n):
+        pick = lambda values: values[i % len(values)]
+        cars.append({
+            'Levy' : int(encoder.scaler_mean[0]), 'Engine_volume' : float(encoder.scaler_mean[1]),
+            'Mileage' : int(encoder.scaler_mean[2]), 'Prod_year' : 2015 - i, 'Cylinders' : 4.0, 'Airbags' : 6,
+            'Manufacturer' : pick(encoder.label_classes['Manufacturer']), 'Model' : pick(encoder.label_classes['Model']),
+            'Category' : pick(encoder.label_classes['Category']), 'Color' : pick(encoder.label_classes['Color']),
+            'Leather_interior' : pick(['Yes', 'No']),
+            'Gear_box_type' : pick(encoder.onehot_categories['Gear box type']),
+            'Drive_wheels' : pick(encoder.onehot_categories['Drive wheels']),
+            'Wheel' : pick(encoder.onehot_categories['Wheel']),
+            'Fuel_type' : pick(encoder.onehot_categories['Fuel type']),
+        })
+    return cars
+
+
+class ModelRegistry:
+    """Holds the serving model and up to `keep` previous versions.
+
+    `current` is swapped by a single reference assignment, so a request (or a
+    micro-batch) that read `registry.current` keeps scoring on that version
+    until it finishes while new requests pick up the new one.
+    """
+
+    def __init__(self, loader=load_model, keep=3, warmup_rows=8):
+        self.loader = loader
+        self.previous = deque(maxlen=keep)
+        self.warmup_rows = warmup_rows
+        self.current = None
+        self.loading = None
+        self.history = []
+        self._lock = threading.Lock()
+
+    def load(self, ref=None):
+        """Load and warm up a bundle without activating it."""
+        bundle = self.loader(ref)
+        start = time.perf_counter()
+        X, errors = bundle.encoder.encode_batch(warmup_cars(bundle.encoder, self.warmup_rows))
+        predictions = bundle.predict(X)
+        if errors or not np.isfinite(predictions).all():
+            raise ValueError(f'model {bundle.version} failed warm-up: {errors or predictions}')
+        bundle.warmup_seconds = time.perf_counter() - start
+        return bundle
+
+    def activate(self, bundle):
+        with self._lock:
+            old = self.current
+            if old is not None and old.version != bundle.version:
+                self._forget(bundle.version)
+                self.previous.appendleft(old)
+            self.current = bundle
+            self.history.append({'version' : bundle.version, 'activated' : time.time(),
+                                 'replaced' : old.version if old is not None else None})
+        return bundle
+
+    def _forget(self, version):
+        for bundle in list(self.previous):
+            if bundle.version == version:
+                self.previous.remove(bundle)
+
+    async def reload(self, ref=None):
+        """Load, warm up and activate `ref` in a worker thread."""
+        if self.loading is not None:
+            raise RuntimeError(f'already loading {self.loading!r}')
+        self.loading = ref or 'current'
+        try:
+            bundle = await asyncio.to_thread(self.load, ref)
+            return self.activate(bundle)
+        finally:
+            self.loading = None
+
+    def rollback(self, version=None):
+        """Switch back to `version`, or to the most recently replaced one."""
+        with self._lock:
+            for bundle in self.previous:
+                if version is None or bundle.version == version:
+                    break
+            else:
+                raise KeyError(f'version {version!r} is not kept' if version else 'no previous version to roll back to')
+            self.previous.remove(bundle)
+            old = self.current
+            self.previous.appendleft(old)
+            self.current = bundle
+            self.history.append({'version' : bundle.version, 'activated' : time.time(),
+                                 'replaced' : old.version, 'rollback' : True})
+        return bundle
+
+    def versions(self):
+        return {
+            'current' : self.current.info() if self.current is not None else None,
+            'previous' : [bundle.info() for bundle in self.previous],
+            'loading' : self.loading,
+            'history' : self.history[-20:],
+        }
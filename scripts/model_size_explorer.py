@@ -0,0 +1,158 @@
+"""Sweep RandomForestRegressor sizes for accuracy against latency and memory.
+
+Usage (from scripts/):
+    python model_size_explorer.py [--n-estimators 25 50 100] [--max-depth none 12 20]
+                                  [--min-samples-leaf 1 2 5] [--max-features 1.0 0.5 sqrt]
+                                  [--out ../models/size_sweep.csv]
+    python model_size_explorer.py ... --max-latency-ms 1.0 --max-mb 20 --export [--bundle]
+
+Every configuration is fit on the saved xtrain/ytrain and scored on
+xtest/ytest. For each one it records R2, p50/p99 latency for a single row and
+for a batch (with the FlatForest engine the API serves with, and sklearn for
+comparison), plus the pickled and flattened sizes. The Pareto front over
+(R2, single-row p99, flat size) is printed.
+
+With --export, the most accurate configuration within the budgets is written to
+../models/model.pkl and ../models/forest.npz. With --bundle it is also written as a new
+model bundle, which becomes the current one.
+"""
+import argparse
+import itertools
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score
+
+from dataset_store import load_split
+from forest_engine import FlatForest
+from model_bundle import MODELS_DIR, export_bundle, evaluate, load_pickles
+from perf import format_bytes, latency_percentiles
+
+
+def read_split(models_dir=MODELS_DIR):
+    return load_split(['xtrain', 'ytrain', 'xtest', 'ytest'], Path(models_dir) / 'split', models_dir=models_dir)
+
+
+def parse_max_depth(value):
+    return None if value.lower() == 'none' else int(value)
+
+
+def parse_max_features(value):
+    if value in ('sqrt', 'log2'):
+        return value
+    return float(value) if '.' in value else int(value)
+
+
+def measure(params, xtrain, ytrain, xtest, ytest, batch_size=64, repeat=200, n_jobs=None):
+    start = time.perf_counter()
+    rf = RandomForestRegressor(random_state=0, n_jobs=n_jobs, **params).fit(xtrain, ytrain)
+    fit_seconds = time.perf_counter() - start
+    rf.set_params(n_jobs=None)
+    flat = FlatForest.from_sklearn(rf)
+
+    X = xtest.to_numpy(dtype=np.float64)
+    row, batch = X[:1], np.resize(X, (batch_size, X.shape[1]))
+    row_df = xtest.iloc[:1]
+
+    single = latency_percentiles(lambda: flat.predict(row), repeat=repeat)
+    batched = latency_percentiles(lambda: flat.predict(batch), repeat=repeat)
+    sk_single = latency_percentiles(lambda: rf.predict(row_df), repeat=max(repeat // 5, 10))
+
+    result = {
+        **params,
+        'max_depth' : 'None' if params['max_depth'] is None else params['max_depth'],
+        'r2' : r2_score(ytest, flat.predict(X)),
+        'fit_s' : fit_seconds,
+        'single_p50_ms' : single['p50'], 'single_p99_ms' : single['p99'],
+        f'batch{batch_size}_p50_ms' : batched['p50'], f'batch{batch_size}_p99_ms' : batched['p99'],
+        'sklearn_single_p50_ms' : sk_single['p50'],
+        'nodes' : flat.node_count,
+        'pickle_bytes' : len(pickle.dumps(rf, protocol=pickle.HIGHEST_PROTOCOL)),
+        'flat_bytes' : flat.nbytes,
+    }
+    return result, rf, flat
+
+
+def pareto_front(results):
+    """Rows not dominated on (higher r2, lower single-row p99, smaller flat size)."""
+    keys = results[['r2', 'single_p99_ms', 'flat_bytes']].to_numpy() * np.array([-1, 1, 1])
+    keep = [not any((other <= row).all() and (other < row).any() for other in keys) for row in keys]
+    return results[keep].sort_values('r2', ascending=False)
+
+
+def within_budget(results, max_latency_ms=None, max_bytes=None):
+    mask = pd.Series(True, index=results.index)
+    if max_latency_ms is not None:
+        mask &= results['single_p99_ms'] <= max_latency_ms
+    if max_bytes is not None:
+        mask &= results['flat_bytes'] <= max_bytes
+    return results[mask].sort_values('r2', ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-estimators', nargs='+', type=int, default=[25, 50, 100])
+    parser.add_argument('--max-depth', nargs='+', type=parse_max_depth, default=[None, 12, 20])
+    parser.add_argument('--min-samples-leaf', nargs='+', type=int, default=[1, 2, 5])
+    parser.add_argument('--max-features', nargs='+', type=parse_max_features, default=[1.0, 0.5, 'sqrt'])
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=200, help='latency samples per configuration')
+    parser.add_argument('--n-jobs', type=int, help='threads used for fitting only')
+    parser.add_argument('--out', help='write every configuration to this .csv')
+    parser.add_argument('--max-latency-ms', type=float, help='single-row p99 budget for --export')
+    parser.add_argument('--max-mb', type=float, help='flattened model size budget for --export')
+    parser.add_argument('--export', action='store_true', help='write the best model within budget to ../models')
+    parser.add_argument('--bundle', action='store_true', help='with --export, also write and activate a model bundle')
+    args = parser.parse_args()
+
+    xtrain, ytrain, xtest, ytest = read_split()
+    grid = list(itertools.product(args.n_estimators, args.max_depth, args.min_samples_leaf, args.max_features))
+    print(f'{len(grid)} configurations, train {xtrain.shape}, test {xtest.shape}')
+
+    # with --export only the best fitted model within budget so far is kept, not the whole sweep
+    max_bytes = args.max_mb * 1024 ** 2 if args.max_mb is not None else None
+    rows, best = [], None
+    for n_estimators, max_depth, min_samples_leaf, max_features in grid:
+        params = {'n_estimators' : n_estimators, 'max_depth' : max_depth,
+                  'min_samples_leaf' : min_samples_leaf, 'max_features' : max_features}
+        result, rf, flat = measure(params, xtrain, ytrain, xtest, ytest, args.batch_size, args.repeat, args.n_jobs)
+        rows.append(result)
+        if args.export and not within_budget(pd.DataFrame([result]), args.max_latency_ms, max_bytes).empty:
+            if best is None or result['r2'] > best[0]['r2']:
+                best = (result, rf, flat)
+        del rf, flat
+        print(f'{str(params):<90} r2 {result["r2"]:.4f}  1 row p99 {result["single_p99_ms"]:7.3f} ms  '
+              f'flat {format_bytes(result["flat_bytes"]):>9}  pickle {format_bytes(result["pickle_bytes"]):>9}')
+
+    results = pd.DataFrame(rows)
+    if args.out:
+        results.to_csv(args.out, index=False)
+        print(f'results written to {args.out}')
+
+    columns = ['n_estimators', 'max_depth', 'min_samples_leaf', 'max_features', 'r2', 'single_p50_ms', 'single_p99_ms',
+               f'batch{args.batch_size}_p99_ms', 'flat_bytes', 'pickle_bytes']
+    print('\nPareto front (r2 up, single-row p99 down, flat size down):')
+    print(pareto_front(results)[columns].to_string(index=False))
+
+    if args.export:
+        if best is None:
+            print('\nno configuration fits the budget, nothing exported')
+            return
+        result, rf, flat = best
+        with open(MODELS_DIR / 'model.pkl', 'wb') as f:
+            pickle.dump(rf, f)
+        flat.save(MODELS_DIR / 'forest.npz')
+        print(f'\nexported {result} to {MODELS_DIR / "model.pkl"} and forest.npz')
+
+        if args.bundle:
+            legacy = load_pickles()
+            target = export_bundle(legacy.pipeline, flat, legacy.manufacturer_model_map, metrics=evaluate(flat))
+            print(f'bundle written to {target}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,8 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import numpy as np
-import pandas as pd
-import pickle
+from dataset_store import load_split
+from chart_cache import dataset_version, render_tab, show
+from dashboard_charts import MODEL_TABS, OUTLIER_TABS
+from dataset_provider import default_provider
 
 # 1. PAGE CONFIG & CUSTOM THEME
 st.set_page_config(
@@ -70,17 +66,22 @@ st.markdown("""
 
 # 4. DATA & MODELS
 @st.cache_resource
+def load_models(version):
+    # memory-mapped, read-only: shared by every session and process (falls back to the pickles)
+    return load_split(directory=r'../models/split', models_dir=r'../models')
+
 def load_data_and_models():
     # Attempt to load your specific paths
     try:
-        with open(r'../models/xtrain.pkl' , 'rb') as f: xtrain = pickle.load(f)
-        with open(r'../models/xtest.pkl' , 'rb') as f: xtest = pickle.load(f)
-        with open(r'../models/ytrain.pkl' , 'rb') as f: ytrain = pickle.load(f)
-        with open(r'../models/ytest.pkl' , 'rb') as f: ytest = pickle.load(f)
-        with open(r'../models/ypred.pkl' , 'rb') as f: ypred = pickle.load(f)
-        df = pd.read_csv(r'../datas/clean_car.csv')
-        df_clean = pd.read_csv(r'../datas/clean_car_filtering.csv')
-        return xtrain, xtest, ytrain, ytest, ypred, df, df_clean
+        models_version = dataset_version(r'../models/split/manifest.json', r'../models/ytest.pkl', r'../models/ypred.pkl')
+        xtrain, xtest, ytrain, ytest, ypred = load_models(models_version)
+        # read-only frames shared by every session and page, reloaded when the CSVs change (dataset_provider.py);
+        # read_csv's dtypes, not the compact ones, so the charts show the CSV's values
+        provider = default_provider()
+        df = provider.frame('clean', compact=False)
+        df_clean = provider.frame('filtering', compact=False)
+        version = provider.version('clean')[:16] + models_version
+        return xtrain, xtest, ytrain, ytest, ypred, df, df_clean, version
     except:
         st.error("Data Path Error: Please ensure local pkl/csv files are in the correct directories.")
         return None
@@ -88,7 +89,7 @@ def load_data_and_models():
 data_package = load_data_and_models()
 
 if data_package:
-    xtrain, xtest, ytrain, ytest, ypred, df, df_filter = data_package
+    xtrain, xtest, ytrain, ytest, ypred, df, df_filter, version = data_package
 
     st.sidebar.image("https://images.unsplash.com/photo-1552519507-da3b142c6e3d?q=80&w=400&auto=format&fit=crop", caption="System Active")
     type_ = st.sidebar.selectbox('Select Preprocessing Stage', ['Overview', 'Model Visualization', 'Detection Outliers'])
@@ -105,89 +106,15 @@ if data_package:
 
     elif type_ == 'Model Visualization':
         st.markdown("## 📈 Performance Metrix")
-        tabs = st.tabs(['🎨 Matplotlib Analytics', '⚡ Plotly Interactive'])
-
-        with tabs[0]:
-            y_test_array = np.array(ytest)
-            sorted_index = np.argsort(y_test_array)
-            y_test_sorted = y_test_array[sorted_index]
-            
-            fig, ax = plt.subplots(1, 2, figsize=(15,5), facecolor='#161b22')
-            sns.scatterplot(x=np.arange(len(y_test_array)), y=y_test_array, alpha=0.6, ax=ax[0], color='#00d2ff')
-            ax[0].set_facecolor('#0d1117')
-            ax[0].set_title("Actual Prices", color='white')
-            
-            sns.scatterplot(x=np.arange(len(y_test_sorted)), y=y_test_sorted, alpha=0.4, ax=ax[1], color='#00d2ff')
-            ax[1].set_facecolor('#0d1117')
-            ax[1].set_title("Actual Prices (Sorted)", color='white')
-            plt.tight_layout()
-            st.pyplot(fig)
-
-            # Residuals
-            y_pred_array = np.array(ypred)
-            residuals = y_test_array[sorted_index] - y_pred_array[sorted_index]
-            fig2, ax2 = plt.subplots(1, 2, figsize=(15,5), facecolor='#161b22')
-            sns.scatterplot(x=np.arange(len(residuals)), y=residuals, ax=ax2[0], color='#ff0055')
-            ax2[0].axhline(y=0, color='green', linewidth=3)
-            ax2[0].set_facecolor('#0d1117')
-            ax2[0].set_title("Residuals (Error)", color='white')
-            
-            # Distance plotting logic
-            ax2[1].scatter(y_test_array, y_pred_array, alpha=0.6, c='#00d2ff')
-            ax2[1].plot([y_test_array.min(), y_test_array.max()], [y_test_array.min(), y_test_array.max()], 'r--')
-            ax2[1].set_facecolor('#0d1117')
-            ax2[1].set_title("Actual vs Predicted", color='white')
-            st.pyplot(fig2)
-
-        with tabs[1]:
-            # Integrated Plotly (From your code)
-            fig1 = make_subplots(rows=1, cols=2, subplot_titles=("Car Prices", "Sorted Car Prices"))
-            fig1.add_trace(go.Scatter(y=y_test_array, mode='markers', marker=dict(color='#00d2ff')), row=1, col=1)
-            fig1.add_trace(go.Scatter(y=y_test_sorted, mode='markers', marker=dict(color='#00d2ff')), row=1, col=2)
-            fig1.update_layout(template="plotly_dark", height=500, showlegend=False)
-            st.plotly_chart(fig1, use_container_width=True)
+        # only the selected tab's figures are built, and each one once per dataset version (chart_cache.py)
+        tab = st.radio('Tab', list(MODEL_TABS), horizontal=True, label_visibility='collapsed')
+        for chart in render_tab(MODEL_TABS[tab], (df, ytest, ypred), version):
+            show(chart)
 
     elif type_ == 'Detection Outliers':
         st.markdown("## 🔍 Anomaly Detection")
-        tabs = st.tabs(['Heatmap', 'Distribution (Log)', 'Pairplot', 'Deep Boxplots', 'Categorical vs Price'])
-
-        with tabs[0]:
-            fig, ax = plt.subplots(figsize=(10,5), facecolor='#161b22')
-            sns.heatmap(df.corr(numeric_only=True), annot=True, cmap="mako", ax=ax)
-            st.pyplot(fig)
-
-        with tabs[1]:
-            num_cols = df.select_dtypes(include='number').columns
-            fig = plt.figure(figsize=(15, 12), facecolor='#161b22')
-            outer = fig.add_gridspec(3, 3)
-            for i, col in enumerate(num_cols[:9]):
-                inner = outer[i].subgridspec(1, 2, wspace=0.3)
-                ax1 = fig.add_subplot(inner[0], facecolor='#0d1117'); sns.kdeplot(df[col], ax=ax1, color='#00d2ff')
-                ax2 = fig.add_subplot(inner[1], facecolor='#0d1117'); sns.kdeplot(np.log1p(df[col]), ax=ax2, color='#ff0055')
-            st.pyplot(fig)
-
-        with tabs[2]:
+        tab = st.radio('Tab', list(OUTLIER_TABS), horizontal=True, label_visibility='collapsed')
+        if tab == 'Pairplot':
             st.write("### Multivariate Analysis (Sample 100)")
-            pair_fig = sns.pairplot(df[:100], palette="mako")
-            st.pyplot(pair_fig)
-
-        with tabs[3]:
-            # Your complex 4-column boxplot row
-            num_col = ['Price', 'Levy', 'Engine volume', 'Mileage']
-            fig, axes = plt.subplots(len(num_col), 4, figsize=(20, 15), facecolor='#161b22')
-            for i, col in enumerate(num_col):
-                sns.boxplot(x=df[col], ax=axes[i,0], color='#00d2ff')
-                sns.boxplot(x=df[col], ax=axes[i,1], showfliers=False, color='#00d2ff')
-                sns.boxenplot(x=df[col], ax=axes[i,2], color='#ff0055')
-                sns.boxenplot(x=df[col], ax=axes[i,3], showfliers=False, color='#ff0055')
-                for j in range(4): axes[i,j].set_facecolor('#0d1117')
-            st.pyplot(fig)
-
-        with tabs[4]:
-            fig, axes = plt.subplots(2, 2, figsize=(15, 10), facecolor='#161b22')
-            axes = axes.flatten()
-            for ax, col in zip(axes, ['Cylinders', 'Engine volume', 'Airbags']):
-                top_categorical = df[col].value_counts().index[:10]
-                sns.boxplot(x=df[df[col].isin(top_categorical)][col], y=df['Price'], ax=ax, palette="flare")
-                ax.set_facecolor('#0d1117')
-            st.pyplot(fig)
\ No newline at end of file
+        for chart in render_tab(OUTLIER_TABS[tab], (df, ytest, ypred), version):
+            show(chart)
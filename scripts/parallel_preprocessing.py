@@ -0,0 +1,155 @@
+"""Run `preprocessing_pipline` on several cores with identical output.
+
+Usage (from scripts/):
+    python parallel_preprocessing.py [--input ../datas/raw_data/car_price_prediction.csv]
+                                     [--workers 1 2 4 8] [--scale 20]
+
+The row-local stages (Levy replace, the Engine volume / Mileage regexes,
+dtype fixing, log1p columns, Age) and the row hashing for dedup run on
+partitions of the frame in a process pool. Where the fork start method
+exists (Linux, other POSIX) the pool always forks, so the workers read
+their partitions straight from the parent's memory; elsewhere (Windows) each
+partition is pickled to its worker instead. The global stages then run
+as map/reduce steps on the partition results:
+
+  drop_duplicates : partition row hashes are concatenated and the first
+                    occurrence kept; rows whose hash matches an earlier row
+                    are compared value by value, so a 64-bit collision
+                    cannot drop a distinct row
+  clean_outliers  : each partition contributes the surviving values of the
+                    column; the exact quartiles are taken on the merged
+                    values and the bounds broadcast back as a keep mask,
+                    one column after the other as the sequential code does
+  manufacturers   : filter_manufacturers on the surviving rows
+
+The benchmark replicates the raw data --scale times with fresh IDs and
+checks every run against the sequential pipeline with assert_frame_equal.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import (replace_categorical_by_numerical, fix_datatype, columns_transformation,
+                           engineer_features, filter_manufacturers, preprocessing_pipline)
+
+
+RAW_DATA_PATH = r'../datas/raw_data/car_price_prediction.csv'
+OUTLIER_COLUMNS = ['Price', 'Levy', 'Engine volume', 'Mileage']
+
+# set in the parent before the pool forks, read by the workers without pickling;
+# only valid under the fork start method (spawn / forkserver workers import a fresh module)
+_frame = None
+
+
+def _row_local(start, end):
+    return _process_partition(_frame.iloc[start:end])
+
+
+def _process_partition(part):
+    hashes = pd.util.hash_pandas_object(part, index=False).to_numpy()
+    part = fix_datatype(replace_categorical_by_numerical(part.copy()))
+    return hashes, engineer_features(columns_transformation(part))
+
+
+def first_occurrences(df, hashes):
+    """Mask of rows to keep for `df.drop_duplicates()`, from precomputed row hashes."""
+    keep = ~pd.Series(hashes).duplicated().to_numpy()
+    candidates = np.flatnonzero(~keep)
+    if len(candidates) == 0:
+        return keep
+
+    first = pd.Series(np.arange(len(hashes))).groupby(hashes).transform('first').to_numpy()[candidates]
+    a, b = df.iloc[candidates].to_numpy(dtype=object), df.iloc[first].to_numpy(dtype=object)
+    same = ((a == b) | (pd.isna(a) & pd.isna(b))).all(axis=1)
+    if not same.all():
+        # a hash collision between distinct rows: settle those hash groups exactly
+        collided = np.isin(hashes, hashes[candidates[~same]])
+        keep[collided] = ~df[collided].duplicated().to_numpy()
+    return keep
+
+
+def partitions(n, parts):
+    bounds = np.linspace(0, n, parts + 1).astype(int)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def parallel_preprocessing_pipline(df, workers=None, partitions_per_worker=2):
+    """Same result as `preprocessing_pipline(df)`, with the row-local work spread over `workers` processes."""
+    global _frame
+    workers = workers or os.cpu_count() or 1
+    ranges = partitions(len(df), workers * partitions_per_worker)
+
+    _frame = df
+    try:
+        if workers == 1:
+            results = [_row_local(start, end) for start, end in ranges]
+        else:
+            if 'fork' in multiprocessing.get_all_start_methods():
+                # explicit: the default is spawn on macOS and forkserver on Linux from Python 3.14
+                with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                    results = list(pool.map(_row_local, *zip(*ranges)))
+            else:
+                with ProcessPoolExecutor(workers) as pool:
+                    results = list(pool.map(_process_partition, [df.iloc[start:end] for start, end in ranges]))
+    finally:
+        _frame = None
+
+    hashes = np.concatenate([h for h, _ in results])
+    keep = first_occurrences(df, hashes)
+
+    # partition-wise keep masks, so every reduce step reads only the rows still alive
+    offsets = np.cumsum([0] + [len(part) for _, part in results])
+    masks = [keep[offsets[i]:offsets[i + 1]] for i in range(len(results))]
+    parts = [part for _, part in results]
+
+    for col in OUTLIER_COLUMNS:
+        values = pd.Series(np.concatenate([part[col].to_numpy()[mask] for part, mask in zip(parts, masks)]))
+        q1, q3 = values.quantile(.25), values.quantile(.75)
+        lower, upper = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        masks = [mask & ((part[col] >= lower) & (part[col] <= upper)).to_numpy() for part, mask in zip(parts, masks)]
+
+    masks = [mask & ((part['Prod. year'] > 1991) & (part['Prod. year'] < 2020)).to_numpy() for part, mask in zip(parts, masks)]
+    out = pd.concat([part[mask] for part, mask in zip(parts, masks)])
+    out = filter_manufacturers(out)
+    return out.drop(columns=['ID', 'Prod. year', 'Doors'])
+
+
+def replicate(df, scale):
+    """`scale` copies of `df` with distinct IDs, so dedup keeps them."""
+    copies = [df.assign(ID=df['ID'] + i * (df['ID'].max() + 1)) for i in range(scale)]
+    return pd.concat(copies, ignore_index=True)
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default=RAW_DATA_PATH)
+    parser.add_argument('--workers', nargs='+', type=int, default=sorted({1, 2, 4, cores}))
+    parser.add_argument('--scale', type=int, default=20, help='replicate the input this many times')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(name)s: %(message)s')  # the pipeline's INFO progress stays quiet
+
+    df = replicate(pd.read_csv(args.input), args.scale)
+    print(f'{len(df)} rows, os.cpu_count() = {cores}')
+
+    start = time.perf_counter()
+    expected = preprocessing_pipline(df.copy())
+    sequential = time.perf_counter() - start
+    print(f'{"sequential":>12} {sequential:8.2f} s')
+
+    for workers in args.workers:
+        start = time.perf_counter()
+        got = parallel_preprocessing_pipline(df, workers)
+        seconds = time.perf_counter() - start
+        pd.testing.assert_frame_equal(got, expected)
+        print(f'{workers:>4} workers {seconds:8.2f} s  speedup {sequential / seconds:5.2f}x  identical')
+
+
+if __name__ == '__main__':
+    main()
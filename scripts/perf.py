@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+import resource
+import tracemalloc
+import numpy as np
+
+
+def rss_bytes():
+    """Resident set size of the current process (Linux /proc, else peak RSS)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def format_bytes(n):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(n) < 1024 or unit == 'GB':
+            return f'{n:.1f} {unit}'
+        n /= 1024
+
+
+def latency_percentiles(fn, repeat=200, warmup=5, percentiles=(50, 99)):
+    """Call `fn()` `repeat` times and return {'p50': ms, 'p99': ms, ...}."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+    return {f'p{p}' : float(np.percentile(samples, p) * 1e3) for p in percentiles}
+
+
+class StageProfiler:
+    """Wall time, CPU time, rows in/out and peak memory of each stage of a pipeline.
+
+    `run(name, fn, df)` calls `fn(df)` and records one stage. Peak memory is
+    the most allocated above the stage's starting point:
+
+      'tracemalloc' : Python-level allocations, numpy/pandas buffers included
+      'rss'         : resident set size sampled every `sample_interval` seconds
+      None          : not measured
+    """
+
+    def __init__(self, memory='tracemalloc', sample_interval=0.001):
+        if memory not in ('tracemalloc', 'rss', None):
+            raise ValueError(f"memory must be 'tracemalloc', 'rss' or None, got {memory!r}")
+        self.memory = memory
+        self.sample_interval = sample_interval
+        self.stages = []
+
+    def _measure_peak(self, fn):
+        if self.memory == 'tracemalloc':
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            try:
+                return fn(), tracemalloc.get_traced_memory()[1] - base
+            finally:
+                if started:
+                    tracemalloc.stop()
+
+        if self.memory == 'rss':
+            base = peak = rss_bytes()
+            done = threading.Event()
+
+            def sample():
+                nonlocal peak
+                while not done.wait(self.sample_interval):
+                    peak = max(peak, rss_bytes())
+
+            sampler = threading.Thread(target=sample, daemon=True)
+            sampler.start()
+            try:
+                result = fn()
+            finally:
+                done.set()
+                sampler.join()
+            return result, max(peak, rss_bytes()) - base
+
+        return fn(), None
+
+    def run(self, name, fn, df, *args, **kwargs):
+        rows_in = len(df)
+        wall, cpu = time.perf_counter(), time.process_time()
+        out, peak = self._measure_peak(lambda: fn(df, *args, **kwargs))
+        self.stages.append({
+            'stage' : name,
+            'wall_s' : time.perf_counter() - wall,
+            'cpu_s' : time.process_time() - cpu,
+            'rows_in' : rows_in,
+            'rows_out' : len(out),
+            'columns_out' : out.shape[1],
+            'peak_bytes' : peak,
+        })
+        return out
+
+    def report(self, **meta):
+        """JSON-serialisable run report; `meta` (dataset, version, ...) is stored as is."""
+        peaks = [stage['peak_bytes'] for stage in self.stages if stage['peak_bytes'] is not None]
+        return {
+            **meta,
+            'memory' : self.memory,
+            'total' : {
+                'wall_s' : sum(stage['wall_s'] for stage in self.stages),
+                'cpu_s' : sum(stage['cpu_s'] for stage in self.stages),
+                'rows_in' : self.stages[0]['rows_in'] if self.stages else 0,
+                'rows_out' : self.stages[-1]['rows_out'] if self.stages else 0,
+                'peak_bytes' : max(peaks) if peaks else None,
+            },
+            'stages' : self.stages,
+        }
+
+    def table(self):
+        lines = [f'{"stage":<22} {"wall ms":>9} {"cpu ms":>9} {"rows in":>9} {"rows out":>9} {"peak":>10}']
+        for stage in self.stages:
+            peak = format_bytes(stage['peak_bytes']) if stage['peak_bytes'] is not None else '-'
+            lines.append(f'{stage["stage"]:<22} {stage["wall_s"] * 1e3:9.1f} {stage["cpu_s"] * 1e3:9.1f} '
+                         f'{stage["rows_in"]:9d} {stage["rows_out"]:9d} {peak:>10}')
+        return '\n'.join(lines)
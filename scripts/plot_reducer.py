@@ -0,0 +1,153 @@
+"""Reduce plot data to a point budget before it reaches matplotlib or the browser.
+
+  minmax_indices   min / max bucketing: keeps each bucket's extremes, so a
+                   noisy index-ordered series keeps its envelope and spikes
+  lttb_indices     largest-triangle-three-buckets: keeps the visual shape of
+                   a line-like series (e.g. sorted prices)
+  bin2d            2-D histogram of a point cloud (actual vs predicted), drawn
+                   as a heatmap whose cost does not depend on the point count
+  kde_grid         Gaussian KDE on a fixed grid, from a fine histogram
+                   convolved by FFT: O(n + bins log bins) instead of seaborn's
+                   O(n * gridsize), same bandwidth (Scott) and cut (3)
+
+The budget is PLOT_POINT_BUDGET points per series (default 2000). The
+preprocessing page's model and distribution builders take `budget`;
+budget=None draws every point, as before.
+
+Usage (from scripts/):  python plot_reducer.py [--scales 1 10 50]   # render time vs test-set size, full vs reduced
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+
+POINT_BUDGET = int(os.environ.get('PLOT_POINT_BUDGET', 2000))
+
+
+def minmax_indices(y, budget=POINT_BUDGET):
+    """Sorted indices of the min and max of each of budget // 2 equal buckets (all indices if len(y) <= budget)."""
+    y = np.asarray(y)
+    n = len(y)
+    if budget is None or n <= budget:
+        return np.arange(n)
+    starts = np.linspace(0, n, max(budget // 2, 1) + 1).astype(np.int64)[:-1]
+    picks = []
+    for reduce in (np.minimum, np.maximum):
+        extremes = reduce.reduceat(y, starts)
+        hits = np.flatnonzero(y == np.repeat(extremes, np.diff(np.append(starts, n))))
+        picks.append(hits[np.searchsorted(hits, starts)])  # first extreme in each bucket
+    return np.unique(np.concatenate(picks))
+
+
+def lttb_indices(y, budget=POINT_BUDGET, x=None):
+    """Indices kept by largest-triangle-three-buckets; the first and last points are always kept."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if budget is None or n <= budget or budget < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)  # budget - 2 buckets over the inner points
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes
+    mean_x, mean_y = np.append(mean_x, x[-1]), np.append(mean_y, y[-1])
+
+    kept = np.empty(budget, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(budget - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # twice the area of the triangle (a, candidate, next bucket's mean)
+        area = np.abs((x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def bin2d(x, y, bins=120):
+    """(counts, x edges, y edges) over a shared square range, so the y = x diagonal stays the diagonal."""
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    lo, hi = min(x.min(), y.min()), max(x.max(), y.max())
+    counts, xedges, yedges = np.histogram2d(x, y, bins=bins, range=[[lo, hi], [lo, hi]])
+    return counts, xedges, yedges
+
+
+def kde_grid(values, gridsize=200, cut=3, bins=4096):
+    """(grid, density) of a Gaussian KDE with Scott's bandwidth, as seaborn.kdeplot draws it; empty if degenerate."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    n = len(values)
+    bandwidth = values.std(ddof=1) * n ** (-1 / 5) if n > 1 else 0.0
+    if not bandwidth > 0:
+        return np.empty(0), np.empty(0)
+
+    lo, hi = values.min() - cut * bandwidth, values.max() + cut * bandwidth
+    counts, edges = np.histogram(values, bins=bins, range=(lo, hi))
+    width = edges[1] - edges[0]
+    sigma = bandwidth / width
+    half = min(int(np.ceil(4 * sigma)), bins)
+    kernel = np.exp(-0.5 * (np.arange(-half, half + 1) / sigma) ** 2)
+    kernel /= kernel.sum()
+
+    size = 1 << int(np.ceil(np.log2(bins + len(kernel))))
+    smoothed = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)[half:half + bins]
+    centers = (edges[:-1] + edges[1:]) / 2
+    grid = np.linspace(lo, hi, gridsize)
+    return grid, np.interp(grid, centers, np.maximum(smoothed, 0) / (n * width))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 50], help='test-set / dataset size multipliers')
+    args = parser.parse_args()
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import warnings
+    warnings.simplefilter('ignore')
+    import pandas as pd
+
+    import dashboard_charts
+    from chart_cache import to_chart
+    from dataset_cache import DATAS_DIR, load_clean
+    from dataset_store import load_split
+
+    ytest, ypred = (np.asarray(a, dtype=np.float64) for a in load_split(['ytest', 'ypred']))
+    df = load_clean(DATAS_DIR / 'clean_car.csv')
+    rng = np.random.default_rng(0)
+
+    # the reduced KDE against seaborn's on the real columns
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    worst = 0.0
+    for col in df.select_dtypes(include='number').columns[:9]:
+        for values in [df[col], np.log1p(df[col])]:
+            ax = sns.kdeplot(values)
+            line = ax.get_lines()[0]
+            grid, density = kde_grid(values)
+            expected = np.interp(grid, line.get_xdata(), line.get_ydata())
+            worst = max(worst, np.abs(density - expected).max() / expected.max())
+            plt.close(ax.figure)
+    print(f'kde_grid vs seaborn kdeplot on the 9 distribution columns (raw and log1p): max error {worst:.2%} of peak\n')
+
+    builders = [dashboard_charts.actual_prices, dashboard_charts.residuals, dashboard_charts.prices_interactive,
+                dashboard_charts.log_distributions]
+    print(f'{"test rows":>10} {"chart":<20} {"full":>9} {"reduced":>9} {"plotly full":>12} {"reduced":>9}')
+    for scale in args.scales:
+        noise = rng.normal(1, .05, (scale, len(ytest)))
+        y, p = (ytest * noise).ravel(), (ypred * noise[::-1]).ravel()
+        big = pd.concat([df] * scale, ignore_index=True)
+        for builder in builders:
+            row = f'{len(y):>10} {builder.__name__:<20}'
+            sizes = []
+            for budget in [None, POINT_BUDGET]:
+                start = time.perf_counter()
+                chart = to_chart(builder(big, y, p, budget=budget))
+                row += f' {time.perf_counter() - start:8.2f}s'
+                sizes.append(chart.nbytes if chart.format == 'plotly' else None)
+            if sizes[0] is not None:
+                row += f' {sizes[0] / 1e3:10.0f}kB {sizes[1] / 1e3:7.0f}kB'
+            print(row)
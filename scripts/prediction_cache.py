@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+MISSING = object()
+
+
+class PredictionCache:
+    """Bounded LRU cache with a TTL for per-car results.
+
+    Keys are a hash of the car dict's exact values plus the current year (the
+    `Age` feature depends on it); values are not normalized, so a cached
+    answer is always the one an uncached call would give. With mode 'prediction' the cached value is
+    the predicted price; with mode 'features' it is the encoded feature row,
+    for traffic whose raw inputs repeat too little for whole-prediction hits.
+
+    The cache clears itself when any file in `watch_paths` changes (mtime or
+    size), checked at most every `check_interval` seconds.
+    """
+
+    modes = ('prediction', 'features')
+
+    def __init__(self, maxsize=10000, ttl=300, mode='prediction', watch_paths=(), check_interval=1.0):
+        if mode not in self.modes:
+            raise ValueError(f'mode must be one of {self.modes}, got {mode!r}')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.mode = mode
+        self.watch_paths = list(watch_paths)
+        self.check_interval = check_interval
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = self._artifact_fingerprint()
+        self._next_check = time.monotonic() + check_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(car, namespace=''):
+        canonical = {**car, '__year__' : datetime.now().year}
+        payload = namespace + json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def _artifact_fingerprint(self):
+        fingerprint = []
+        for path in self.watch_paths:
+            try:
+                st = os.stat(path)
+                fingerprint.append((path, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                fingerprint.append((path, None, None))
+        return tuple(fingerprint)
+
+    def _check_artifacts(self, now):
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        fingerprint = self._artifact_fingerprint()
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            self._data.clear()
+            self.invalidations += 1
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._check_artifacts(now)
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires = entry
+            if expires <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'mode' : self.mode,
+            'size' : len(self._data),
+            'maxsize' : self.maxsize,
+            'ttl' : self.ttl,
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'hit_rate' : self.hits / lookups if lookups else 0.0,
+            'evictions' : self.evictions,
+            'expirations' : self.expirations,
+            'invalidations' : self.invalidations,
+        }
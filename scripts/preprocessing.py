@@ -1,8 +1,13 @@
+import logging
+
 import numpy as np 
 import pandas as pd
 
+
+logger = logging.getLogger(__name__)
+
 def replace_categorical_by_numerical(df):
-    df['Levy'].replace('-',0 , inplace= True)
+    df['Levy'] = df['Levy'].replace('-','0')
     df['Levy'] = df.Levy.astype(int)
     clean_Engine = df['Engine volume'].str.extract(r'(\d*\.\d|\d)')
     df['Engine volume'] = clean_Engine.astype('float')
@@ -19,6 +24,52 @@ def fix_datatype(df):
     return df
 
 
+def compact_dtype_plan(df, numeric=True, max_category_ratio=.5):
+    """Smallest lossless dtype per column that keeps NumPy math at full width.
+
+    Repetitive strings become `category`, integers the narrowest int that
+    holds their range but no narrower than int32 (int8 / int16 and bool turn
+    np.log1p and friends into float16), and floats `float32` when every value
+    survives the round trip or is a short decimal (at most 3 places, below
+    1e4) that float32 still tells apart: `round(x, 3)` gives the original
+    back. Floats are never narrowed below float32.
+    """
+    plan = {}
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == 'object' or pd.api.types.is_string_dtype(s.dtype):
+            if not isinstance(s.dtype, pd.CategoricalDtype) and s.nunique() <= max_category_ratio * len(s):
+                plan[col] = 'category'
+        elif not numeric or pd.api.types.is_bool_dtype(s.dtype):
+            continue
+        elif pd.api.types.is_integer_dtype(s.dtype):
+            narrow = np.promote_types(pd.to_numeric(s, downcast='integer').dtype, np.int32)
+            if narrow != s.dtype:
+                plan[col] = narrow
+        elif pd.api.types.is_float_dtype(s.dtype) and s.dtype != np.float32:
+            narrow = s.astype(np.float32)
+            exact = ((narrow.astype(np.float64) == s) | s.isna()).all()
+            short_decimal = ((s.round(3) == s) | s.isna()).all() and s.abs().max() < 1e4
+            if exact or short_decimal:
+                plan[col] = np.float32
+    return plan
+
+
+def compact_dtypes(df, numeric=True, max_category_ratio=.5):
+    return df.astype(compact_dtype_plan(df, numeric, max_category_ratio))
+
+
+def read_clean_csv(path, compact=True):
+    """Load a cleaned dataset CSV, with the compact dtype plan applied by default.
+
+    Compact frames hold int32 / float32 numbers and category strings; float32
+    columns only round-trip to 3 decimals, so charts and statistics that
+    compare against the CSV's values should read it with compact=False.
+    """
+    df = pd.read_csv(path)
+    return compact_dtypes(df) if compact else df
+
+
 def columns_transformation(df):
     df['Levy_logp1'] = np.log1p(df['Levy'])
     df['Engine_volume_logp1'] = np.log1p(df['Engine volume'])
@@ -48,45 +99,106 @@ def engineer_features(df):
     return df
 
 
-def preprocessing_pipline(df:pd.DataFrame):
-    print(f'preprocessing started...')
-    print(f'initial shape : {df.shape}')
+def filter_manufacturers(df):
+    manufacturer = df['Manufacturer']
+    if isinstance(manufacturer.dtype, pd.CategoricalDtype):
+        # rank only manufacturers that still have rows, as with plain strings
+        df = df.assign(Manufacturer=manufacturer.cat.remove_unused_categories())
 
+    filter_manufacturer_by_price = df.groupby('Manufacturer', observed=True)['Price'].sum().sort_values(ascending=False).reset_index().iloc[36:]['Manufacturer'].values
+    filter_manufacturer_by_count = df['Manufacturer'].value_counts().reset_index().iloc[31:]['Manufacturer'].values
+
+    union_uninterseted = [i for i in filter_manufacturer_by_count if i for x in filter_manufacturer_by_price if i == x]
+
+    return df[~(df['Manufacturer'].isin(union_uninterseted))]
+
+
+def drop_duplicates(df):
     df.drop_duplicates(inplace=True)
-    print(f'After dropping dublicates : {df.shape}')
+    return df
 
-    print(f'Replacing categorical values...')
-    df = replace_categorical_by_numerical(df)
 
-    print(f'fix all columns data type...')
-    df = fix_datatype(df)
+def filter_years(df):
+    return df[(df['Prod. year'] > 1991) & (df['Prod. year'] <2020)]
 
-    df = clean_outliers(df , ['Price','Levy','Engine volume','Mileage'])
-    print(f'After cleaning outlairs : {df.shape}')
 
-    print(f'Doing columns transformation...')
-    df = columns_transformation(df)
+def drop_columns(df):
+    return df.drop(columns=['ID','Prod. year','Doors'])
 
-    print(f'Feature engineering...')
-    df = engineer_features(df)
 
-    
-    print(f'Filtering data by importand manufacturer...')
+def _run_stage(name, fn, df, *args):
+    return fn(df, *args)
 
-    df = df[(df['Prod. year'] > 1991) & (df['Prod. year'] <2020)]
 
-    filter_manufacturer_by_price = df.groupby('Manufacturer')['Price'].sum().sort_values(ascending=False).reset_index().iloc[36:]['Manufacturer'].values
-    filter_manufacturer_by_count = df['Manufacturer'].value_counts().reset_index().iloc[31:]['Manufacturer'].values
+def preprocessing_pipline(df:pd.DataFrame, compact=False, profiler=None):
+    """Clean a raw listings frame; progress is logged at INFO.
 
-    union_uninterseted = [i for i in filter_manufacturer_by_count if i for x in filter_manufacturer_by_price if i == x]
+    `profiler` (perf.StageProfiler) records time, rows and memory per stage.
+
+    With `compact` the result has category strings, int32 integers and
+    float32 Engine volume / Cylinders (see `compact_dtype_plan`); the
+    *_logp1 columns stay float64.
+    """
+    run = profiler.run if profiler is not None else _run_stage
+    logger.info(f'preprocessing started...')
+    logger.info(f'initial shape : {df.shape}')
+
+    df = run('drop_duplicates', drop_duplicates, df)
+    logger.info(f'After dropping dublicates : {df.shape}')
+
+    logger.info(f'Replacing categorical values...')
+    df = run('replace_categorical', replace_categorical_by_numerical, df)
+
+    logger.info(f'fix all columns data type...')
+    if compact:
+        df = run('compact_dtypes', compact_dtypes, df, False)
+    else:
+        df = run('fix_datatype', fix_datatype, df)
+
+    df = run('clean_outliers', clean_outliers, df, ['Price','Levy','Engine volume','Mileage'])
+    logger.info(f'After cleaning outlairs : {df.shape}')
+
+    logger.info(f'Doing columns transformation...')
+    df = run('columns_transformation', columns_transformation, df)
+
+    logger.info(f'Feature engineering...')
+    df = run('engineer_features', engineer_features, df)
+
+    
+    logger.info(f'Filtering data by importand manufacturer...')
+
+    df = run('filter_years', filter_years, df)
+
+    df = run('filter_manufacturers', filter_manufacturers, df)
 
-    df = df[~(df['Manufacturer'].isin(union_uninterseted))]
+    logger.info(f'After filtering shape : {df.shape}')
 
-    print(f'After filtering shape : {df.shape}')
+    logger.info(f'Dropping columns...')
+    df = run('drop_columns', drop_columns, df)
 
-    print(f'Dropping columns...')
-    df =df.drop(columns=['ID','Prod. year','Doors'])
+    if compact:
+        # numbers are narrowed last so outlier bounds and log1p see the original widths
+        df = run('compact_numeric', compact_dtypes, df)
 
     return df
 
 
+if __name__ == '__main__':
+    from perf import format_bytes, latency_percentiles
+
+    logging.basicConfig(level=logging.WARNING, format='%(name)s: %(message)s')  # the pipeline's INFO progress stays quiet
+    raw = pd.read_csv(r'../datas/raw_data/car_price_prediction.csv')
+    frames = {'string' : preprocessing_pipline(raw.copy()), 'compact' : preprocessing_pipline(raw.copy(), compact=True)}
+
+    operations = {
+        'groupby Manufacturer mean Price' : lambda df: df.groupby('Manufacturer', observed=True)['Price'].mean(),
+        'groupby Manufacturer, Model size' : lambda df: df.groupby(['Manufacturer', 'Model'], observed=True).size(),
+        'value_counts Model' : lambda df: df['Model'].value_counts(),
+        'isin Manufacturer filter' : lambda df: df[df['Manufacturer'].isin(['TOYOTA', 'FORD', 'BMW'])],
+        'filter_manufacturers' : filter_manufacturers,
+    }
+    for name, df in frames.items():
+        print(f'{name:>8} : {format_bytes(df.memory_usage(deep=True).sum())}')
+    for operation, fn in operations.items():
+        timings = {name : latency_percentiles(lambda: fn(df), repeat=50)['p50'] for name, df in frames.items()}
+        print(f'{operation:<34} string {timings["string"]:7.2f} ms  compact {timings["compact"]:7.2f} ms')
@@ -0,0 +1,139 @@
+"""Profile `preprocessing_pipline` stage by stage and write a JSON run report.
+
+Usage (from scripts/):
+    python profile_preprocessing.py [--input ../datas/raw_data/car_price_prediction.csv] [--scale 1]
+                                    [--compact] [--memory tracemalloc|rss|none] [--out report.json]
+                                    [--baseline old_report.json] [--tolerance 0.2] [--verbose]
+
+For each stage (drop_duplicates, replace_categorical, fix_datatype or
+compact_dtypes, clean_outliers, columns_transformation, engineer_features,
+filter_years, filter_manufacturers, drop_columns) the report has wall time,
+CPU time, rows in/out and peak memory above the stage's start. The dataset is
+identified by path, size and sha256, so reports from different dumps can be
+told apart.
+
+Timings are the fastest of --repeat runs. tracemalloc slows the
+string-heavy stages several times over, so with --memory tracemalloc peak
+memory comes from one extra traced run and timings only from untraced ones.
+--memory rss samples the resident set during the timed runs instead: no
+extra run, but page reuse makes it coarse.
+
+With --baseline, every stage's wall time and peak memory are compared with
+an earlier report. The exit status is 1 when any of them grew by more than
+--tolerance, so the script can guard a CI job. --scale replicates the input
+(with fresh IDs) to profile a larger dump. --verbose shows the pipeline's
+INFO logs, which are off by default.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from dataset_cache import RAW_DATA_PATH, file_digest
+from parallel_preprocessing import replicate
+from perf import StageProfiler, format_bytes
+from preprocessing import preprocessing_pipline
+
+
+def profile(df, compact=False, memory='tracemalloc', repeat=3):
+    """StageProfiler of pipeline runs on copies of `df`, with each stage's fastest of `repeat` timings."""
+    timed = StageProfiler(memory=None if memory == 'tracemalloc' else memory)
+    preprocessing_pipline(df.copy(), compact=compact, profiler=timed)
+    for _ in range(repeat - 1):
+        again = StageProfiler(memory=None)
+        preprocessing_pipline(df.copy(), compact=compact, profiler=again)
+        for stage, other in zip(timed.stages, again.stages):
+            stage['wall_s'], stage['cpu_s'] = min(stage['wall_s'], other['wall_s']), min(stage['cpu_s'], other['cpu_s'])
+    if memory == 'tracemalloc':
+        traced = StageProfiler(memory='tracemalloc')
+        preprocessing_pipline(df.copy(), compact=compact, profiler=traced)
+        for stage, traced_stage in zip(timed.stages, traced.stages):
+            stage['peak_bytes'] = traced_stage['peak_bytes']
+        timed.memory = 'tracemalloc'
+    return timed
+
+
+def compare(report, baseline, tolerance):
+    """Print per-stage changes against `baseline`; return the regressed stage/metric names."""
+    before = {stage['stage'] : stage for stage in baseline['stages']}
+    regressions = []
+    if (baseline.get('dataset', {}).get('sha256'), baseline.get('dataset', {}).get('scale')) != \
+            (report['dataset']['sha256'], report['dataset']['scale']):
+        print('\nnote: the baseline was run on a different dataset')
+    print(f'\n{"vs baseline":<22} {"wall":>18} {"peak":>18}')
+    for stage in report['stages'] + [{'stage' : 'total', **report['total']}]:
+        old = before.get(stage['stage']) if stage['stage'] != 'total' else baseline['total']
+        if old is None:
+            print(f'{stage["stage"]:<22} {"new stage":>18}')
+            continue
+        cells = []
+        for metric, fmt in [('wall_s', lambda v: f'{v * 1e3:.1f} ms'), ('peak_bytes', format_bytes)]:
+            new_value, old_value = stage.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                cells.append('-')
+                continue
+            change = new_value / old_value - 1
+            flag = ''
+            # changes under 5 ms / 1 MB are noise whatever their ratio
+            if change > tolerance and new_value - old_value > (0.005 if metric == 'wall_s' else 1 << 20):
+                regressions.append(f'{stage["stage"]}.{metric}')
+                flag = ' !'
+            cells.append(f'{fmt(new_value):>10} {change:+5.0%}{flag:<2}')
+        print(f'{stage["stage"]:<22} {cells[0]:>18} {cells[1]:>18}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default=RAW_DATA_PATH)
+    parser.add_argument('--scale', type=int, default=1, help='replicate the input this many times')
+    parser.add_argument('--compact', action='store_true', help='profile preprocessing_pipline(compact=True)')
+    parser.add_argument('--memory', choices=['tracemalloc', 'rss', 'none'], default='tracemalloc')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage timing, the fastest is kept')
+    parser.add_argument('--out', help='write the JSON report here')
+    parser.add_argument('--baseline', help='earlier JSON report to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative growth before flagging a regression')
+    parser.add_argument('--verbose', action='store_true', help='show the pipeline INFO logs')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(name)s: %(message)s')
+
+    df = pd.read_csv(args.input)
+    if args.scale > 1:
+        df = replicate(df, args.scale)
+    profiler = profile(df, args.compact, None if args.memory == 'none' else args.memory, args.repeat)
+    print(profiler.table())
+
+    report = profiler.report(
+        created=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        dataset={'path' : str(args.input), 'bytes' : os.path.getsize(args.input), 'sha256' : file_digest(args.input),
+                 'scale' : args.scale, 'rows' : len(df)},
+        options={'compact' : args.compact, 'repeat' : args.repeat},
+        environment={'python' : platform.python_version(), 'pandas' : pd.__version__, 'machine' : platform.machine(),
+                     'cpu_count' : os.cpu_count()},
+    )
+    total = report['total']
+    peak = format_bytes(total['peak_bytes']) if total['peak_bytes'] is not None else '-'
+    print(f'{"total":<22} {total["wall_s"] * 1e3:9.1f} {total["cpu_s"] * 1e3:9.1f} '
+          f'{total["rows_in"]:9d} {total["rows_out"]:9d} {peak:>10}')
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'report written to {args.out}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f'regressions over {args.tolerance:.0%}: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
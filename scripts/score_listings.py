@@ -0,0 +1,118 @@
+"""Score a raw listings CSV offline with a pool of worker processes.
+
+Usage (from scripts/):
+    python score_listings.py ../datas/raw_data/car_price_prediction.csv predictions.csv
+                             [--workers N] [--chunk-mb 4] [--window 2N] [--bundle VERSION] [--all-columns]
+
+The input is in the original export format (Mileage "186005 km", Levy "-",
+Engine volume "2.0 Turbo") and is parsed with the same
+replace_categorical_by_numerical logic as training. The file is cut into
+byte ranges on line boundaries, so it must not contain quoted newlines.
+Each worker loads the model once, then reads, parses and scores its own
+ranges. The parent only computes offsets and writes results, so the CSV
+work scales with the workers. At most `window` chunks are in flight, which
+bounds memory, and results are written in input order with ID, Prediction
+and Error columns (or every input column with --all-columns). Rows that
+cannot be parsed get an Error and are found column-wise, so dirty input
+scores as fast as clean input.
+"""
+import argparse
+import csv
+import io
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+from bulk_scoring import RAW_TEXT_COLUMNS, merge_results, parse_listings
+from model_bundle import BUNDLES_DIR, MODELS_DIR, load_model
+from scoring_pool import score_cars
+
+
+def byte_ranges(path, chunk_bytes):
+    """(header, [(start, end), ...]) with every range ending on a line break."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        start, ranges = f.tell(), []
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header.decode('utf-8').strip(), ranges
+
+
+# --- worker side: one bundle per process, loaded in the initializer ---
+
+_bundle = None
+
+
+def _init_worker(loader, ref):
+    global _bundle
+    _bundle = loader(ref)
+
+
+def score_range(path, header, start, end, all_columns=False):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    names = next(csv.reader([header]))
+    if not data.strip():
+        # only blank lines (e.g. the file's trailing newlines): read_csv would raise EmptyDataError
+        frame, results = pd.DataFrame(columns=names), []
+    else:
+        frame = pd.read_csv(io.BytesIO(data), header=None, names=names, dtype=RAW_TEXT_COLUMNS)
+        cars, positions, errors = parse_listings(frame)
+        scored = score_cars(cars, _bundle) if cars else []
+        results = merge_results(len(frame), positions, scored, errors)
+
+    out = frame if all_columns else frame[['ID']] if 'ID' in frame.columns else pd.DataFrame(index=frame.index)
+    out = out.assign(Prediction=[None if isinstance(r, Exception) else r for r in results],
+                     Error=[str(r) if isinstance(r, Exception) else None for r in results])
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-mb', type=float, default=4, help='bytes of input per task')
+    parser.add_argument('--window', type=int, help='chunks in flight, default 2 x workers')
+    parser.add_argument('--bundle', help='bundle version or directory, default the current bundle')
+    parser.add_argument('--all-columns', action='store_true', help='copy every input column to the output')
+    args = parser.parse_args()
+
+    header, ranges = byte_ranges(args.input, int(args.chunk_mb * 1024 ** 2))
+    window = args.window or 2 * args.workers
+    loader = partial(load_model, root=BUNDLES_DIR, models_dir=MODELS_DIR)
+    print(f'{len(ranges)} chunks of ~{args.chunk_mb} MB, {args.workers} workers, window {window}')
+
+    start, rows, failed = time.perf_counter(), 0, 0
+    pending = deque()
+
+    def write(result):
+        nonlocal rows, failed
+        result.to_csv(args.output, mode='w' if rows == 0 else 'a', header=rows == 0, index=False)
+        rows += len(result)
+        failed += int(result['Error'].notna().sum())
+
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(loader, args.bundle)) as pool:
+        for range_start, range_end in ranges:
+            if len(pending) >= window:
+                write(pending.popleft().result())
+            pending.append(pool.submit(score_range, args.input, header, range_start, range_end, args.all_columns))
+        while pending:
+            write(pending.popleft().result())
+
+    seconds = time.perf_counter() - start
+    print(f'{rows} rows ({failed} failed) scored in {seconds:.1f} s : {rows / seconds:,.0f} rows/sec -> {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+import asyncio
+import os
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from feature_encoder import UnseenLabelError
+from model_bundle import is_pickles
+from prediction_cache import MISSING
+
+
+def score_cars(cars, bundle, cache=None, metrics=None):
+    """Encode and score a list of car dicts with one call to `bundle`'s model.
+
+    Returns a list with the prediction for each car, or the UnseenLabelError
+    raised for cars with unseen labels. A `cache` in 'features' mode is used to
+    skip encoding cars it has already seen. `metrics` times the encode and
+    model stages.
+    """
+    with metrics.stage('encode') if metrics is not None else _no_timer:
+        if cache is not None and cache.mode == 'features':
+            X, errors = encode_cars_cached(cars, bundle, cache)
+        else:
+            X, errors = bundle.encode(cars)
+    valid = np.ones(len(X), dtype=bool)
+    valid[list(errors)] = False
+
+    predictions = np.full(len(X), np.nan)
+    if valid.any():
+        with metrics.stage('model') if metrics is not None else _no_timer:
+            predictions[valid] = bundle.predict(X[valid])
+
+    return [UnseenLabelError(errors[i]) if i in errors else float(predictions[i]) for i in range(len(X))]
+
+
+def encode_cars_cached(cars, bundle, cache):
+    encoder = bundle.encoder
+    keys = [cache.key(car, namespace=bundle.version) for car in cars]
+    X = encoder.new_buffer(len(cars))
+    missed = []
+    for i, key in enumerate(keys):
+        row = cache.get(key)
+        if row is MISSING:
+            missed.append(i)
+        else:
+            X[i] = row
+
+    errors = {}
+    if missed:
+        encoded, missed_errors = encoder.encode_batch([cars[i] for i in missed])
+        X[missed] = encoded
+        errors = {missed[j] : message for j, message in missed_errors.items()}
+        for j, i in enumerate(missed):
+            if j not in missed_errors:
+                cache.set(keys[i], encoded[j].copy())
+
+    return X, errors
+
+
+_no_timer = nullcontext()
+
+
+# --- process-pool workers: each keeps its own memory-mapped bundles ---
+
+_worker_loader = None
+_worker_bundles = {}
+
+
+class BundleUnavailable(LookupError):
+    """A worker cannot load the requested version any more (e.g. pickles retrained since)."""
+
+
+def _init_worker(loader):
+    global _worker_loader
+    _worker_loader = loader
+
+
+def _score_in_worker(ref, version, cars):
+    # keyed by content version, so retrained pickles or a re-exported bundle never hit a stale entry
+    bundle = _worker_bundles.get(version)
+    if bundle is None:
+        try:
+            bundle = _worker_loader(ref)
+        except FileNotFoundError as e:
+            raise BundleUnavailable(str(e)) from None
+        if bundle.version != version:
+            raise BundleUnavailable(f'{ref} now loads {bundle.version}, not {version}')
+        if len(_worker_bundles) >= 4:
+            _worker_bundles.pop(next(iter(_worker_bundles)))
+        _worker_bundles[version] = bundle
+    return score_cars(cars, bundle)
+
+
+class ScoringPool:
+    """Run `score_cars` off the event loop.
+
+    mode 'inline'  : score on the calling thread (baseline, blocks the loop)
+    mode 'thread'  : a ThreadPoolExecutor; batches of `split_rows` or more are
+                     split across the threads, since the NumPy forest traversal
+                     releases the GIL (the flattened-forest analogue of n_jobs)
+    mode 'process' : a ProcessPoolExecutor whose workers load the bundle once
+                     with `loader` (memory-mapped, so pages are shared) and
+                     reload only when the registry switches version; workers
+                     do not use the 'features' cache, they encode every car.
+                     A version the workers cannot load any more (pickles
+                     retrained after it, then rolled back to) is scored in a
+                     parent thread instead
+
+    `score` is a coroutine, so admission from async handlers never blocks.
+    """
+
+    modes = ('inline', 'thread', 'process')
+
+    def __init__(self, mode='thread', workers=None, loader=None, split_rows=1024):
+        if mode not in self.modes:
+            raise ValueError(f'mode must be one of {self.modes}, got {mode!r}')
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.split_rows = split_rows
+        self.executor = None
+        if mode == 'thread':
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='scoring')
+        elif mode == 'process':
+            if loader is None:
+                raise ValueError('process mode needs a picklable `loader(ref)` to load bundles in workers')
+            self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(loader,))
+
+    def _chunks(self, cars):
+        if len(cars) < self.split_rows or self.workers == 1:
+            return [cars]
+        size = -(-len(cars) // self.workers)
+        return [cars[i:i + size] for i in range(0, len(cars), size)]
+
+    async def score(self, cars, bundle, cache=None, metrics=None):
+        """Score `cars`; in process mode `cache` and per-stage `metrics` are not used (the workers cannot share them)."""
+        if self.mode == 'inline':
+            return score_cars(cars, bundle, cache, metrics)
+
+        loop = asyncio.get_running_loop()
+        if self.mode == 'thread':
+            jobs = [loop.run_in_executor(self.executor, score_cars, chunk, bundle, cache, metrics) for chunk in self._chunks(cars)]
+        else:
+            # an explicit reference: None would make the worker load whatever bundle is current
+            ref = bundle.version if is_pickles(bundle.version) else str(bundle.path)
+            jobs = [loop.run_in_executor(self.executor, _score_in_worker, ref, bundle.version, chunk) for chunk in self._chunks(cars)]
+
+        try:
+            scored = await asyncio.gather(*jobs)
+        except BundleUnavailable:
+            return await asyncio.to_thread(score_cars, cars, bundle)
+        results = []
+        for chunk_results in scored:
+            results.extend(chunk_results)
+        return results
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self):
+        return {'mode' : self.mode, 'workers' : self.workers, 'split_rows' : self.split_rows}
@@ -0,0 +1,310 @@
+"""Run `preprocessing_pipline` over raw CSVs larger than memory.
+
+Usage (from scripts/):
+    python streaming_preprocessing.py ../datas/raw_data/car_price_prediction.csv out.csv
+                                      [--chunk-rows 100000] [--relative-accuracy 0.0001] [--compare]
+
+The file is read in chunks several times, so only one chunk of rows is held
+at once:
+
+  pass 1     : drop duplicates (64-bit row hashes) and sketch Price
+  pass 2..4  : sketch Levy, Engine volume, Mileage on the rows that survived
+               the previous IQR filters (clean_outliers is sequential)
+  pass 5     : Mileage filter + year filter, per-manufacturer price sums and counts
+  pass 6     : apply every filter, transform and write the output
+
+Quartiles come from QuantileSketch, whose estimates are within
+`relative_accuracy` of the exact order statistic. The only state that grows
+with the input is the row-hash index for dedup (8 bytes per distinct row)
+and a 1-bit keep mask per row. --compare runs the in-memory pipeline too and
+reports the quartile error and row differences.
+"""
+import argparse
+import math
+import resource
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import (replace_categorical_by_numerical, fix_datatype, columns_transformation,
+                           engineer_features, preprocessing_pipline)
+
+
+OUTLIER_COLUMNS = ['Price', 'Levy', 'Engine volume', 'Mileage']
+FILTER_COLUMNS = ['Price', 'Levy', 'Engine volume', 'Leather interior', 'Mileage', 'Prod. year', 'Manufacturer']
+RAW_TEXT_COLUMNS = {'Levy' : str, 'Engine volume' : str, 'Mileage' : str}
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative-error guarantees (DDSketch).
+
+    Positive values go to logarithmic buckets of ratio gamma = (1+a)/(1-a), so
+    any quantile is returned within a relative error `a` of an actual value of
+    that rank. Zeros and negatives (mirrored buckets) are kept separately.
+    Memory depends on the value range, not on how many values are added.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _add_buckets(self, store, values):
+        keys, counts = np.unique(np.ceil(np.log(values) / self.log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self._add_buckets(self.positive, values[values > 0])
+        self._add_buckets(self.negative, -values[values < 0])
+        self.zeros += int((values == 0).sum())
+        self.count += int(values.size)
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError('can only merge sketches with the same relative accuracy')
+        for store, other_store in [(self.positive, other.positive), (self.negative, other.negative)]:
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def _at_rank(self, rank):
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        raise IndexError(rank)
+
+    def quantile(self, q):
+        """Linear interpolation between order statistics, like `Series.quantile`."""
+        if self.count == 0:
+            return np.nan
+        position = (self.count - 1) * q
+        low = math.floor(position)
+        value = self._at_rank(low)
+        if position > low:
+            value += (self._at_rank(low + 1) - value) * (position - low)
+        return value
+
+    def count_below(self, value):
+        """Approximate number of added values below `value`."""
+        if value > 0:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            return sum(self.negative.values()) + self.zeros + sum(c for k, c in self.positive.items() if k < key)
+        if value == 0:
+            return sum(self.negative.values())
+        key = math.ceil(math.log(-value) / self.log_gamma)
+        return sum(c for k, c in self.negative.items() if k > key)
+
+    def to_dict(self):
+        return {'relative_accuracy' : self.relative_accuracy, 'zeros' : self.zeros, 'count' : self.count,
+                'positive' : self.positive, 'negative' : self.negative}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['relative_accuracy'])
+        sketch.positive = {int(k) : v for k, v in state['positive'].items()}
+        sketch.negative = {int(k) : v for k, v in state['negative'].items()}
+        sketch.zeros, sketch.count = state['zeros'], state['count']
+        return sketch
+
+    def __len__(self):
+        return len(self.positive) + len(self.negative) + (self.zeros > 0)
+
+
+class RowHashIndex:
+    """Set of 64-bit row hashes kept as sorted runs merged geometrically."""
+
+    def __init__(self):
+        self.runs = []
+
+    def add(self, hashes):
+        """Add `hashes`; return a mask of the ones not seen before (first occurrence only)."""
+        first = ~pd.Series(hashes).duplicated().to_numpy()
+        for run in self.runs:
+            if len(run) == 0:
+                continue
+            index = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            first &= run[index] != hashes
+        if first.any():
+            self.runs.append(np.sort(hashes[first]))
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            last = self.runs.pop()
+            self.runs[-1] = np.sort(np.concatenate([self.runs[-1], last]))
+        return first
+
+    @property
+    def nbytes(self):
+        return sum(run.nbytes for run in self.runs)
+
+
+def iqr_bounds(q1, q3):
+    iqr = q3 - q1
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def manufacturers_to_drop(price_sum, counts):
+    """The manufacturer filter of `preprocessing_pipline`, on pre-aggregated sums and counts."""
+    by_price = price_sum.sort_index().sort_values(ascending=False).reset_index().iloc[36:]['Manufacturer'].values
+    by_count = counts.sort_values(ascending=False, kind='stable').reset_index().iloc[31:]['Manufacturer'].values
+    return [m for m in by_count if m in set(by_price)]
+
+
+class StreamingPreprocessor:
+
+    def __init__(self, path, chunk_rows=100000, relative_accuracy=0.0001):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.relative_accuracy = relative_accuracy
+        self.keep = []
+        self.bounds = {}
+        self.sketches = {}
+        self.dropped_manufacturers = []
+        self.hash_index_bytes = 0
+
+    def _chunks(self, usecols=None, raw=False):
+        dtype = str if raw else {k : v for k, v in RAW_TEXT_COLUMNS.items() if usecols is None or k in usecols}
+        return pd.read_csv(self.path, chunksize=self.chunk_rows, usecols=usecols, dtype=dtype)
+
+    def _filter_chunks(self):
+        for keep, chunk in zip(self.keep, self._chunks(FILTER_COLUMNS)):
+            mask = np.unpackbits(keep, count=len(chunk)).astype(bool)
+            yield mask, replace_categorical_by_numerical(chunk)
+
+    def _in_bounds(self, frame, col):
+        lower, upper = self.bounds[col]
+        return ((frame[col] >= lower) & (frame[col] <= upper)).to_numpy()
+
+    def fit(self):
+        index = RowHashIndex()
+        sketch = QuantileSketch(self.relative_accuracy)
+        for chunk in self._chunks(raw=True):
+            first = index.add(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+            self.keep.append(np.packbits(first))
+            sketch.add(pd.to_numeric(chunk['Price'])[first])
+        self.hash_index_bytes = index.nbytes
+        del index
+        self._set_bounds('Price', sketch)
+
+        for previous, col in zip(OUTLIER_COLUMNS, OUTLIER_COLUMNS[1:]):
+            sketch = QuantileSketch(self.relative_accuracy)
+            keep = []
+            for mask, frame in self._filter_chunks():
+                mask &= self._in_bounds(frame, previous)
+                keep.append(np.packbits(mask))
+                sketch.add(frame[col].to_numpy()[mask])
+            self.keep = keep
+            self._set_bounds(col, sketch)
+
+        price_sum, counts, keep = {}, {}, []
+        for mask, frame in self._filter_chunks():
+            mask &= self._in_bounds(frame, 'Mileage')
+            mask &= ((frame['Prod. year'] > 1991) & (frame['Prod. year'] < 2020)).to_numpy()
+            keep.append(np.packbits(mask))
+            kept = frame[mask]
+            for manufacturer, total in kept.groupby('Manufacturer')['Price'].sum().items():
+                price_sum[manufacturer] = price_sum.get(manufacturer, 0) + total
+            for manufacturer, count in kept['Manufacturer'].value_counts(sort=False).items():
+                counts[manufacturer] = counts.get(manufacturer, 0) + count
+        self.keep = keep
+        self.dropped_manufacturers = manufacturers_to_drop(
+            pd.Series(price_sum, name='Price').rename_axis('Manufacturer'),
+            pd.Series(counts, name='count').rename_axis('Manufacturer'))
+        return self
+
+    def _set_bounds(self, col, sketch):
+        self.sketches[col] = sketch
+        self.bounds[col] = iqr_bounds(sketch.quantile(.25), sketch.quantile(.75))
+
+    def transform(self):
+        """Yield the cleaned chunks, in input order."""
+        for keep, chunk in zip(self.keep, self._chunks()):
+            mask = np.unpackbits(keep, count=len(chunk)).astype(bool)
+            df = fix_datatype(replace_categorical_by_numerical(chunk[mask].copy()))
+            df = engineer_features(columns_transformation(df))
+            df = df[~df['Manufacturer'].isin(self.dropped_manufacturers)]
+            yield df.drop(columns=['ID', 'Prod. year', 'Doors'])
+
+    def write(self, output):
+        rows = 0
+        for df in self.transform():
+            df.to_csv(output, mode='w' if rows == 0 else 'a', header=rows == 0, index=False)
+            rows += len(df)
+        return rows
+
+
+def exact_bounds(df):
+    """Quartile bounds of the in-memory pipeline, following the same sequential filtering."""
+    df = replace_categorical_by_numerical(df.drop_duplicates())
+    bounds = {}
+    for col in OUTLIER_COLUMNS:
+        q1, q3 = df[col].quantile(.25), df[col].quantile(.75)
+        bounds[col] = (q1, q3, *iqr_bounds(q1, q3))
+        df = df[(df[col] >= bounds[col][2]) & (df[col] <= bounds[col][3])]
+    return bounds
+
+
+def compare(path, streamed, output):
+    raw = pd.read_csv(path)
+    print('\nquartiles, streaming vs exact:')
+    for col, (q1, q3, lower, upper) in exact_bounds(raw.copy()).items():
+        sketch = streamed.sketches[col]
+        s_q1, s_q3 = sketch.quantile(.25), sketch.quantile(.75)
+        print(f'  {col:<14} q1 {s_q1:12.3f} vs {q1:12.3f} ({abs(s_q1 - q1) / max(abs(q1), 1e-12):.2e})  '
+              f'q3 {s_q3:12.3f} vs {q3:12.3f} ({abs(s_q3 - q3) / max(abs(q3), 1e-12):.2e})  '
+              f'{len(sketch)} buckets')
+
+    exact = preprocessing_pipline(raw)
+    got = pd.read_csv(output, float_precision='round_trip')
+    exact_rows = Counter(map(tuple, exact.astype(str).values.tolist()))
+    got_rows = Counter(map(tuple, got[list(exact.columns)].astype(str).values.tolist()))
+    print(f'rows : streaming {len(got)}, exact {len(exact)}, only in streaming {sum((got_rows - exact_rows).values())}, '
+          f'only in exact {sum((exact_rows - got_rows).values())}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--chunk-rows', type=int, default=100000)
+    parser.add_argument('--relative-accuracy', type=float, default=0.0001)
+    parser.add_argument('--compare', action='store_true', help='also run the in-memory pipeline and report the error')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    streamed = StreamingPreprocessor(args.input, args.chunk_rows, args.relative_accuracy).fit()
+    rows = streamed.write(args.output)
+    print(f'{rows} rows written to {args.output} in {time.perf_counter() - start:.1f} s')
+    print(f'bounds : { {col : tuple(round(b, 3) for b in bound) for col, bound in streamed.bounds.items()} }')
+    print(f'dropped manufacturers : {len(streamed.dropped_manufacturers)}, dedup index {streamed.hash_index_bytes / 1024 ** 2:.1f} MB, '
+          f'peak rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB')
+
+    if args.compare:
+        compare(args.input, streamed, args.output)
+
+
+if __name__ == '__main__':
+    main()
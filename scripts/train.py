@@ -0,0 +1,94 @@
+"""Train the price model from the raw export, as 7_training final.ipynb does,
+with the feature encoding done by one FeaturePipeline.
+
+Usage (from scripts/):
+    python train.py [--raw ../datas/raw_data/car_price_prediction.csv] [--out ../models]
+                    [--n-estimators 100] [--bundle]
+
+Writes to --out:
+  - feature_pipeline.pkl, which the API loads through model_bundle.load_pickles
+    (and --bundle stores in a model bundle)
+  - model.pkl and forest.npz
+  - the xtrain / xtest / ytrain / ytest / ypred pickles, and the same arrays as the
+    memory-mapped split/ store (dataset_store.py) the dashboard pages and
+    evaluate() read
+  - manufacturer_model_map.pkl
+  - with --bundle, a model bundle under --out/bundles/, made current there
+"""
+import argparse
+import logging
+import pickle
+import time
+from pathlib import Path
+
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split
+
+from dataset_store import SPLIT_NAMES, save_split
+from feature_encoder import columns_label_encoding
+from feature_pipeline import FeaturePipeline
+from forest_engine import FlatForest
+from model_bundle import MODELS_DIR, export_bundle, evaluate
+from preprocessing import preprocessing_pipline
+
+
+RAW_DATA_PATH = Path(__file__).resolve().parent.parent / 'datas' / 'raw_data' / 'car_price_prediction.csv'
+# integer columns of the notebooks' xtrain / xtest; FeaturePipeline encodes everything as float64
+INTEGER_COLUMNS = [*columns_label_encoding, 'Leather interior', 'Airbags']
+
+
+def train(raw, n_estimators=100, random_state=None):
+    """(pipeline, model, xtrain, xtest, ytrain, ytest) fitted on the raw listings frame `raw`."""
+    df = preprocessing_pipline(raw.copy())
+
+    # same split as the notebooks: 15% test, random_state 42, on the cleaned rows
+    train_index, test_index = train_test_split(df.index, test_size=.15, random_state=42)
+    pipeline = FeaturePipeline().fit(df, scale_rows=train_index)
+    X = pipeline.transform_frame(df).astype({col : 'int64' for col in INTEGER_COLUMNS})
+
+    xtrain, xtest = X.loc[train_index], X.loc[test_index]
+    ytrain, ytest = df.loc[train_index, 'Price'], df.loc[test_index, 'Price']
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state).fit(xtrain, ytrain)
+    return pipeline, model, xtrain, xtest, ytrain, ytest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--raw', default=RAW_DATA_PATH)
+    parser.add_argument('--out', default=MODELS_DIR)
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--random-state', type=int)
+    parser.add_argument('--bundle', action='store_true', help='also write and activate a model bundle')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(name)s: %(message)s')  # the pipeline's INFO progress stays quiet
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    raw = pd.read_csv(args.raw)
+
+    start = time.perf_counter()
+    pipeline, model, xtrain, xtest, ytrain, ytest = train(raw, args.n_estimators, args.random_state)
+    print(f'trained on {len(xtrain)} rows, {pipeline.n_features} features in {time.perf_counter() - start:.1f} s')
+
+    manufacturer_model_map = raw.groupby('Manufacturer')['Model'].unique().apply(list).to_dict()
+    flat = FlatForest.from_sklearn(model)
+    artifacts = {'model' : model, 'xtrain' : xtrain, 'xtest' : xtest, 'ytrain' : ytrain, 'ytest' : ytest,
+                 'ypred' : model.predict(xtest), 'manufacturer_model_map' : manufacturer_model_map}
+    for name, value in artifacts.items():
+        with open(out / f'{name}.pkl', 'wb') as f:
+            pickle.dump(value, f)
+    save_split({name : artifacts[name] for name in SPLIT_NAMES}, out / 'split', args.raw, seed=42, test_size=.15)
+    pipeline.save(out / 'feature_pipeline.pkl')
+    flat.save(out / 'forest.npz')
+
+    metrics = evaluate(flat, out)
+    print(f'r2 {metrics["r2"]:.4f}  rmse {metrics["rmse"]:,.0f} on {metrics["n_test"]} test rows -> {out}')
+
+    if args.bundle:
+        target = export_bundle(pipeline, flat, manufacturer_model_map, metrics=metrics, root=out / 'bundles')
+        print(f'bundle written to {target}')
+
+
+if __name__ == '__main__':
+    main()
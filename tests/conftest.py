@@ -0,0 +1,22 @@
+import pickle
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+DATAS_DIR = ROOT / 'datas'
+MODELS_DIR = ROOT / 'models'
+
+# the scripts import each other as flat modules, as when run from scripts/
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+
+@pytest.fixture(scope='session')
+def artifacts():
+    """The fitted one_hot_encoder / label_encoders / scaler pickles."""
+    loaded = {}
+    for name in ['one_hot_encoder', 'label_encoders', 'scaler']:
+        with open(MODELS_DIR / f'{name}.pkl', 'rb') as file:
+            loaded[name] = pickle.load(file)
+    return loaded
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_encoder import (CompiledEncoder, UnseenLabelError, check_parity, columns_label_encoding, input_field,
+                             prepare_features)
+
+DATAS_DIR = Path(__file__).resolve().parent.parent / 'datas'
+CAR_FIELDS = ['Levy', 'Manufacturer', 'Model', 'Prod_year', 'Category', 'Leather_interior', 'Fuel_type', 'Engine_volume',
+              'Mileage', 'Cylinders', 'Gear_box_type', 'Drive_wheels', 'Wheel', 'Color', 'Airbags']
+
+
+@pytest.fixture(scope='module')
+def encoder(artifacts):
+    return CompiledEncoder.from_sklearn(artifacts['one_hot_encoder'], artifacts['label_encoders'], artifacts['scaler'])
+
+
+@pytest.fixture(scope='module')
+def reference(artifacts):
+    def reference(data):
+        return prepare_features(data, artifacts['one_hot_encoder'], artifacts['label_encoders'], artifacts['scaler'])
+    return reference
+
+
+@pytest.fixture(scope='module')
+def cars(encoder):
+    df = pd.read_csv(DATAS_DIR / 'clean_car_filtering.csv')
+    df = df.rename(columns={'Prod. year' : 'Prod_year', **input_field})
+    df['Leather_interior'] = df['Leather_interior'].map({1 : 'Yes' , 0 : 'No'})
+    for col in columns_label_encoding:
+        df = df[df[col].isin(encoder.label_classes[col])]
+    return df[CAR_FIELDS].to_dict('records')
+
+
+def test_parity_on_dataset(encoder, reference, cars):
+    assert check_parity(encoder, reference, cars) == len(cars) > 10000
+
+
+def test_unseen_onehot_category_is_all_zeros(encoder, reference, cars):
+    # the one-hot encoder was fitted with handle_unknown='ignore'
+    unseen = [{**car, 'Fuel_type' : 'Steam', 'Wheel' : 'Center'} for car in cars[:50]]
+    check_parity(encoder, reference, unseen)
+
+
+@pytest.mark.parametrize('col', columns_label_encoding)
+def test_unseen_label_is_rejected(encoder, reference, cars, col):
+    car = {**cars[0], col : 'Never seen'}
+
+    # the pandas path fails the whole frame on a label the LabelEncoder never saw
+    with pytest.raises(ValueError, match='previously unseen labels'):
+        reference(pd.DataFrame([car]))
+    with pytest.raises(UnseenLabelError, match='previously unseen labels'):
+        encoder.encode_row(car)
+
+    # encode_batch flags the row, leaves it NaN and still encodes the others like prepare_features
+    batch, errors = encoder.encode_batch([cars[1], car, cars[2]])
+    assert list(errors) == [1] and 'Never seen' in errors[1]
+    assert np.isnan(batch[1]).all()
+    expected = reference(pd.DataFrame([cars[1], cars[2]])).to_numpy(dtype=np.float64)
+    assert np.array_equal(batch[[0, 2]], expected)
@@ -0,0 +1,59 @@
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bulk_scoring import _to_cars
+from feature_encoder import CompiledEncoder
+from feature_pipeline import FeaturePipeline
+from preprocessing import preprocessing_pipline
+
+ROOT = Path(__file__).resolve().parent.parent
+RAW_DATA_PATH = ROOT / 'datas' / 'raw_data' / 'car_price_prediction.csv'
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return pd.read_csv(RAW_DATA_PATH)
+
+
+@pytest.fixture(scope='module')
+def encoder(artifacts):
+    return CompiledEncoder.from_sklearn(artifacts['one_hot_encoder'], artifacts['label_encoders'], artifacts['scaler'])
+
+
+@pytest.fixture(scope='module')
+def pipeline(artifacts):
+    pipeline = FeaturePipeline.from_sklearn(artifacts['one_hot_encoder'], artifacts['label_encoders'], artifacts['scaler'])
+    return pickle.loads(pickle.dumps(pipeline))
+
+
+def test_serving_parity(encoder, pipeline, raw):
+    # every raw listing, unseen labels included, through the current /predict encoder
+    assert pipeline.feature_names == encoder.feature_names
+    cars = _to_cars(raw)
+    expected, expected_errors = encoder.encode_batch(cars)
+    assert expected_errors, 'the raw export has listings with unseen labels'
+
+    for name, (got, errors) in [('transform_records', pipeline.transform_records(cars)),
+                                ('transform(raw)', pipeline.transform(raw)),
+                                ('transform(api frame)', pipeline.transform(pd.DataFrame(cars)))]:
+        assert errors == expected_errors, f'{name}: errors differ'
+        assert np.array_equal(got, expected, equal_nan=True), f'{name} differs from CompiledEncoder'
+
+
+def test_training_parity(artifacts, raw):
+    # a refit on preprocessing_pipline output rebuilds xtrain.pkl
+    with open(ROOT / 'models' / 'xtrain.pkl', 'rb') as file:
+        xtrain = pickle.load(file)
+    df = preprocessing_pipline(raw.copy())
+    # Age depends on the year xtrain.pkl was built in, recovered from its scaler's Age mean
+    shift = round(artifacts['scaler'].mean_[-1] - df.loc[xtrain.index, 'Age'].mean())
+    df = df.assign(Age=df['Age'] + shift)
+
+    fitted = FeaturePipeline().fit(df, scale_rows=xtrain.index)
+    rebuilt = fitted.transform_frame(df.loc[xtrain.index])
+    assert list(rebuilt.columns) == list(xtrain.columns)
+    assert np.allclose(rebuilt.to_numpy(), xtrain.to_numpy(dtype=np.float64), rtol=1e-12, atol=1e-12)
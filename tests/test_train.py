@@ -0,0 +1,54 @@
+import pickle
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import train
+
+MODELS_DIR = Path(__file__).resolve().parent.parent / 'models'
+
+
+def load(directory, name):
+    with open(directory / f'{name}.pkl', 'rb') as file:
+        return pickle.load(file)
+
+
+def dtypes(value):
+    return value.dtypes.to_dict() if isinstance(value, pd.DataFrame) else value.dtype
+
+
+@pytest.fixture(scope='module')
+def trained():
+    return train.train(pd.read_csv(train.RAW_DATA_PATH), n_estimators=2, random_state=0)
+
+
+def test_train_reproduces_notebook_split(trained):
+    _, _, *split = trained
+    for name, got in zip(['xtrain', 'xtest', 'ytrain', 'ytest'], split):
+        expected = load(MODELS_DIR, name)
+        assert got.index.equals(expected.index), f'{name}: rows differ'
+        if name.startswith('x'):
+            assert list(got.columns) == list(expected.columns), f'{name}: columns differ'
+            assert got.dtypes.equals(expected.dtypes), f'{name}: dtypes differ'
+            assert np.allclose(got.to_numpy(dtype=np.float64), expected.to_numpy(dtype=np.float64),
+                               rtol=1e-12, atol=1e-12), f'{name}: values differ'
+        else:
+            assert got.dtype == expected.dtype and got.equals(expected), f'{name} differs'
+
+
+def test_main_writes_under_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['train.py', '--out', str(tmp_path), '--n-estimators', '2',
+                                      '--random-state', '0', '--bundle'])
+    bundles = sorted((MODELS_DIR / 'bundles').glob('*'))
+    train.main()
+
+    for name in ['xtrain', 'xtest', 'ytrain', 'ytest', 'ypred']:
+        got, expected = load(tmp_path, name), load(MODELS_DIR, name)
+        assert type(got) is type(expected) and dtypes(got) == dtypes(expected), f'{name}: types differ'
+    for name in ['model.pkl', 'forest.npz', 'feature_pipeline.pkl', 'manufacturer_model_map.pkl', 'split']:
+        assert (tmp_path / name).exists(), name
+    assert any(path.is_dir() for path in (tmp_path / 'bundles').iterdir()), 'no bundle under --out/bundles'
+    assert sorted((MODELS_DIR / 'bundles').glob('*')) == bundles, '--bundle wrote to models/bundles'